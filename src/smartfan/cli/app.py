@@ -2,28 +2,23 @@
 import argparse
 import time
 from importlib.metadata import version
-from typing import Dict, Tuple
+from typing import Callable, Dict, Optional
 
-from mqttms import MQTTms, MQTTDispatcher
 # import smartfan.utils.utilities
 from smartfan.core.config import Config
 from smartfan.logger import get_app_logger
 from smartfan.core.ms_host import MShost
-from smartfan.testbench import TestBench
+from smartfan.core.transport import create_transport
+from smartfan.core.inventory import Inventory, InventoryListener
+from smartfan.core.capture import close_capture
+from smartfan.core.reload import ConfigReloader
+from smartfan.testbench import TestBench, FleetRunner, PairingPipeline, RackCalibration, SoakRunner, ResultSink, SampleExporter, OperatorConsole, open_exporter, open_operator, run_capture_replay
+from smartfan.metrics import MetricsServer, start_metrics_server, COMMAND_SECONDS
+from smartfan.utils.profiling import PROFILER, phase
 
 logger = get_app_logger(__name__)
 
-class AppMQTTDispatcher(MQTTDispatcher):
-    def __init__(self, config: Dict):
-        super().__init__(config)
-
-    def handle_message(self, message: Tuple[str, str]) -> bool:
-        if not super().handle_message(message):
-            logger.info("handle_message: -t '%s' -m '%s'", message[0], message[1])
-            return True
-        return False
-
-valid_modes = ['testbench', 'monitor', 'snonly', 'reset-wifi']
+valid_modes = ['testbench', 'monitor', 'snonly', 'reset-wifi', 'fleet', 'pipeline', 'inventory', 'calibrate', 'replay', 'perf', 'soak']
 
 def parse_args():
     """Parse command-line arguments, including nested options for mqtt and MS Protocol."""
@@ -31,6 +26,9 @@ def parse_args():
 
     # configuration file name
     parser.add_argument('--config', type=str, dest='config', default='config.toml',help="Name of the configuration file, default is 'config.toml'")
+    watch_group = parser.add_mutually_exclusive_group()
+    watch_group.add_argument('--watch-config', dest='watch_config', action='store_const', const=True, help="Apply changes of the configuration file while running, where possible without reconnecting")
+    watch_group.add_argument('--no-watch-config', dest='watch_config', action='store_const', const=False, help="Read the configuration file only at start (default)")
     parser.add_argument('--no-config', action='store_const', const='', dest='config', help="Do not use a configuration file (only defaults & options)")
 
     # version
@@ -59,6 +57,19 @@ def parse_args():
     ms_group.add_argument("--ms-cmd-topic", type=str, dest='ms_cmd_topic', help="Template of command topic.")
     ms_group.add_argument("--ms-rsp-topic", type=str, dest='ms_rsp_topic', help="Template of response topic.")
     ms_group.add_argument("--ms-timeout", type=float, dest='ms_timeout', help="Timeout used in protocol to wait for response.")
+    ms_group.add_argument("--transport", type=str, dest='transport', choices=['mqttms', 'mqtt5', 'serial'], help="Transport of MS protocol: 'mqttms' (templated topics), 'mqtt5' (MQTT v5 Response Topic / Correlation Data) or 'serial' (cable to the DUT)")
+    ms_group.add_argument("--serial-port", type=str, dest='serial_port', help="Serial port of the DUT with --transport serial, e.g. /dev/ttyUSB0 or COM13")
+    ms_group.add_argument("--baudrate", type=int, dest='baudrate', help="Baud rate of the serial port")
+    ms_group.add_argument("--connectivity", type=str, dest='connectivity', choices=['', 'mqttms', 'mqtt5'], help="Transport of the final MQTT connectivity test with --transport serial, '' to skip it")
+    ms_group.add_argument("--framing", type=str, dest='framing', choices=['json', 'bin', 'auto'], help="Payload framing: 'json' envelope, 'bin' compact binary frames, 'auto' binary when the device advertises it in its version (default). Binary needs --transport mqtt5")
+    ms_group.add_argument("--session-expiry", type=int, dest='session_expiry', help="MQTT v5 session expiry interval in seconds; the broker keeps subscriptions and queued responses over a connection drop (0 - clean sessions)")
+    ms_group.add_argument("--replay", type=int, dest='replay', help="Resend an idempotent command up to N times when its response is lost")
+    ms_group.add_argument("--resume", type=int, dest='resume', help="Re-run a test interrupted by a lost connection up to N times per unit")
+    ms_group.add_argument("--broker-rate", type=float, dest='broker_rate', help="Limit of MS commands per second sent to the broker, 0 means unlimited")
+    ms_group.add_argument("--device-rate", type=float, dest='device_rate', help="Limit of MS commands per second sent to one device, 0 means unlimited")
+    cache_group = ms_group.add_mutually_exclusive_group()
+    cache_group.add_argument('--cache', dest='cache', action='store_const', const=True, help="Serve repeated read commands (WH, VS, GM, ZA, PG) from the device state cache (default)")
+    cache_group.add_argument('--no-cache', dest='cache', action='store_const', const=False, help="Always send read commands to the device")
 
     # dut
     dut_group = parser.add_argument_group('DUT Data')
@@ -73,19 +84,86 @@ def parse_args():
     tests_group.add_argument("--motoron", type=float, dest='motoron', help="Time to maintain motor enabled in tests")
     tests_group.add_argument("--motoroff", type=float, dest='motoroff', help="Time to maintain motor disabled in tests")
 
+    # device parameters
+    params_group = parser.add_argument_group('Device Parameters')
+    params_group.add_argument("--amb-thr", type=int, dest='amb_thr', help="Ambient light threshold configured in the device. Used also by monitor alarms")
+    params_group.add_argument("--hum-thr", type=int, dest='hum_thr', help="Humidity threshold (%%) configured in the device. Used also by monitor alarms")
+    params_group.add_argument("--gas-thr", type=int, dest='gas_thr', help="Gas resistance threshold (Ohm) configured in the device. Used also by monitor alarms")
+    params_group.add_argument("--forced-time", type=int, dest='forced_time', help="Forced ventilation time configured in the device")
+    params_group.add_argument("--post-time", type=int, dest='post_time', help="Post ventilation time configured in the device")
+    params_group.add_argument("--ambient-light", type=int, dest='ambient_light', help="Ambient light setting configured in the device")
+
     # operative options
     operative_group = parser.add_argument_group('Operative Options')
     operative_group.add_argument('--mode', type=str, dest='mode', choices=valid_modes, help='Select mode of operation') # testbench, monitor, sn-only
     operative_group.add_argument("--monitor-delay", type=float, dest='monitor_delay', help="Interval of refreshing data in monitor mode")
     operative_group.add_argument("--monitor-loops", type=int, dest='monitor_loops', help="Number of loops in monitor mode")
+    operative_group.add_argument("--monitor-view", type=str, dest='monitor_view', choices=['full', 'grid'], help="Monitor display: 'full' shows all sensor lines, 'grid' shows one compact row per device")
     operative_group.add_argument("--dut-delay", type=float, dest='dutdelay', help="Delay after BLE pairing and connecting to MQTT before start of tests driven by MS protocol over MQTT. This time allows DUT to setup WiFi/MQTT connection.")
     interactive_group = operative_group.add_mutually_exclusive_group()
     interactive_group.add_argument('--interactive', dest='interactive', action='store_const', const=True, help='Enable interactive mode (default)')
     interactive_group.add_argument('--no-interactive', dest='interactive', action='store_const', const=False, help='Disable interactive mode')
     operative_group.add_argument("--no-pairing", dest='nopairing', action='store_const', const=True, help="Do not execute pairing procedure. Assumes DUT has already valid WiFi credentials.")
     operative_group.add_argument("--no-reset-wifi", dest='noresetwifi', action='store_const', const=True, help="Do not reset WiFi credentials on the DUT")
+    operative_group.add_argument("--set-params", dest='setparams', action='store_const', const=True, help="Write the device parameters from [params] into the DUT as part of the tests")
+    operative_group.add_argument("--metrics-port", type=int, dest='metrics_port', help="Enable the Prometheus metrics endpoint on this port")
+    incremental_group = operative_group.add_mutually_exclusive_group()
+    incremental_group.add_argument('--incremental', dest='incremental', action='store_const', const=True, help="Skip tests that already passed on the same device and firmware with the same test plan within the retest validity window")
+    incremental_group.add_argument('--no-incremental', dest='incremental', action='store_const', const=False, help="Run all tests (default)")
+    operative_group.add_argument("--retest-cache", type=str, dest='retest_cache', help="JSON Lines file of the passed tests used by --incremental")
+    operative_group.add_argument("--retest-validity", type=float, dest='retest_validity', help="Seconds a passed test is valid for --incremental")
     operative_group.add_argument("--stop-if-failed", dest='stop_if_failed', action='store_const', const=True, help="Stop execution of tests if current test failed")
 
+    # fleet
+    fleet_group = parser.add_argument_group('Fleet Options')
+    fleet_group.add_argument("--fleet-devices", type=str, dest='fleet_devices', help="Comma separated server UUIDs of the devices tested in fleet mode")
+    fleet_group.add_argument("--fleet-query", type=str, dest='fleet_query', help="Select the fleet devices from the inventory snapshot, e.g. 'version=2.4.0' (keys: uuid, mac, serial, version)")
+    fleet_group.add_argument("--inventory-snapshot", type=str, dest='inventory_snapshot', help="Device inventory snapshot file")
+    presence_group = fleet_group.add_mutually_exclusive_group()
+    presence_group.add_argument('--presence', dest='presence', action='store_const', const=True, help="Test only the devices whose status topic reports them ready (fleet), wait for it instead of polling SR (pipeline)")
+    presence_group.add_argument('--no-presence', dest='presence', action='store_const', const=False, help="Do not track the status topics of the devices (default)")
+    fleet_group.add_argument("--calibration-samples", type=int, dest='calibration_samples', help="SR samples taken from every device in calibrate mode")
+    fleet_group.add_argument("--calibration-threshold", type=float, dest='calibration_threshold', help="Robust standard deviations from the rack median that make a sensor an outlier in calibrate mode")
+    fleet_group.add_argument("--workers", type=int, dest='workers', help="Number of worker processes in fleet mode, 0 means one per CPU core")
+    fleet_group.add_argument("--results", type=str, dest='results', help="JSON Lines file where test results are appended")
+    fleet_group.add_argument("--export", type=str, dest='export', help="Stream decoded SR samples to a .parquet (needs pyarrow) or .csv file")
+
+    # pipeline
+    pipeline_group = parser.add_argument_group('Pipeline Options')
+    pipeline_group.add_argument("--units", type=int, dest='units', help="Units tested in pipeline mode when no fleet devices are given, 0 means until Ctrl-C")
+    pipeline_group.add_argument("--pipeline-depth", type=int, dest='pipeline_depth', help="Units waiting between two stages of the pipeline")
+    pipeline_group.add_argument("--input", type=str, dest='input', choices=['terminal', 'stdin', 'socket'], help="Operator input: terminal prompt, line stream on stdin (barcode scanner) or TCP socket")
+    pipeline_group.add_argument("--input-port", type=int, dest='input_port', help="Port of the operator input socket")
+    pipeline_group.add_argument("--join-timeout", type=float, dest='join_timeout', help="Seconds a unit may take to report WiFi connected and MQTT subscribed")
+
+    # soak mode
+    soak_group = parser.add_argument_group('Soak Options')
+    soak_group.add_argument("--soak-duration", type=float, dest='soak_duration', help="Seconds of a soak run, 0 means until Ctrl-C")
+    soak_group.add_argument("--soak-checkpoint", type=str, dest='soak_checkpoint', help="File where the soak progress is saved periodically")
+    soak_resume_group = soak_group.add_mutually_exclusive_group()
+    soak_resume_group.add_argument('--soak-resume', dest='soak_resume', action='store_const', const=True, help="Continue the soak run saved in the checkpoint (default)")
+    soak_resume_group.add_argument('--no-soak-resume', dest='soak_resume', action='store_const', const=False, help="Start the soak run over, ignoring the checkpoint")
+
+    # perf mode
+    perf_group = parser.add_argument_group('Perf Options')
+    perf_group.add_argument("--perf-samples", type=int, dest='perf_samples', help="NOP and SR samples per perf measurement")
+    perf_group.add_argument("--perf-in-flight", type=str, dest='perf_in_flight', help="Comma separated numbers of NOPs kept in flight in the throughput measurement, e.g. '1,2,4,8'")
+    perf_group.add_argument("--perf-max-p99", type=float, dest='perf_max_p99', help="Fail a perf measurement whose 99th percentile is above this many milliseconds, 0 means no limit")
+
+    # traffic capture and replay
+    capture_group = parser.add_argument_group('Capture and Replay')
+    capture_group.add_argument("--capture", type=str, dest='capture', help="Append every MS command and response (time, DUT, command, topic, size, round trip) to this JSON Lines file")
+    capture_group.add_argument("--replay-capture", type=str, dest='replay_capture', help="Capture file replayed in replay mode")
+    capture_group.add_argument("--replay-session", type=str, dest='replay_session', help="Session of the capture file replayed, all sessions if not given")
+    capture_group.add_argument("--replay-speeds", type=str, dest='replay_speeds', help="Comma separated replay speed factors, e.g. '1,10,100'")
+    capture_group.add_argument("--replay-copies", type=str, dest='replay_copies', help="Comma separated numbers of parallel copies of the captured session, e.g. '1,4,16'")
+
+    # profiling
+    profile_group = parser.add_argument_group('Profiling')
+    profile_group.add_argument("--profile", type=str, dest='profile', help="Profile the whole run and write <PROFILE>.collapsed (or .prof) and <PROFILE>.phases.txt")
+    profile_group.add_argument("--profile-mode", type=str, dest='profile_mode', choices=['sample', 'cprofile'], default='sample', help="'sample' - low overhead sampling profiler with collapsed stacks for flamegraphs (default), 'cprofile' - deterministic cProfile")
+    profile_group.add_argument("--profile-interval", type=float, dest='profile_interval', default=0.005, help="Sampling interval in seconds")
+
     return parser.parse_args()
 
 def main():
@@ -96,86 +174,276 @@ def main():
 
     # Step 2: Parse command-line arguments
     args = parse_args()
+    if args.profile:
+        PROFILER.start(args.profile_mode, args.profile_interval)
 
-    # Step 3: Try to load configuration from configuration file
-    config_file = args.config
     try:
-        cfg.load_config_file(config_file)
-    except Exception:
-        logger.info("Error with loading configuration file. Giving up.")
-        return
+        run_main(cfg, args)
+    finally:
+        close_capture()
+        if args.profile:
+            PROFILER.stop()
+            commands = {key[0]: (sum(counts), total) for key, (counts, total) in COMMAND_SECONDS.merged().items()}
+            PROFILER.write(args.profile, commands)
+
+def run_main(cfg:Config, args:argparse.Namespace) -> None:
+    # Step 3: Try to load configuration from configuration file
+    with phase("config"):
+        config_file = args.config
+        try:
+            cfg.load_config_file(config_file)
+        except Exception:
+            logger.info("Error with loading configuration file. Giving up.")
+            return
 
-    # Step 4: Merge default config, config.json, and command-line arguments
-    cfg.merge_options(args)
+        # Step 4: Merge default config, config.json, and command-line arguments
+        cfg.merge_options(args)
 
     if cfg.config['options']['mode'] == 'reset-wifi':
         cfg.config['options']['noresetwifi'] = False
 
+    # the configuration file is compared with this one when it changes, not with the live one
+    reloader: Optional[ConfigReloader] = None
+    if cfg.config['reload']['enabled']:
+        reloader = ConfigReloader(cfg, config_file, args)
+
     # Step 5: Run the application with collected configuration
-    if cfg.config['metadata']['version']:
-        app_version = version("smartfan")
-        print(f"smartfan {app_version}")
-    else:
-        run_app(cfg)
+    try:
+        if cfg.config['metadata']['version']:
+            app_version = version("smartfan")
+            print(f"smartfan {app_version}")
+        elif cfg.config['options']['mode'] == 'fleet':
+            run_fleet(cfg, reloader)
+        elif cfg.config['options']['mode'] == 'pipeline':
+            run_pipeline(cfg, reloader)
+        elif cfg.config['options']['mode'] == 'inventory':
+            run_inventory(cfg, reloader)
+        elif cfg.config['options']['mode'] == 'calibrate':
+            run_calibrate(cfg)
+        elif cfg.config['options']['mode'] == 'replay':
+            run_replay(cfg)
+        elif cfg.config['options']['mode'] == 'soak':
+            run_soak(cfg, reloader)
+        else:
+            run_app(cfg, reloader)
+    finally:
+        if reloader is not None:
+            reloader.stop()
+
+def watch_config(reloader:Optional[ConfigReloader], *listeners:Callable[[Dict], None]) -> None:
+    """Apply changes of the configuration file to the running session, if enabled (see core/reload.py)."""
+    if reloader is None:
+        return
+    for listener in listeners:
+        reloader.subscribe(listener)
+    reloader.start(reloader.config.config['reload']['interval'])
 
 # CLI application main function with collected options & configuration
-def run_app(config:Config) -> None:
+def run_app(config:Config, reloader:Optional[ConfigReloader] = None) -> None:
 
+    metrics_server: Optional[MetricsServer] = None
+    exporter: Optional[SampleExporter] = None
+    operator: Optional[OperatorConsole] = None
+    mqttms = None
     try:
         logger.info("Running run_app")
+        metrics_server = start_metrics_server(config.config)
         if config.config.get('logging').get('verbose', False):
             logger.info(f"config = {config.config}")
 
         # Create testBench object
         tb = TestBench(config.config)
+        exporter = open_exporter(config.config)
+        tb.set_exporter(exporter)
+        operator = open_operator(config.config)
+        tb.set_operator(operator)
 
         # Step 1) BLE binding, exchange WIFi credentials / MAC address
         if config.config['options']['nopairing']:
-            if not tb.ble_binding():
-                logger.error("Cannot bind with server via BLE")
-                return
+            with phase("pairing"):
+                if not tb.ble_binding():
+                    logger.error("Cannot bind with server via BLE")
+                    return
 
         # At this point:
         # Тhe server knows WiFi credentials and connects to MQTT broker
         # the client (this app) knows MAC address of the server
 
         # create MQTTms mqttms object to work with
-        try:
-            appdipatcher = AppMQTTDispatcher(config.config)
-            mqttms = MQTTms(config.config['mqttms'],config.config['logging'],appdipatcher)
-        except Exception as e:
-            logger.error(f"Cannot create MQTTMS object. Giving up: {e}")
-            return
+        with phase("connect"):
+            try:
+                mqttms = create_transport(config.config)
+            except Exception as e:
+                logger.error(f"Cannot create MQTTMS object. Giving up: {e}")
+                return
 
-        # connect broker
-        try:
-            res = mqttms.connect_mqtt_broker()
-            if not res:
-                mqttms.graceful_exit()
+            # connect broker
+            try:
+                res = mqttms.connect_mqtt_broker()
+                if not res:
+                    return
+            except Exception as e:
+                logger.error(f"Cannot connect to MQTT broker: {e}.")
                 return
-        except Exception as e:
-            mqttms.graceful_exit()
-            logger.error(f"Cannot connect to MQTT broker: {e}.")
-            return
 
         # create ms_host object if all above went well
         ms_host = MShost(ms_protocol=mqttms.ms_protocol,config=config)
 
         tb.set_ms_host(ms_host=ms_host)
 
+        # apply changes of the configuration file while the tests run
+        watch_config(reloader, ms_host.reconfigure)
+
         # Wait for a while to give the server chance to connect to WiFi and MQTT broker
-        time.sleep(config.config['options']['dutdelay'])
+        with phase("dutdelay"):
+            time.sleep(config.config['options']['dutdelay'])
 
-        tb.run_tests()
+        results = tb.run_tests()
+        uuid = config.config['mqttms']['ms']['server_uuid']
+        now = time.time()
+        ResultSink(config.config['options']['results']).write({"dut": uuid, **r, "time": now} for r in results)
 
     except KeyboardInterrupt:
         logger.warning("Application stopped by user (Ctrl-C). Exiting...")
 
     finally:
         # Graceful exit on Ctrl-C
-        if 'mqttms' in locals():
-            mqttms.graceful_exit()
+        with phase("teardown"):
+            if mqttms is not None:
+                mqttms.graceful_exit()
+            if exporter is not None:
+                exporter.close()
+            if operator is not None:
+                operator.close()
+            if metrics_server is not None:
+                metrics_server.stop()
         logger.info("Exiting run_app")
 
+# Fleet mode: test all devices in config['fleet']['devices'] in worker processes
+def run_fleet(config:Config, reloader:Optional[ConfigReloader] = None) -> None:
+    metrics_server: Optional[MetricsServer] = None
+    try:
+        logger.info("Running run_fleet")
+        metrics_server = start_metrics_server(config.config)
+        if not select_fleet(config):
+            return
+        runner = FleetRunner(config.config)
+        watch_config(reloader, runner.reconfigure)
+        runner.run()
+    except KeyboardInterrupt:
+        logger.warning("Application stopped by user (Ctrl-C). Exiting...")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.info("Exiting run_fleet")
+
+# Replay mode: load the broker with copies of a captured session
+def run_replay(config:Config) -> None:
+    try:
+        logger.info("Running run_replay")
+        run_capture_replay(config.config)
+    except KeyboardInterrupt:
+        logger.warning("Application stopped by user (Ctrl-C). Exiting...")
+    finally:
+        logger.info("Exiting run_replay")
+
+# Calibrate mode: compare the sensors of the fleet devices with each other
+def run_calibrate(config:Config) -> None:
+    metrics_server: Optional[MetricsServer] = None
+    try:
+        logger.info("Running run_calibrate")
+        metrics_server = start_metrics_server(config.config)
+        if not select_fleet(config):
+            return
+        RackCalibration(config.config).run()
+    except KeyboardInterrupt:
+        logger.warning("Application stopped by user (Ctrl-C). Exiting...")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.info("Exiting run_calibrate")
+
+# Soak mode: burn-in of the fleet devices with periodic actions
+def run_soak(config:Config, reloader:Optional[ConfigReloader] = None) -> None:
+    metrics_server: Optional[MetricsServer] = None
+    try:
+        logger.info("Running run_soak")
+        metrics_server = start_metrics_server(config.config)
+        if not select_fleet(config):
+            return
+        runner = SoakRunner(config.config)
+        watch_config(reloader, runner.reconfigure)
+        runner.run()
+    except KeyboardInterrupt:
+        logger.warning("Application stopped by user (Ctrl-C). Exiting...")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.info("Exiting run_soak")
+
+def select_fleet(config:Config) -> bool:
+    """Select the fleet devices from the inventory snapshot with [fleet] query, if given."""
+    query = config.config['fleet']['query']
+    if query:
+        inventory = Inventory()
+        inventory.load(config.config['inventory']['snapshot'])
+        try:
+            config.config['fleet']['devices'] = inventory.select(query)
+        except ValueError as e:
+            logger.error(f"Fleet: {e}")
+            return False
+        logger.info("Fleet: %d devices match '%s'", len(config.config['fleet']['devices']), query)
+    return True
+
+# Inventory mode: index the devices seen on the broker, save snapshots
+def run_inventory(config:Config, reloader:Optional[ConfigReloader] = None) -> None:
+    inventory = Inventory()
+    snapshot = config.config['inventory']['snapshot']
+    if inventory.load(snapshot):
+        logger.info("Inventory: %d devices loaded from %s", len(inventory), snapshot)
+    listener = InventoryListener(config.config, inventory)
+    if not listener.start():
+        return
+    watch_config(reloader, listener.reconfigure)
+    try:
+        logger.info("Running run_inventory")
+        duration = config.config['inventory']['duration']
+        interval = config.config['inventory']['interval']
+        end = time.monotonic() + duration if duration else None
+        while end is None or time.monotonic() < end:
+            time.sleep(interval if end is None else max(0.0, min(interval, end - time.monotonic())))
+            save_inventory(inventory, snapshot)
+            logger.info("Inventory: %d devices", len(inventory))
+    except KeyboardInterrupt:
+        logger.warning("Application stopped by user (Ctrl-C). Exiting...")
+    finally:
+        listener.stop()
+        save_inventory(inventory, snapshot)
+        for version, uuids in sorted(inventory.by_version.items()):
+            logger.info("Inventory: version %s: %d devices", version, len(uuids))
+        logger.info("Exiting run_inventory")
+
+def save_inventory(inventory:Inventory, snapshot:str) -> None:
+    try:
+        inventory.save(snapshot)
+    except OSError as e:
+        logger.error(f"Cannot save inventory snapshot {snapshot}: {e}")
+
+# Pipeline mode: pairing, WiFi join and testing of consecutive units overlap
+def run_pipeline(config:Config, reloader:Optional[ConfigReloader] = None) -> None:
+    metrics_server: Optional[MetricsServer] = None
+    try:
+        logger.info("Running run_pipeline")
+        metrics_server = start_metrics_server(config.config)
+        pipeline = PairingPipeline(config.config)
+        watch_config(reloader, pipeline.reconfigure)
+        pipeline.run()
+    except KeyboardInterrupt:
+        logger.warning("Application stopped by user (Ctrl-C). Exiting...")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.info("Exiting run_pipeline")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+# core/capture.py
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from smartfan.logger import get_app_logger
+from smartfan.core.framing import FRAMING_BINARY, payload_data
+
+logger = get_app_logger(__name__)
+
+class TrafficCapture:
+    """
+    JSON Lines log of the MS traffic of MShost, one line per published command ('tx') and per
+    received response ('rx'): wall time, DUT, command code, topic, framing and message size,
+    with the round-trip time and the response status on 'rx' lines.
+
+    The file is appended to, so every line carries the id of the capture that wrote it
+    ('session'): the replay tells the runs apart and times each from its own start.
+    The log is the input of the replay load generator (see testbench/replay.py).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.session = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        # line buffered: a crash loses at most the line being written
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+        self.count = 0
+
+    def write(self, record: Dict) -> None:
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+                self.count += 1
+
+    def sent(self, dut: str, cmd: str, topic: str, message: Union[str, bytes], framing: str) -> None:
+        self.write({"t": time.time(), "session": self.session, "dir": "tx", "dut": dut, "cmd": cmd, "topic": topic,
+                    "framing": framing, "size": len(message)})
+
+    def received(self, dut: str, cmd: str, topic: str, payload: dict, framing: str, rtt: float) -> None:
+        self.write({"t": time.time(), "session": self.session, "dir": "rx", "dut": dut, "cmd": cmd, "topic": topic,
+                    "framing": framing, "size": response_size(payload, framing),
+                    "rtt": round(rtt, 6), "response": payload.get("response", "")})
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        logger.info("Capture: %d messages of session %s written to %s", self.count, self.session, self.path)
+
+
+def response_size(payload: dict, framing: str) -> int:
+    """Size of the response message on the wire, 0 if no message was received."""
+    if payload.get("response", "") in ("TIMEOUT", "DISCONNECTED"):
+        return 0
+    try:
+        data = payload_data(payload)
+    except ValueError:
+        data = b""
+    if framing == FRAMING_BINARY:
+        return 4 + len(data)
+    return len(json.dumps({k: v for k, v in payload.items() if k != "raw"}, separators=(',', ':')))
+
+
+def load_capture(path: str) -> List[Dict]:
+    """Records of a capture file in time order; unreadable lines are skipped."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    records.sort(key=lambda r: r.get("t", 0.0))
+    return records
+
+
+_capture: Optional[TrafficCapture] = None
+_capture_lock = threading.Lock()
+
+def get_capture(config: Dict) -> Optional[TrafficCapture]:
+    """The capture shared by all MShost objects of the process, None if config['capture']['path'] is empty."""
+    global _capture
+    path = config['capture']['path']
+    if not path:
+        return None
+    with _capture_lock:
+        if _capture is None:
+            try:
+                _capture = TrafficCapture(path)
+            except OSError as e:
+                logger.error(f"Cannot open capture file {path}: {e}")
+                return None
+        return _capture
+
+def close_capture() -> None:
+    global _capture
+    with _capture_lock:
+        if _capture is not None:
+            _capture.close()
+            _capture = None
+
+# core/capture.py
@@ -1,7 +1,7 @@
 # core/config.py
 
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import argparse
 from jsonschema import validate, ValidationError
 
@@ -16,8 +16,8 @@ else:
     import tomli as toml # Use the external tomli for Python 3.7 to 3.10
 
 class Config:
-    def __init__(self) -> None:
-        self.config = self.DEFAULT_CONFIG
+    def __init__(self, config: Optional[Dict] = None) -> None:
+        self.config = config if config is not None else self.DEFAULT_CONFIG
 
     DEFAULT_CONFIG = {
         'template': {
@@ -29,7 +29,9 @@ class Config:
             'version': False
         },
         'logging': {
-            'verbose': False
+            'verbose': False,
+            'payload_levels': {},
+            'payload_sample': {}
         },
         'mqttms': {
             'mqtt': {
@@ -49,6 +51,22 @@ class Config:
                 'timeout': 5.0
             }
         },
+        "transport": {
+            "type": "mqttms",
+            "framing": "auto",
+            "session_expiry": 300,
+            "reconnect_min": 1.0,
+            "reconnect_max": 30.0,
+            "reconnect_timeout": 60.0,
+            "replay": 2,
+            "resume": 3
+        },
+        "serial": {
+            "port": "/dev/ttyUSB0",
+            "baudrate": 115200,
+            "window": 4,
+            "connectivity": "mqttms"
+        },
         "dut": {
             "ident": "999999",
             "name": "device",
@@ -60,15 +78,139 @@ class Config:
             "motoron": 3.0,
             "motoroff": 1.0
         },
+        "params": {
+            "amb_thr": 100,
+            "hum_thr": 70,
+            "gas_thr": 10000
+        },
+        "stats": {
+            "ewma_alpha": 0.1,
+            "drift": 0.1,
+            "warmup": 10
+        },
+        "cache": {
+            "enabled": True,
+            "ttl": {
+                "WH": 3600.0,
+                "VS": 3600.0,
+                "GM": 86400.0,
+                "ZA": 86400.0,
+                "PG": 60.0
+            }
+        },
+        "presence": {
+            "enabled": False,
+            "topic": "@/server_uuid/STATUS",
+            "settle": 2.0
+        },
+        "reload": {
+            "enabled": False,
+            "interval": 1.0
+        },
+        "perf": {
+            "samples": 200,
+            "in_flight": [1, 2, 4, 8],
+            "duration": 5.0,
+            "motor_period": 1.0,
+            "max_p99_ms": 0.0
+        },
+        "capture": {
+            "path": ""
+        },
+        "replay": {
+            "capture": "",
+            "session": "",
+            "speeds": [1.0, 10.0, 100.0],
+            "copies": [1],
+            "latency": 0.005,
+            "saturation": 0.9,
+            "standin": True
+        },
+        "calibration": {
+            "channels": ["temperature", "pressure", "humidity"],
+            "samples": 10,
+            "interval": 1.0,
+            "threshold": 3.5,
+            "min_devices": 3,
+            "tolerance": {
+                "temperature": 0.5,
+                "pressure": 1.0,
+                "humidity": 3.0,
+                "gas": 5000.0,
+                "light": 10.0
+            }
+        },
+        "retest": {
+            "cache": "retest.jsonl",
+            "validity": 86400.0
+        },
+        "soak": {
+            "duration": 3600.0,
+            "tick": 0.05,
+            "jitter": 0.1,
+            "workers": 16,
+            "checkpoint": "soak.json",
+            "checkpoint_interval": 60.0,
+            "resume": True,
+            "periods": {
+                "poll": 5.0,
+                "motor": 300.0,
+                "led": 60.0,
+                "params": 900.0
+            }
+        },
+        "fleet": {
+            "devices": [],
+            "workers": 0,
+            "batch": 32,
+            "query": ""
+        },
+        "inventory": {
+            "snapshot": "inventory.json",
+            "interval": 60.0,
+            "duration": 0.0
+        },
+        "operator": {
+            "channel": "terminal",
+            "host": "127.0.0.1",
+            "port": 9110
+        },
+        "scheduler": {
+            "broker_rate": 0.0,
+            "broker_burst": 20,
+            "device_rate": 0.0,
+            "device_burst": 5
+        },
+        "export": {
+            "chunk": 10000,
+            "flush_interval": 60.0,
+            "queue": 100000
+        },
+        "pipeline": {
+            "units": 0,
+            "depth": 1,
+            "join_timeout": 60.0,
+            "poll": 1.0
+        },
+        "metrics": {
+            "enabled": False,
+            "host": "127.0.0.1",
+            "port": 9105
+        },
         "options": {
             "mode": "testbench",
             "monitor_delay": 2.0,
             "monitor_loops": 10,
+            "monitor_view": "full",
             "dutdelay": 2.0,
             "interactive": True,
             "nopairing": False,
             "noresetwifi": False,
-            "stop_if_failed": False
+            "stop_if_failed": False,
+            "setparams": False,
+            "results": "",
+            "export": "",
+            "incremental": False
         }
     }
 
@@ -91,6 +233,14 @@ class Config:
                 "properties": {
                     "verbose": {
                         "type": "boolean"
+                    },
+                    "payload_levels": {
+                        "type": "object",
+                        "additionalProperties": { "type": "string", "enum": ["debug", "info", "warning", "off"] }
+                    },
+                    "payload_sample": {
+                        "type": "object",
+                        "additionalProperties": { "type": "integer", "minimum": 1 }
                     }
                 },
                 "additionalProperties": False
@@ -126,6 +276,20 @@ class Config:
                 "required": ["mqtt", "ms"],
                 "additionalProperties": False
             },
+            "transport": {
+                "type": "object",
+                "properties": {
+                    "type": { "type": "string", "enum": ["mqttms", "mqtt5", "serial"] },
+                    "framing": { "type": "string", "enum": ["json", "bin", "auto"] },
+                    "session_expiry": { "type": "integer", "minimum": 0 },
+                    "reconnect_min": { "type": "number", "exclusiveMinimum": 0 },
+                    "reconnect_max": { "type": "number", "exclusiveMinimum": 0 },
+                    "reconnect_timeout": { "type": "number", "minimum": 0 },
+                    "replay": { "type": "integer", "minimum": 0 },
+                    "resume": { "type": "integer", "minimum": 0 }
+                },
+                "additionalProperties": False
+            },
             "dut" :{
                 "type": "object",
                 "properties": {
@@ -143,12 +307,215 @@ class Config:
                     "motoroff": { "type": "number" }
                 }
             },
+            "params": {
+                "type": "object",
+                "properties": {
+                    "amb_thr": { "type": "integer", "minimum": 0, "maximum": 65535 },
+                    "hum_thr": { "type": "integer", "minimum": 0, "maximum": 65535 },
+                    "gas_thr": { "type": "integer", "minimum": 0, "maximum": 65535 },
+                    "forced_time": { "type": "integer", "minimum": 0, "maximum": 65535 },
+                    "post_time": { "type": "integer", "minimum": 0, "maximum": 65535 },
+                    "ambient_light": { "type": "integer", "minimum": 0, "maximum": 65535 }
+                },
+                "additionalProperties": False
+            },
+            "stats": {
+                "type": "object",
+                "properties": {
+                    "ewma_alpha": { "type": "number", "exclusiveMinimum": 0, "maximum": 1 },
+                    "drift": { "type": "number", "exclusiveMinimum": 0 },
+                    "warmup": { "type": "integer", "minimum": 1 }
+                }
+            },
+            "cache": {
+                "type": "object",
+                "properties": {
+                    "enabled": { "type": "boolean" },
+                    "ttl": {
+                        "type": "object",
+                        "propertyNames": { "pattern": "^[A-Z]{2}$" },
+                        "additionalProperties": { "type": "number", "minimum": 0 }
+                    }
+                }
+            },
+            "serial": {
+                "type": "object",
+                "properties": {
+                    "port": { "type": "string" },
+                    "baudrate": { "type": "integer", "minimum": 1 },
+                    "window": { "type": "integer", "minimum": 1, "maximum": 255 },
+                    "connectivity": { "type": "string", "enum": ["", "mqttms", "mqtt5"] }
+                },
+                "additionalProperties": False
+            },
+            "presence": {
+                "type": "object",
+                "properties": {
+                    "enabled": { "type": "boolean" },
+                    "topic": { "type": "string" },
+                    "settle": { "type": "number", "minimum": 0 }
+                },
+                "additionalProperties": False
+            },
+            "reload": {
+                "type": "object",
+                "properties": {
+                    "enabled": { "type": "boolean" },
+                    "interval": { "type": "number", "exclusiveMinimum": 0 }
+                },
+                "additionalProperties": False
+            },
+            "perf": {
+                "type": "object",
+                "properties": {
+                    "samples": { "type": "integer", "minimum": 1 },
+                    "in_flight": { "type": "array", "items": { "type": "integer", "minimum": 1 }, "minItems": 1 },
+                    "duration": { "type": "number", "exclusiveMinimum": 0 },
+                    "motor_period": { "type": "number", "exclusiveMinimum": 0 },
+                    "max_p99_ms": { "type": "number", "minimum": 0 }
+                },
+                "additionalProperties": False
+            },
+            "capture": {
+                "type": "object",
+                "properties": {
+                    "path": { "type": "string" }
+                },
+                "additionalProperties": False
+            },
+            "replay": {
+                "type": "object",
+                "properties": {
+                    "capture": { "type": "string" },
+                    "session": { "type": "string" },
+                    "speeds": { "type": "array", "items": { "type": "number", "exclusiveMinimum": 0 }, "minItems": 1 },
+                    "copies": { "type": "array", "items": { "type": "integer", "minimum": 1 }, "minItems": 1 },
+                    "latency": { "type": "number", "minimum": 0 },
+                    "saturation": { "type": "number", "exclusiveMinimum": 0, "maximum": 1 },
+                    "standin": { "type": "boolean" }
+                },
+                "additionalProperties": False
+            },
+            "calibration": {
+                "type": "object",
+                "properties": {
+                    "channels": {
+                        "type": "array",
+                        "items": { "type": "string", "enum": ["temperature", "pressure", "humidity", "gas", "light"] },
+                        "minItems": 1
+                    },
+                    "samples": { "type": "integer", "minimum": 1 },
+                    "interval": { "type": "number", "minimum": 0 },
+                    "threshold": { "type": "number", "exclusiveMinimum": 0 },
+                    "min_devices": { "type": "integer", "minimum": 2 },
+                    "tolerance": {
+                        "type": "object",
+                        "additionalProperties": { "type": "number", "minimum": 0 }
+                    }
+                },
+                "additionalProperties": False
+            },
+            "retest": {
+                "type": "object",
+                "properties": {
+                    "cache": { "type": "string" },
+                    "validity": { "type": "number", "minimum": 0 }
+                },
+                "additionalProperties": False
+            },
+            "soak": {
+                "type": "object",
+                "properties": {
+                    "duration": { "type": "number", "minimum": 0 },
+                    "tick": { "type": "number", "exclusiveMinimum": 0 },
+                    "jitter": { "type": "number", "minimum": 0, "maximum": 0.5 },
+                    "workers": { "type": "integer", "minimum": 0 },
+                    "checkpoint": { "type": "string" },
+                    "checkpoint_interval": { "type": "number", "exclusiveMinimum": 0 },
+                    "resume": { "type": "boolean" },
+                    "periods": {
+                        "type": "object",
+                        "properties": {
+                            "poll": { "type": "number", "minimum": 0 },
+                            "motor": { "type": "number", "minimum": 0 },
+                            "led": { "type": "number", "minimum": 0 },
+                            "params": { "type": "number", "minimum": 0 }
+                        },
+                        "additionalProperties": False
+                    }
+                },
+                "additionalProperties": False
+            },
+            "fleet": {
+                "type": "object",
+                "properties": {
+                    "devices": { "type": "array", "items": { "type": "string" } },
+                    "workers": { "type": "integer", "minimum": 0 },
+                    "batch": { "type": "integer", "minimum": 1 },
+                    "query": { "type": "string" }
+                }
+            },
+            "inventory": {
+                "type": "object",
+                "properties": {
+                    "snapshot": { "type": "string" },
+                    "interval": { "type": "number", "exclusiveMinimum": 0 },
+                    "duration": { "type": "number", "minimum": 0 }
+                },
+                "additionalProperties": False
+            },
+            "operator": {
+                "type": "object",
+                "properties": {
+                    "channel": { "type": "string", "enum": ["terminal", "stdin", "socket"] },
+                    "host": { "type": "string" },
+                    "port": { "type": "integer", "minimum": 0, "maximum": 65535 }
+                },
+                "additionalProperties": False
+            },
+            "scheduler": {
+                "type": "object",
+                "properties": {
+                    "broker_rate": { "type": "number", "minimum": 0 },
+                    "broker_burst": { "type": "number", "minimum": 1 },
+                    "device_rate": { "type": "number", "minimum": 0 },
+                    "device_burst": { "type": "number", "minimum": 1 }
+                },
+                "additionalProperties": False
+            },
+            "export": {
+                "type": "object",
+                "properties": {
+                    "chunk": { "type": "integer", "minimum": 1 },
+                    "flush_interval": { "type": "number", "exclusiveMinimum": 0 },
+                    "queue": { "type": "integer", "minimum": 1 }
+                },
+                "additionalProperties": False
+            },
+            "pipeline": {
+                "type": "object",
+                "properties": {
+                    "units": { "type": "integer", "minimum": 0 },
+                    "depth": { "type": "integer", "minimum": 1 },
+                    "join_timeout": { "type": "number", "minimum": 0 },
+                    "poll": { "type": "number", "exclusiveMinimum": 0 }
+                },
+                "additionalProperties": False
+            },
+            "metrics": {
+                "type": "object",
+                "properties": {
+                    "enabled": { "type": "boolean" },
+                    "host": { "type": "string" },
+                    "port": { "type": "integer", "minimum": 0, "maximum": 65535 }
+                }
+            },
             "options": {
                 "type": "object",
                 "properties": {
                     "mode": {
                         "type": "string",
-                        "enum": ["testbench", "snonly", "monitor"]
+                        "enum": ["testbench", "snonly", "monitor", "fleet", "pipeline", "inventory", "calibrate", "replay", "perf", "soak"]
                     },
                     "monitor_delay": {
                         "type": "number",
@@ -158,11 +525,19 @@ class Config:
                         "type": "integer",
                         "minimum": 0,
                     },
+                    "monitor_view": {
+                        "type": "string",
+                        "enum": ["full", "grid"]
+                    },
                     "dutdelay": { "type": "number"},
                     "interactive": { "type": "boolean" },
                     "nopairing": { "type": "boolean" },
                     "noresetwifi": { "type": "boolean" },
-                    "stop_if_failed": { "type": "boolean" }
+                    "stop_if_failed": { "type": "boolean" },
+                    "setparams": { "type": "boolean" },
+                    "results": { "type": "string" },
+                    "export": { "type": "string" },
+                    "incremental": { "type": "boolean" }
                 }
             }
         },
@@ -238,7 +613,7 @@ class Config:
                 if value is not None:
                     config[key] = value
 
-    def merge_options(self, config_cli:argparse.Namespace=None) -> Dict:
+    def merge_options(self, config_cli:Optional[argparse.Namespace]=None) -> Dict:
         # handle CLI options if started from CLI interface
 
         # Handle MQTT CLI overrides
@@ -294,6 +669,48 @@ class Config:
             if config_cli.motoroff is not None:
                 self.config['tests']['motoroff'] = config_cli.motoroff
 
+            # device parameters
+            if config_cli.amb_thr is not None:
+                self.config['params']['amb_thr'] = config_cli.amb_thr
+            if config_cli.hum_thr is not None:
+                self.config['params']['hum_thr'] = config_cli.hum_thr
+            if config_cli.gas_thr is not None:
+                self.config['params']['gas_thr'] = config_cli.gas_thr
+            if config_cli.forced_time is not None:
+                self.config['params']['forced_time'] = config_cli.forced_time
+            if config_cli.post_time is not None:
+                self.config['params']['post_time'] = config_cli.post_time
+            if config_cli.ambient_light is not None:
+                self.config['params']['ambient_light'] = config_cli.ambient_light
+
+            # transport
+            if config_cli.transport is not None:
+                self.config['transport']['type'] = config_cli.transport
+            if config_cli.framing is not None:
+                self.config['transport']['framing'] = config_cli.framing
+            if config_cli.serial_port is not None:
+                self.config['serial']['port'] = config_cli.serial_port
+            if config_cli.baudrate is not None:
+                self.config['serial']['baudrate'] = config_cli.baudrate
+            if config_cli.connectivity is not None:
+                self.config['serial']['connectivity'] = config_cli.connectivity
+            if config_cli.session_expiry is not None:
+                self.config['transport']['session_expiry'] = config_cli.session_expiry
+            if config_cli.replay is not None:
+                self.config['transport']['replay'] = config_cli.replay
+            if config_cli.resume is not None:
+                self.config['transport']['resume'] = config_cli.resume
+
+            # command scheduler
+            if config_cli.broker_rate is not None:
+                self.config['scheduler']['broker_rate'] = config_cli.broker_rate
+            if config_cli.device_rate is not None:
+                self.config['scheduler']['device_rate'] = config_cli.device_rate
+
+            # state cache
+            if config_cli.cache is not None:
+                self.config['cache']['enabled'] = config_cli.cache
+
             # operatione options
             if config_cli.mode is not None:
                 self.config['options']['mode'] = config_cli.mode
@@ -301,6 +718,8 @@ class Config:
                 self.config['options']['monitor_delay'] = config_cli.monitor_delay
             if config_cli.monitor_loops is not None:
                 self.config['options']['monitor_loops'] = config_cli.monitor_loops
+            if config_cli.monitor_view is not None:
+                self.config['options']['monitor_view'] = config_cli.monitor_view
             if config_cli.dutdelay is not None:
                 self.config['options']['dutdelay'] = config_cli.dutdelay
             if config_cli.interactive is not None:
@@ -311,6 +730,93 @@ class Config:
                 self.config['options']['noresetwifi'] = config_cli.noresetwifi
             if config_cli.stop_if_failed is not None:
                 self.config['options']['stop_if_failed'] = config_cli.stop_if_failed
+            if config_cli.setparams is not None:
+                self.config['options']['setparams'] = config_cli.setparams
+            if config_cli.results is not None:
+                self.config['options']['results'] = config_cli.results
+            if config_cli.export is not None:
+                self.config['options']['export'] = config_cli.export
+            if config_cli.incremental is not None:
+                self.config['options']['incremental'] = config_cli.incremental
+
+            # presence tracking
+            if config_cli.presence is not None:
+                self.config['presence']['enabled'] = config_cli.presence
+
+            # configuration reload
+            if config_cli.watch_config is not None:
+                self.config['reload']['enabled'] = config_cli.watch_config
+
+            # perf mode
+            if config_cli.perf_samples is not None:
+                self.config['perf']['samples'] = config_cli.perf_samples
+            if config_cli.perf_in_flight is not None:
+                self.config['perf']['in_flight'] = [int(n) for n in config_cli.perf_in_flight.split(',') if n.strip()]
+            if config_cli.perf_max_p99 is not None:
+                self.config['perf']['max_p99_ms'] = config_cli.perf_max_p99
+
+            # traffic capture and replay
+            if config_cli.capture is not None:
+                self.config['capture']['path'] = config_cli.capture
+            if config_cli.replay_capture is not None:
+                self.config['replay']['capture'] = config_cli.replay_capture
+            if config_cli.replay_session is not None:
+                self.config['replay']['session'] = config_cli.replay_session
+            if config_cli.replay_speeds is not None:
+                self.config['replay']['speeds'] = [float(s) for s in config_cli.replay_speeds.split(',') if s.strip()]
+            if config_cli.replay_copies is not None:
+                self.config['replay']['copies'] = [int(c) for c in config_cli.replay_copies.split(',') if c.strip()]
+
+            # rack calibration
+            if config_cli.calibration_samples is not None:
+                self.config['calibration']['samples'] = config_cli.calibration_samples
+            if config_cli.calibration_threshold is not None:
+                self.config['calibration']['threshold'] = config_cli.calibration_threshold
+
+            # incremental retest
+            if config_cli.retest_cache is not None:
+                self.config['retest']['cache'] = config_cli.retest_cache
+            if config_cli.retest_validity is not None:
+                self.config['retest']['validity'] = config_cli.retest_validity
+
+            # soak
+            if config_cli.soak_duration is not None:
+                self.config['soak']['duration'] = config_cli.soak_duration
+            if config_cli.soak_checkpoint is not None:
+                self.config['soak']['checkpoint'] = config_cli.soak_checkpoint
+            if config_cli.soak_resume is not None:
+                self.config['soak']['resume'] = config_cli.soak_resume
+
+            # metrics endpoint
+            if config_cli.metrics_port is not None:
+                self.config['metrics']['enabled'] = True
+                self.config['metrics']['port'] = config_cli.metrics_port
+
+            # fleet options
+            if config_cli.fleet_devices is not None:
+                self.config['fleet']['devices'] = [d.strip() for d in config_cli.fleet_devices.split(',') if d.strip()]
+            if config_cli.workers is not None:
+                self.config['fleet']['workers'] = config_cli.workers
+            if config_cli.fleet_query is not None:
+                self.config['fleet']['query'] = config_cli.fleet_query
+
+            # inventory
+            if config_cli.inventory_snapshot is not None:
+                self.config['inventory']['snapshot'] = config_cli.inventory_snapshot
+
+            # operator input
+            if config_cli.input is not None:
+                self.config['operator']['channel'] = config_cli.input
+            if config_cli.input_port is not None:
+                self.config['operator']['port'] = config_cli.input_port
+
+            # pipeline options
+            if config_cli.units is not None:
+                self.config['pipeline']['units'] = config_cli.units
+            if config_cli.pipeline_depth is not None:
+                self.config['pipeline']['depth'] = config_cli.pipeline_depth
+            if config_cli.join_timeout is not None:
+                self.config['pipeline']['join_timeout'] = config_cli.join_timeout
 
         return self.config
 
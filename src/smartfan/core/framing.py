@@ -0,0 +1,83 @@
+# core/framing.py
+
+import json
+import struct
+from typing import Dict, Optional, Union
+
+# Binary framing of MS protocol messages, an alternative to the JSON + hex envelope.
+#
+#   command:  code (1 byte) | length (2 bytes, little endian) | data
+#   response: code (1 byte) | status (1 byte) | length (2 bytes, little endian) | data
+#
+# Binary frames travel on the topics whose 'format' part is 'bin' instead of 'json'.
+# A device advertises binary framing with the 'bin' capability in its version string,
+# e.g. '2.4.0+bin' (capabilities follow '+', separated by ',').
+
+COMMAND_CODES: Dict[str, int] = {
+    "WH": 0x01, "NP": 0x02, "SR": 0x03, "WF": 0x04, "MD": 0x05, "GM": 0x06,
+    "AH": 0x07, "HH": 0x08, "GH": 0x09, "FT": 0x0A, "PT": 0x0B, "AL": 0x0C,
+    "PG": 0x0D, "SV": 0x0E, "MQ": 0x0F, "RS": 0x10, "VS": 0x11, "SN": 0x12,
+    "ZA": 0x13, "MT": 0x14, "LE": 0x15, "TM": 0x16, "OT": 0x17, "TZ": 0x18
+}
+COMMAND_NAMES: Dict[int, str] = {code: name for name, code in COMMAND_CODES.items()}
+
+RESPONSE_STATUS = ("OK", "ERROR", "UNKNOWN", "BUSY")
+
+FRAMING_JSON = "json"
+FRAMING_BINARY = "bin"
+
+_command_header = struct.Struct('<BH')
+_response_header = struct.Struct('<BBH')
+
+def encode_json(cmd: str, data: bytes = b"") -> str:
+    return f'{{"command":"{cmd}","data":"{data.hex()}"}}'
+
+def encode_binary(cmd: str, data: bytes = b"") -> bytes:
+    return _command_header.pack(COMMAND_CODES[cmd], len(data)) + data
+
+def encode_command(cmd: str, data: bytes = b"", framing: str = FRAMING_JSON) -> Union[str, bytes]:
+    return encode_binary(cmd, data) if framing == FRAMING_BINARY else encode_json(cmd, data)
+
+def decode_binary_response(frame: bytes) -> dict:
+    """
+    Decode a binary response into the same kind of dict as a JSON response.
+    The data is kept as bytes under 'raw' instead of a hex string under 'data'.
+
+    :raises ValueError: if the frame is truncated or malformed
+    """
+    if len(frame) < _response_header.size:
+        raise ValueError("truncated binary response")
+    code, status, length = _response_header.unpack_from(frame)
+    raw = bytes(frame[_response_header.size:_response_header.size + length])
+    if len(raw) != length:
+        raise ValueError("truncated binary response data")
+    return {
+        "command": COMMAND_NAMES.get(code, f"{code:02X}"),
+        "response": RESPONSE_STATUS[status] if status < len(RESPONSE_STATUS) else f"STATUS{status}",
+        "raw": raw
+    }
+
+def encode_binary_response(cmd: str, data: bytes = b"", response: str = "OK") -> bytes:
+    """Build a binary response frame, as a device would. Used by stand-in devices and tests."""
+    return _response_header.pack(COMMAND_CODES[cmd], RESPONSE_STATUS.index(response), len(data)) + data
+
+def decode_response(message: Union[str, bytes], framing: str = FRAMING_JSON) -> dict:
+    if framing == FRAMING_BINARY:
+        return decode_binary_response(message if isinstance(message, bytes) else message.encode('latin-1'))
+    return json.loads(message)
+
+def payload_data(payload: dict) -> bytes:
+    """Data bytes of a decoded response of either framing."""
+    raw = payload.get('raw')
+    if raw is not None:
+        return raw
+    return bytes.fromhex(payload.get('data') or '')
+
+def supports_binary(version: Optional[str]) -> bool:
+    """True if a VS version string advertises the binary framing capability."""
+    if not version or '+' not in version:
+        return False
+    capabilities = version.split('+', 1)[1]
+    return FRAMING_BINARY in (c.strip() for c in capabilities.split(','))
+
+# core/framing.py
@@ -0,0 +1,341 @@
+# core/inventory.py
+
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion
+
+from smartfan.logger import get_app_logger
+from smartfan.core.framing import COMMAND_NAMES, FRAMING_BINARY, FRAMING_JSON, decode_response, payload_data
+from smartfan.core.mqtt5_transport import expand_topic
+
+logger = get_app_logger(__name__)
+
+# responses that identify a device
+INVENTORY_COMMANDS = ("WH", "GM", "ZA", "VS")
+
+class DeviceRecord:
+    __slots__ = ("uuid", "device_id", "mac", "machine_id", "version", "serial", "seen")
+
+    FIELDS = ("uuid", "device_id", "mac", "machine_id", "version", "serial", "seen")
+
+    def __init__(self, uuid: str) -> None:
+        self.uuid = uuid
+        self.device_id: Optional[int] = None
+        self.mac: Optional[str] = None
+        self.machine_id: Optional[str] = None
+        self.version: Optional[str] = None
+        self.serial: Optional[str] = None
+        self.seen = 0.0
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DeviceRecord":
+        record = cls(data["uuid"])
+        for name in cls.FIELDS[1:]:
+            setattr(record, name, data.get(name))
+        record.seen = record.seen or 0.0
+        return record
+
+
+class Inventory:
+    """
+    Index of the devices seen on the broker, joined from their WH, GM, ZA and VS responses.
+
+    Lookups by UUID, MAC address, serial number and firmware version are dict lookups.
+    The index is saved to a JSON snapshot and loaded from it for a warm start.
+    """
+
+    def __init__(self) -> None:
+        self.devices: Dict[str, DeviceRecord] = {}
+        self.by_mac: Dict[str, str] = {}
+        self.by_serial: Dict[str, str] = {}
+        self.by_version: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def update(self, uuid: str, cmd: str, payload: dict) -> bool:
+        """
+        Join a response into the record of the device.
+
+        :return: True if the response carried inventory data
+        """
+        if cmd not in INVENTORY_COMMANDS or payload.get("response", "") != "OK":
+            return False
+        try:
+            data = payload_data(payload)
+        except ValueError:
+            return False
+        with self.lock:
+            record = self.devices.get(uuid)
+            if record is None:
+                record = DeviceRecord(uuid)
+                self.devices[uuid] = record
+            record.seen = time.time()
+            if cmd == "WH" and data:
+                record.device_id = data[0]
+            elif cmd == "GM" and data:
+                self._reindex(self.by_mac, record.mac, normalize_mac(data.hex()), uuid)
+                record.mac = normalize_mac(data.hex())
+            elif cmd == "ZA" and data:
+                record.machine_id = data.hex()
+            elif cmd == "VS":
+                version, _, serial = data.partition(b'\0')
+                version_text = version.decode('ascii', 'replace')
+                serial_text = serial.decode('ascii', 'replace').rstrip('\x00')
+                if record.version is not None:
+                    self.by_version.get(record.version, set()).discard(uuid)
+                self.by_version.setdefault(version_text, set()).add(uuid)
+                record.version = version_text
+                self._reindex(self.by_serial, record.serial, serial_text, uuid)
+                record.serial = serial_text
+        return True
+
+    @staticmethod
+    def _reindex(index: Dict[str, str], old: Optional[str], new: str, uuid: str) -> None:
+        if old is not None and index.get(old) == uuid:
+            del index[old]
+        if new:
+            index[new] = uuid
+
+    def _add(self, record: DeviceRecord) -> None:
+        self.devices[record.uuid] = record
+        if record.mac:
+            self.by_mac[record.mac] = record.uuid
+        if record.serial:
+            self.by_serial[record.serial] = record.uuid
+        if record.version:
+            self.by_version.setdefault(record.version, set()).add(record.uuid)
+
+    # lookups
+
+    def get(self, uuid: str) -> Optional[DeviceRecord]:
+        return self.devices.get(uuid)
+
+    def find_mac(self, mac: str) -> Optional[DeviceRecord]:
+        uuid = self.by_mac.get(normalize_mac(mac))
+        return self.devices.get(uuid) if uuid else None
+
+    def find_serial(self, serial: str) -> Optional[DeviceRecord]:
+        uuid = self.by_serial.get(serial)
+        return self.devices.get(uuid) if uuid else None
+
+    def with_version(self, version: str) -> List[DeviceRecord]:
+        return [self.devices[uuid] for uuid in sorted(self.by_version.get(version, ()))]
+
+    def select(self, query: str) -> List[str]:
+        """
+        UUIDs of the devices matching a query of comma separated key=value terms, all of which
+        must match, e.g. 'version=2.4.0' or 'serial=109380-2501-0000001'.
+        Keys: uuid, mac, serial, version.
+
+        :raises ValueError: on an unknown key
+        """
+        uuids: Optional[Set[str]] = None
+        for term in filter(None, (t.strip() for t in query.split(','))):
+            key, _, value = term.partition('=')
+            key = key.strip()
+            value = value.strip()
+            if key == "uuid":
+                found = {value} if value in self.devices else set()
+            elif key == "mac":
+                found = {self.by_mac[normalize_mac(value)]} if normalize_mac(value) in self.by_mac else set()
+            elif key == "serial":
+                found = {self.by_serial[value]} if value in self.by_serial else set()
+            elif key == "version":
+                found = set(self.by_version.get(value, ()))
+            else:
+                raise ValueError(f"Unknown inventory key '{key}'")
+            uuids = found if uuids is None else uuids & found
+        return sorted(uuids if uuids is not None else self.devices)
+
+    # snapshots
+
+    def save(self, path: str) -> None:
+        with self.lock:
+            data = [record.as_dict() for record in self.devices.values()]
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"devices": data}, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        """Load a snapshot. False if there is none or it cannot be read (logged)."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot load inventory snapshot {path}: {e}")
+            return False
+        with self.lock:
+            for item in data.get("devices", []):
+                self._add(DeviceRecord.from_dict(item))
+        return True
+
+
+def normalize_mac(mac: str) -> str:
+    digits = "".join(c for c in mac.lower() if c in "0123456789abcdef")
+    return ":".join(digits[i:i + 2] for i in range(0, len(digits), 2))
+
+
+class InventoryListener:
+    """
+    Builds an Inventory from the broker traffic: subscribes to the command and response topics
+    of all devices and clients (the server_uuid and client_uuid parts of the templates replaced
+    by '+', the MQTT v5 reply topics '<response topic>/<client_id>' included) and joins every WH,
+    GM, ZA and VS response, whoever sent the command.
+
+    The device and the command code are taken from the command: its topic carries server_uuid,
+    its payload the code. A response is matched to its command by the MQTT v5 Correlation Data
+    and Response Topic, otherwise to the oldest command still waiting for a response on that
+    device (or on any device, if the response topic has no server_uuid part). Commands without
+    a response after the MS timeout are forgotten.
+    """
+
+    def __init__(self, config: Dict, inventory: Inventory) -> None:
+        self.mqtt_config = config['mqttms']['mqtt']
+        self.ms_config = config['mqttms']['ms']
+        self.inventory = inventory
+        self.cmd_template = self.ms_config['cmd_topic'].split('/')
+        self.rsp_template = self.ms_config['rsp_topic'].split('/')
+        self.timeout = self.ms_config.get('timeout') or 5.0
+        # commands waiting for their responses, oldest first:
+        # (response topic, correlation data) or a sequence number -> (server_uuid, command, time)
+        self.pending: Dict[object, Tuple[str, str, float]] = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2,
+                                  client_id=f"{self.mqtt_config.get('client_id', '')}-inventory",
+                                  protocol=mqtt.MQTTv5)
+        if self.mqtt_config.get('username'):
+            self.client.username_pw_set(self.mqtt_config['username'], self.mqtt_config.get('password'))
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def topics(self) -> List[str]:
+        topics = []
+        for fmt in (FRAMING_JSON, FRAMING_BINARY):
+            topics.append(expand_topic(self.ms_config['cmd_topic'], "+", "+", fmt))
+            # the response topic itself and the reply topics below it
+            topics.append(expand_topic(self.ms_config['rsp_topic'], "+", "+", fmt) + "/#")
+        return topics
+
+    def start(self) -> bool:
+        if "server_uuid" not in self.cmd_template:
+            logger.error("Inventory: command topic template %s has no server_uuid part", self.ms_config['cmd_topic'])
+            return False
+        try:
+            self.client.connect(self.mqtt_config['host'], self.mqtt_config['port'])
+        except OSError as e:
+            logger.error(f"Inventory: cannot connect to {self.mqtt_config['host']}:{self.mqtt_config['port']}: {e}")
+            return False
+        self.client.loop_start()
+        return True
+
+    def stop(self) -> None:
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def reconfigure(self, changes: Dict) -> None:
+        """Refresh the command timeout when the configuration is reloaded (see core/reload.py)."""
+        self.timeout = self.ms_config.get('timeout') or 5.0
+
+    def on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            logger.error("Inventory: connection refused: %s", reason_code)
+            return
+        client.subscribe([(topic, 0) for topic in self.topics()])
+
+    @staticmethod
+    def parse_topic(template: List[str], topic: str, prefix: bool = False) -> Optional[Tuple[Optional[str], str]]:
+        """
+        (server_uuid, framing) of a topic, None if it does not match the template.
+        With prefix, the topic may have more levels than the template (reply topics).
+        """
+        parts = topic.split('/')
+        if len(parts) < len(template) or (not prefix and len(parts) != len(template)):
+            return None
+        uuid = framing = None
+        for part, tmpl in zip(parts, template):
+            if tmpl == "server_uuid":
+                uuid = part
+            elif tmpl == "format":
+                framing = part
+            elif tmpl != "client_uuid" and part != tmpl:
+                return None
+        return uuid, framing or FRAMING_JSON
+
+    def on_message(self, client, userdata, message) -> None:
+        parsed = self.parse_topic(self.cmd_template, message.topic)
+        if parsed is not None and parsed[0] is not None:
+            self.on_command(parsed[0], parsed[1], message)
+            return
+        parsed = self.parse_topic(self.rsp_template, message.topic, prefix=True)
+        if parsed is not None:
+            self.on_response(parsed[0], parsed[1], message)
+
+    def on_command(self, uuid: str, framing: str, message: mqtt.MQTTMessage) -> None:
+        cmd = command_code(message.payload, framing)
+        if cmd is None:
+            return
+        now = time.monotonic()
+        props = message.properties
+        correlation = getattr(props, 'CorrelationData', None) if props else None
+        reply_topic = getattr(props, 'ResponseTopic', None) if props else None
+        key = (reply_topic, correlation) if correlation is not None and reply_topic else next(self.counter)
+        with self.lock:
+            # forget the commands that were never answered
+            while self.pending:
+                oldest = next(iter(self.pending))
+                if now - self.pending[oldest][2] < self.timeout:
+                    break
+                del self.pending[oldest]
+            self.pending[key] = (uuid, cmd, now)
+
+    def on_response(self, uuid: Optional[str], framing: str, message: mqtt.MQTTMessage) -> None:
+        try:
+            payload = decode_response(message.payload, framing)
+        except ValueError:
+            return
+        command = self.match(uuid, message)
+        if command is not None and isinstance(payload, dict):
+            self.inventory.update(command[0], command[1], payload)
+
+    def match(self, uuid: Optional[str], message: mqtt.MQTTMessage) -> Optional[Tuple[str, str, float]]:
+        """Pop the command a response answers, None if it is not known."""
+        props = message.properties
+        correlation = getattr(props, 'CorrelationData', None) if props else None
+        with self.lock:
+            if correlation is not None:
+                return self.pending.pop((message.topic, correlation), None)
+            # no correlation data - the oldest command of the device that may be answered here
+            for key, command in self.pending.items():
+                if isinstance(key, tuple) and key[0] != message.topic:
+                    continue
+                if uuid is None or command[0] == uuid:
+                    return self.pending.pop(key)
+        return None
+
+
+def command_code(message: bytes, framing: str) -> Optional[str]:
+    """The command code of a command payload of either framing, None if it is malformed."""
+    if framing == FRAMING_BINARY:
+        return COMMAND_NAMES.get(message[0]) if message else None
+    try:
+        command = json.loads(message)
+    except ValueError:
+        return None
+    return command.get("command") if isinstance(command, dict) else None
+
+# core/inventory.py
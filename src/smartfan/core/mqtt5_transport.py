@@ -0,0 +1,316 @@
+# core/mqtt5_transport.py
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from smartfan.logger import get_app_logger
+from smartfan.metrics import RECONNECTS
+from smartfan.core.framing import FRAMING_BINARY, FRAMING_JSON, decode_response
+
+logger = get_app_logger(__name__)
+
+@lru_cache(maxsize=65536)
+def expand_topic(template: str, client_uuid: str, server_uuid: str, fmt: str = "json") -> str:
+    """
+    Expand an MS protocol topic template such as '@/server_uuid/CMD/format'. The topics are
+    interned and cached: every command of a session publishes to the same string object.
+    """
+    return sys.intern(template.replace("client_uuid", client_uuid).replace("server_uuid", server_uuid).replace("format", fmt))
+
+
+class PendingResponse:
+    """A command waiting for its response. Matched by the MQTT v5 Correlation Data property."""
+    __slots__ = ("correlation", "event", "payload", "slot", "completed")
+
+    def __init__(self, correlation: bytes, slot: bool = False) -> None:
+        self.correlation = correlation
+        self.slot = slot
+        self.event = threading.Event()
+        self.payload: Optional[dict] = None
+        # time.perf_counter() when the response (or the timeout) arrived
+        self.completed = 0.0
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        self.event.wait(timeout)
+        return self.payload
+
+
+class ResponseTimeouts:
+    """
+    Response timeouts of the commands of a transport, kept in a deadline heap and served by one
+    thread, however many commands are in flight. 'expire' is called with each command whose
+    deadline passed; it ignores the ones that got their responses meanwhile, so answered
+    commands are not removed from the heap.
+    """
+
+    def __init__(self, expire: Callable[[PendingResponse], None], name: str) -> None:
+        self.expire = expire
+        self.name = name
+        self.heap: List[Tuple[float, int, PendingResponse]] = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.closed = False
+
+    def add(self, pending: PendingResponse, timeout: float) -> None:
+        with self.cond:
+            if self.closed:
+                return
+            heapq.heappush(self.heap, (time.monotonic() + timeout, next(self.counter), pending))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+                self.thread.start()
+            elif self.heap[0][2] is pending:
+                self.cond.notify()
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.heap.clear()
+            self.cond.notify()
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                while not self.closed and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    self.cond.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                if self.closed:
+                    return
+                now = time.monotonic()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap)[2])
+            for pending in due:
+                self.expire(pending)
+
+
+class MQTT5Transport:
+    """
+    MS protocol over MQTT v5 request/response properties.
+
+    Every command carries a Response Topic (private to this client) and Correlation Data, so
+    responses are matched to commands without parsing their payload and several commands may
+    be in flight at once. Responses on the templated response topic without Correlation Data
+    (firmware that does not honour the properties) are matched in order. Messages on other
+    topics (e.g. late responses of a previous session) are dropped. The response timeouts of
+    all commands are served by one thread (see ResponseTimeouts).
+
+    Offers the same interface as mqttms MSProtocol (put_command / response_received / response /
+    subscribe) and MQTTms (connect_mqtt_broker / graceful_exit / ms_protocol), so it can be used
+    by MShost and run_app in their place.
+
+    Binary frames (see core/framing.py) are published on the 'bin' variants of the topics.
+
+    A dropped connection is re-established in the background, with delays growing from
+    'reconnect_min' to 'reconnect_max'. The first connection starts a clean session that the broker
+    keeps for 'session_expiry' seconds, so later connections resume it: subscriptions survive and
+    responses published while the link was down are delivered afterwards. If the broker lost the
+    session anyway, the topics are subscribed again. Commands still waiting for their responses are
+    left to their timeouts; MShost replays the idempotent ones (see MShost.IDEMPOTENT).
+    """
+
+    supports_binary = True
+
+    def __init__(self, config: Dict) -> None:
+        self.mqtt_config = config['mqttms']['mqtt']
+        self.ms_config = config['mqttms']['ms']
+        self.transport_config = config['transport']
+        self.config = config
+
+        self.client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2,
+                                  client_id=self.mqtt_config.get('client_id', ''),
+                                  protocol=mqtt.MQTTv5)
+        if self.mqtt_config.get('username'):
+            self.client.username_pw_set(self.mqtt_config['username'], self.mqtt_config.get('password'))
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+        self.client.reconnect_delay_set(self.transport_config['reconnect_min'], self.transport_config['reconnect_max'])
+
+        # connected at least once / connected now
+        self.connected = threading.Event()
+        self.online = threading.Event()
+        # connection losses, see MShost.link_dropped
+        self.disconnects = 0
+        self.closing = False
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        self.pending: Dict[bytes, PendingResponse] = {}
+        self.timeouts = ResponseTimeouts(self._expire, "mqtt5-timeouts")
+        self.topics: Dict[str, str] = {}
+
+        # MSProtocol compatible single response slot
+        self.response_received = threading.Event()
+        self.response: Optional[dict] = None
+
+    @property
+    def ms_protocol(self) -> "MQTT5Transport":
+        return self
+
+    def cmd_topic(self, framing: str = FRAMING_JSON) -> str:
+        return expand_topic(self.ms_config['cmd_topic'], self.ms_config['client_uuid'], self.ms_config['server_uuid'], framing)
+
+    def rsp_topic(self, framing: str = FRAMING_JSON) -> str:
+        return expand_topic(self.ms_config['rsp_topic'], self.ms_config['client_uuid'], self.ms_config['server_uuid'], framing)
+
+    def reply_topic(self, framing: str = FRAMING_JSON) -> str:
+        # private Response Topic of this client, so that workers sharing one client_uuid get their own responses
+        return f"{self.rsp_topic(framing)}/{self.mqtt_config.get('client_id', '')}"
+
+    def response_topics(self) -> Dict[str, str]:
+        """Response topics to subscribe, with the framing of the messages on each of them."""
+        framings = [FRAMING_JSON] if self.config['transport']['framing'] == FRAMING_JSON else [FRAMING_JSON, FRAMING_BINARY]
+        topics = {}
+        for framing in framings:
+            topics[self.rsp_topic(framing)] = framing
+            topics[self.reply_topic(framing)] = framing
+        return topics
+
+    # connection
+
+    def connect_mqtt_broker(self) -> bool:
+        props = None
+        if self.transport_config['session_expiry']:
+            props = Properties(PacketTypes.CONNECT)
+            props.SessionExpiryInterval = self.transport_config['session_expiry']
+        try:
+            # clean session on the first connection, resumed session on reconnections
+            self.client.connect(self.mqtt_config['host'], self.mqtt_config['port'],
+                                clean_start=mqtt.MQTT_CLEAN_START_FIRST_ONLY, properties=props)
+        except OSError as e:
+            logger.error(f"MQTT5: cannot connect to {self.mqtt_config['host']}:{self.mqtt_config['port']}: {e}")
+            return False
+        self.client.loop_start()
+        if not self.connected.wait(self.mqtt_config.get('timeout', 15.0)):
+            logger.error("MQTT5: no CONNACK from the broker")
+            self.client.loop_stop()
+            return False
+        return True
+
+    def on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            logger.error("MQTT5: connection refused: %s", reason_code)
+            return
+        logger.info("MQTT5: connected to %s", self.mqtt_config['host'])
+        if self.connected.is_set():
+            RECONNECTS.inc()
+            if not flags.session_present and self.topics:
+                logger.warning("MQTT5: session not resumed, subscribing again")
+                self._subscribe()
+        self.connected.set()
+        self.online.set()
+
+    def on_disconnect(self, client, userdata, flags, reason_code, properties) -> None:
+        self.online.clear()
+        if self.closing:
+            logger.info("MQTT5: disconnected")
+        else:
+            self.disconnects += 1
+            logger.warning("MQTT5: connection lost (%s), reconnecting", reason_code)
+
+    def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the connection to the broker is up. True if it is."""
+        return self.online.wait(timeout)
+
+    def subscribe(self) -> bool:
+        self.topics = self.response_topics()
+        return self._subscribe()
+
+    def _subscribe(self) -> bool:
+        topics: List[Tuple[str, int]] = [(t, 1) for t in self.topics]
+        result, _ = self.client.subscribe(topics)
+        if result != mqtt.MQTT_ERR_SUCCESS:
+            logger.error("MQTT5: cannot subscribe: %s", mqtt.error_string(result))
+            return False
+        return True
+
+    def graceful_exit(self) -> None:
+        self.timeouts.close()
+        with self.lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+        for p in pending:
+            self._complete(p, {"response": "DISCONNECTED"})
+        self.closing = True
+        # the session is not needed any more
+        props = Properties(PacketTypes.DISCONNECT)
+        props.SessionExpiryInterval = 0
+        self.client.disconnect(properties=props)
+        self.client.loop_stop()
+
+    # requests
+
+    def request(self, payload: Union[str, bytes], slot: bool = False, framing: str = FRAMING_JSON) -> PendingResponse:
+        """
+        Publish a command and return the object that will receive its response.
+
+        :param slot: also deliver the response in the MSProtocol compatible response slot
+        :param framing: framing of the payload, 'json' or 'bin'
+        """
+        correlation = next(self.counter).to_bytes(8, 'big')
+        pending = PendingResponse(correlation, slot)
+        props = Properties(PacketTypes.PUBLISH)
+        props.ResponseTopic = self.reply_topic(framing)
+        props.CorrelationData = correlation
+        with self.lock:
+            self.pending[correlation] = pending
+        self.client.publish(self.cmd_topic(framing), payload, qos=1, properties=props)
+        timeout = self.ms_config.get('timeout', 5.0)
+        if timeout:
+            self.timeouts.add(pending, timeout)
+        return pending
+
+    def put_command(self, payload: Union[str, bytes], framing: str = FRAMING_JSON) -> None:
+        self.request(payload, slot=True, framing=framing)
+
+    def _expire(self, pending: PendingResponse) -> None:
+        with self.lock:
+            if self.pending.get(pending.correlation) is not pending:
+                return
+            del self.pending[pending.correlation]
+        logger.warning("MQTT5: response timeout")
+        self._complete(pending, {"response": "TIMEOUT"})
+
+    def _complete(self, pending: PendingResponse, payload: dict) -> None:
+        pending.completed = time.perf_counter()
+        pending.payload = payload
+        pending.event.set()
+        if pending.slot:
+            self.response = payload
+            self.response_received.set()
+
+    def on_message(self, client, userdata, message) -> None:
+        framing = self.topics.get(message.topic)
+        if framing is None:
+            logger.debug("MQTT5: dropped message on %s", message.topic)
+            return
+        try:
+            payload = decode_response(message.payload, framing)
+        except ValueError as e:
+            logger.error(f"MQTT5: invalid response payload: {e}")
+            return
+        correlation = getattr(message.properties, 'CorrelationData', None) if message.properties else None
+        with self.lock:
+            if correlation is not None:
+                pending = self.pending.pop(correlation, None)
+            elif self.pending:
+                # no correlation data - the oldest outstanding command
+                pending = self.pending.pop(next(iter(self.pending)))
+            else:
+                pending = None
+        if pending is None:
+            logger.warning("MQTT5: unexpected response: %s", payload)
+            return
+        self._complete(pending, payload)
+
+# core/mqtt5_transport.py
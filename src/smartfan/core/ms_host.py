@@ -1,61 +1,267 @@
 # ms_host.py
 
 import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 from  mqttms import MSProtocol
 from smartfan.logger import get_app_logger
+from smartfan.metrics import COMMAND_SECONDS, COMMAND_TIMEOUTS, COMMANDS_IN_FLIGHT
+from smartfan.core.state_cache import DeviceStateCache
+from smartfan.core.payload_log import PayloadLog
+from smartfan.core.scheduler import CommandScheduler, get_scheduler
+from smartfan.core.capture import TrafficCapture, get_capture
+from smartfan.core.mqtt5_transport import expand_topic
+from smartfan.core.framing import FRAMING_BINARY, FRAMING_JSON, encode_command, payload_data, supports_binary
 
 logger = get_app_logger(__name__)
 
 class MShost:
-    def __init__(self, ms_protocol: MSProtocol, config):
+    # Device parameters in the order of the PG response, with the command that sets each of them
+    PARAMS = (
+        ("amb_thr", "AH"),
+        ("hum_thr", "HH"),
+        ("gas_thr", "GH"),
+        ("forced_time", "FT"),
+        ("post_time", "PT"),
+        ("ambient_light", "AL")
+    )
+    PARAMS_FORMAT = '<HHHHHH'
+
+    # Commands that may be sent again when their response is lost: reads, and setters of a state
+    # that are harmless to repeat. RS, OT, WF, MQ, SV and TM act on the device and are never replayed.
+    IDEMPOTENT = frozenset(("WH", "NP", "SR", "GM", "PG", "VS", "ZA", "SN",
+                            "AH", "HH", "GH", "FT", "PT", "AL", "MD", "MT", "LE", "TZ"))
+    # responses that mean the command may not have reached the device
+    LOST = ("TIMEOUT", "DISCONNECTED")
+
+    # one MShost per DUT session, see core/session.py
+    __slots__ = ("ms_protocol", "config", "cache", "response_timeout", "framing", "framings", "replay",
+                 "reconnect_timeout", "lost", "payload_log", "scheduler", "capture")
+
+    def __init__(self, ms_protocol: MSProtocol, config, cache: Optional[DeviceStateCache] = None,
+                 scheduler: Optional[CommandScheduler] = None, capture: Optional[TrafficCapture] = None):
         self.ms_protocol = ms_protocol
         self.config = config
+        if cache is None:
+            cache_config = config.config['cache'] if config is not None else {'enabled': False}
+            cache = DeviceStateCache(cache_config['ttl'] if cache_config['enabled'] else {})
+        self.cache = cache
+        # the transport has its own MS timeout; this only guards against waiting forever
+        self.response_timeout = 2 * config.config['mqttms']['ms']['timeout'] if config is not None else None
+        self.framing = config.config['transport']['framing'] if config is not None else FRAMING_JSON
+        self.framings: Dict[str, str] = {}
+        transport = config.config['transport'] if config is not None else {}
+        self.replay = transport.get('replay', 0)
+        self.reconnect_timeout = transport.get('reconnect_timeout', 0.0)
+        # commands whose response was lost for good to a dropped connection, see TestBench.run_tests
+        self.lost = 0
+        self.payload_log = PayloadLog(logger, config.config if config is not None else None)
+        # admission of commands, shared by all MShost objects of the process
+        if scheduler is None and config is not None:
+            scheduler = get_scheduler(config.config)
+        self.scheduler = scheduler
+        # traffic capture of the process, see core/capture.py
+        if capture is None and config is not None:
+            capture = get_capture(config.config)
+        self.capture = capture
+
+    def reconfigure(self, changes: Dict) -> None:
+        """
+        Refresh what was taken from the configuration when it is reloaded (see core/reload.py).
+        'changes' maps the changed dotted paths to (old, new) values.
+        """
+        config = self.config.config
+        transport = config['transport']
+        self.response_timeout = 2 * config['mqttms']['ms']['timeout']
+        self.replay = transport.get('replay', 0)
+        self.reconnect_timeout = transport.get('reconnect_timeout', 0.0)
+        if any(path.startswith(("logging.", "mqttms.mqtt.long_payload")) for path in changes):
+            self.payload_log = PayloadLog(logger, config)
+        if any(path.startswith("cache.ttl.") for path in changes) and config['cache']['enabled']:
+            self.cache.ttl = {cmd: seconds for cmd, seconds in config['cache']['ttl'].items() if seconds > 0}
+        if self.scheduler is not None and any(path.startswith("scheduler.") for path in changes):
+            self.scheduler.reconfigure()
+
+    @property
+    def dut(self) -> str:
+        return self.config.config['mqttms']['ms']['server_uuid'] if self.config is not None else ""
+
+    def device_framing(self, dut: str) -> str:
+        """
+        Framing used with the device: JSON, or binary when it is enabled, the transport can carry
+        binary frames and the device advertises the capability in its VS version string.
+        """
+        framing = self.framings.get(dut)
+        if framing is None:
+            # the probe below goes over JSON
+            framing = FRAMING_JSON
+            self.framings[dut] = framing
+            if self.framing in ("auto", FRAMING_BINARY) and getattr(self.ms_protocol, 'supports_binary', False):
+                if self.framing == FRAMING_BINARY or supports_binary(self.read_version()[0]):
+                    framing = FRAMING_BINARY
+            self.framings[dut] = framing
+            logger.info("MSH: %s framing with %s", framing, dut)
+        return framing
+
+    def ms_transaction(self, cmd: str, data: bytes = b""):
+        dut = self.dut
+        if not data and self.cache.cacheable(cmd):
+            payload = self.cache.get(dut, cmd)
+            if payload is not None:
+                self.payload_log.response(cmd, payload, cached=True)
+                return payload
+        self.cache.command_sent(dut, cmd)
+
+        framing = self.device_framing(dut)
+        attempts = 1 + (self.replay if cmd in self.IDEMPOTENT else 0)
+        start = time.perf_counter()
+        dropped = False
+        COMMANDS_IN_FLIGHT.inc()
+        try:
+            for attempt in range(attempts):
+                if attempt:
+                    if not self.wait_connected():
+                        logger.error("MSH: broker connection not restored, %s not replayed", cmd)
+                        break
+                    logger.warning("MSH: replaying %s (%d/%d)", cmd, attempt, attempts - 1)
+                disconnects = self.disconnects()
+                payload = self._exchange(cmd, data, framing)
+                if payload.get("response","") not in self.LOST:
+                    break
+                COMMAND_TIMEOUTS.inc(cmd)
+                # a device that is silent on a working link gets no second chance
+                dropped = self.link_dropped(payload, disconnects)
+                if not dropped:
+                    break
+        finally:
+            COMMANDS_IN_FLIGHT.dec()
+        COMMAND_SECONDS.observe(time.perf_counter() - start, cmd)
+        if dropped and payload.get("response","") in self.LOST:
+            self.lost += 1
+        self.payload_log.response(cmd, payload)
+        if not data:
+            self.cache.put(dut, cmd, payload)
+        return payload
 
-    def ms_simple_command(self, cmd: str):
-        payload = f'{{"command":"{cmd}","data":""}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
+    def _exchange(self, cmd: str, data: bytes, framing: str) -> dict:
+        if self.scheduler is not None:
+            self.scheduler.acquire(self.dut, cmd)
+        message = encode_command(cmd, data, framing)
+        if self.capture is not None:
+            self.capture.sent(self.dut, cmd, self.topic('cmd_topic', framing), message, framing)
+        sent = time.perf_counter()
+        if framing == FRAMING_JSON:
+            self.ms_protocol.put_command(message)
+        else:
+            self.ms_protocol.put_command(message, framing=framing)
+
+        if self.ms_protocol.response_received.wait(self.response_timeout):
+            payload = self.ms_protocol.response
+        else:
+            logger.error("MSH: no response to %s", cmd)
+            payload = {"response": "TIMEOUT"}
         self.ms_protocol.response_received.clear()
+        if self.capture is not None:
+            self.capture.received(self.dut, cmd, self.topic('rsp_topic', framing), payload, framing, time.perf_counter() - sent)
         return payload
 
+    def ms_pipelined(self, commands: List[Tuple[str, bytes]]) -> List[dict]:
+        """
+        Send several commands without waiting in between, then wait for all their responses.
+        Only for transports with request() (mqtt5, serial), which match responses to commands.
+        The commands are not served from the state cache; one whose response was lost to a
+        dropped connection is sent again through ms_transaction(), which replays it.
+
+        :param commands: (command code, data) tuples
+        :return: the responses, in the order of the commands
+        """
+        dut = self.dut
+        framing = self.device_framing(dut)
+        disconnects = self.disconnects()
+        sent = []
+        COMMANDS_IN_FLIGHT.inc(amount=len(commands))
+        try:
+            for cmd, data in commands:
+                self.cache.command_sent(dut, cmd)
+                if self.scheduler is not None:
+                    self.scheduler.acquire(dut, cmd)
+                message = encode_command(cmd, data, framing)
+                if self.capture is not None:
+                    self.capture.sent(dut, cmd, self.topic('cmd_topic', framing), message, framing)
+                sent.append((cmd, data, time.perf_counter(), self.ms_protocol.request(message, framing=framing)))
+            payloads = []
+            for cmd, data, start, pending in sent:
+                # the responses arrive while the first ones are waited for: the deadlines run from each send
+                timeout = None if self.response_timeout is None else max(start + self.response_timeout - time.perf_counter(), 0.0)
+                payload = pending.wait(timeout)
+                if payload is None:
+                    logger.error("MSH: no response to %s", cmd)
+                    payload = {"response": "TIMEOUT"}
+                elapsed = (pending.completed or time.perf_counter()) - start
+                COMMAND_SECONDS.observe(elapsed, cmd)
+                if self.capture is not None:
+                    self.capture.received(dut, cmd, self.topic('rsp_topic', framing), payload, framing, elapsed)
+                payloads.append(payload)
+        finally:
+            COMMANDS_IN_FLIGHT.dec(amount=len(commands))
+        results = []
+        for (cmd, data, _, _), payload in zip(sent, payloads):
+            if payload.get("response","") in self.LOST:
+                COMMAND_TIMEOUTS.inc(cmd)
+                if self.link_dropped(payload, disconnects) and cmd in self.IDEMPOTENT:
+                    results.append(self.ms_transaction(cmd, data))
+                    continue
+            self.payload_log.response(cmd, payload)
+            results.append(payload)
+        return results
+
+    def topic(self, template: str, framing: str) -> str:
+        """Command ('cmd_topic') or response ('rsp_topic') topic of the DUT."""
+        ms_config = self.config.config['mqttms']['ms'] if self.config is not None else {}
+        return expand_topic(ms_config.get(template, ''), ms_config.get('client_uuid', ''), self.dut, framing)
+
+    def disconnects(self) -> int:
+        """Connection losses of the transport so far; 0 for transports that do not count them (mqttms)."""
+        return getattr(self.ms_protocol, 'disconnects', 0)
+
+    def link_dropped(self, payload: dict, disconnects: int) -> bool:
+        """
+        True if the response was lost because the transport went offline (it reported DISCONNECTED,
+        is offline now or lost its connection since 'disconnects' was read), not because the
+        device did not answer.
+        """
+        if payload.get("response","") == "DISCONNECTED":
+            return True
+        online = getattr(self.ms_protocol, 'online', None)
+        if isinstance(online, threading.Event) and not online.is_set():
+            return True
+        return self.disconnects() != disconnects
+
+    def wait_connected(self) -> bool:
+        """
+        Wait until the transport is connected to the broker again. Transports that do not
+        report their connection state (mqttms) are taken as connected.
+        """
+        wait = getattr(self.ms_protocol, 'wait_connected', None)
+        return wait(self.reconnect_timeout) if wait is not None else True
+
+    def ms_simple_command(self, cmd: str):
+        return self.ms_transaction(cmd)
+
     def ms_command_send_uint16(self, cmd: str, value: int):
         format_string = '<H'
-        pd = struct.pack(format_string,value).hex()
-        payload = f'{{"command":"{cmd}","data":"{pd}"}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
-        self.ms_protocol.response_received.clear()
-        return payload
+        pd = struct.pack(format_string,value)
+        return self.ms_transaction(cmd, pd)
 
     def ms_command_send_uint8(self, cmd: str, value: int):
         format_string = '<B'
-        pd = struct.pack(format_string,value).hex()
-        payload = f'{{"command":"{cmd}","data":"{pd}"}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
-        self.ms_protocol.response_received.clear()
-        return payload
+        pd = struct.pack(format_string,value)
+        return self.ms_transaction(cmd, pd)
 
     def ms_command_send_string(self, cmd: str, value: str):
         value_bytes = value.encode('ascii')
-        data = value_bytes.hex()
-        payload = f'{{"command":"{cmd}","data":"{data}"}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
-        self.ms_protocol.response_received.clear()
-        return payload
+        return self.ms_transaction(cmd, value_bytes)
 
     def ms_who_am_i(self):
         return self.ms_simple_command("WH")
@@ -69,28 +275,13 @@ class MShost:
     def ms_wificred(self, ssid: str, password: str):
         ssid_bytes = ssid.encode('ascii')
         password_bytes = password.encode('ascii')
-        data = bytearray(ssid_bytes) + b'\0' + bytearray(password_bytes)
-        data = data.hex()
-        payload = f'{{"command":"WF","data":"{data}"}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
-        self.ms_protocol.response_received.clear()
-        return payload
+        data = bytes(ssid_bytes) + b'\0' + bytes(password_bytes)
+        return self.ms_transaction("WF", data)
 
     def ms_set_mode(self, mode: int):
         format_string = 'B'
-        pd = struct.pack(format_string,mode).hex()
-        payload = f'{{"command":"MD","data":"{pd}"}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
-        self.ms_protocol.response_received.clear()
-        return payload
+        pd = struct.pack(format_string,mode)
+        return self.ms_transaction("MD", pd)
 
     def ms_getsmac(self):
         return self.ms_simple_command("GM")
@@ -116,6 +307,73 @@ class MShost:
     def ms_get_params(self):
         return self.ms_simple_command("PG")
 
+    def read_params(self) -> Optional[Dict[str, int]]:
+        """
+        Read the device parameters with PG. The readout is served from the state cache while it is fresh.
+
+        :return: parameters by name, or None if the device did not answer with valid data
+        """
+        payload = self.ms_get_params()
+        if payload.get("response","") != "OK":
+            return None
+        try:
+            values = struct.unpack(self.PARAMS_FORMAT, payload_data(payload))
+        except (struct.error, ValueError, TypeError) as e:
+            logger.error(f"MSH: cannot decode PG response: {e}")
+            return None
+        return {name: value for (name, _), value in zip(self.PARAMS, values)}
+
+    def apply_params(self, params: Dict[str, int]) -> bool:
+        """
+        Bring the device parameters to the given values.
+
+        Only parameters that differ from the cached PG readout are set, one setter command per
+        parameter, without reading PG in between. Transports with request() (mqtt5, serial) get
+        all setters at once and the responses are waited for together (see ms_pipelined); over
+        mqttms, whose single response slot holds one command at a time, each setter is a
+        separate blocking round trip. The setters invalidate the cached readout, so a single PG
+        read at the end verifies the result on the device. A failed setter does not undo the
+        others.
+
+        :param params: parameters by name, see MShost.PARAMS
+        :return: True if the device reports all requested values at the end
+        :raises ValueError: if an unknown parameter name is given
+        """
+        setters = dict(self.PARAMS)
+        unknown = set(params) - set(setters)
+        if unknown:
+            raise ValueError(f"Unknown device parameters: {', '.join(sorted(unknown))}")
+
+        current = self.read_params()
+        if current is None:
+            logger.error("MSH: cannot read device parameters")
+            return False
+
+        changed = {name: value for name, value in params.items() if current.get(name) != value}
+        if not changed:
+            logger.info("MSH: device parameters are up to date")
+            return True
+
+        commands = [(setters[name], struct.pack('<H', value)) for name, value in changed.items()]
+        if hasattr(self.ms_protocol, 'request'):
+            payloads = self.ms_pipelined(commands)
+        else:
+            payloads = [self.ms_transaction(cmd, data) for cmd, data in commands]
+        for (name, value), payload in zip(changed.items(), payloads):
+            if payload.get("response","") != "OK":
+                logger.warning("MSH: setting %s = %d received answer: %s", name, value, payload.get("response",""))
+
+        actual = self.read_params()
+        if actual is None:
+            logger.error("MSH: cannot verify device parameters")
+            return False
+        mismatched = [name for name, value in params.items() if actual.get(name) != value]
+        if mismatched:
+            logger.error("MSH: device parameters not applied: %s", ", ".join(mismatched))
+            return False
+        logger.info("MSH: applied device parameters: %s", ", ".join(f"{k}={v}" for k, v in changed.items()))
+        return True
+
     def ms_start_vent(self):
         return self.ms_simple_command("SV")
 
@@ -131,17 +389,25 @@ class MShost:
     def ms_version(self):
         return self.ms_simple_command("VS")
 
+    def read_version(self) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Read firmware version and serial number with VS.
+
+        :return: (version, serial), (None, None) if the device did not answer with valid data
+        """
+        payload = self.ms_version()
+        if payload.get("response","") != "OK":
+            return None, None
+        try:
+            version_bytes, serial_bytes = payload_data(payload).split(b'\0',1)
+            return version_bytes.decode('ascii'), serial_bytes.decode('ascii').rstrip('\x00')
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.error(f"MSH: cannot decode VS response: {e}")
+            return None, None
+
     def ms_serial(self, sn: str):
         sn_bytes = sn.encode('ascii')
-        data = sn_bytes.hex()
-        payload = f'{{"command":"SN","data":"{data}"}}'
-        self.ms_protocol.put_command(payload)
-
-        self.ms_protocol.response_received.wait()
-        payload = self.ms_protocol.response
-        logger.info(f"MSH response: {payload}")
-        self.ms_protocol.response_received.clear()
-        return payload
+        return self.ms_transaction("SN", sn_bytes)
 
     def ms_getmachid(self):
         return self.ms_simple_command("ZA")
@@ -0,0 +1,86 @@
+# core/payload_log.py
+
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "off": None
+}
+
+class PayloadText:
+    """
+    Lazy text of a response for %-style logging: the payload is formatted only if the record is
+    emitted. Data longer than 'limit' characters (hex) is cut, unless the limit is 0.
+    """
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload: dict, limit: int = 0) -> None:
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if not self.limit:
+            return str(self.payload)
+        shown = dict(self.payload)
+        for key in ("data", "raw"):
+            data = shown.get(key)
+            if isinstance(data, (bytes, bytearray)):
+                data = data.hex()
+            if data and len(data) > self.limit:
+                shown[key] = f"{data[:self.limit]}... ({len(data)} chars)"
+        return str(shown)
+
+
+class PayloadLog:
+    """
+    Logging policy of MS protocol payloads.
+
+    - per command code level ([logging] payload_levels), 'off' drops the payloads of a command;
+      commands not listed are logged at INFO
+    - sampling ([logging] payload_sample): only 1 in N responses of a command is logged;
+      responses other than OK are always logged
+    - data longer than [mqttms.mqtt] long_payload is truncated, unless [logging] verbose is set
+
+    Nothing is formatted for payloads that are not logged.
+    """
+    __slots__ = ("logger", "levels", "sample", "limit", "counts", "threshold")
+
+    def __init__(self, logger: logging.Logger, config: Optional[Dict] = None) -> None:
+        self.logger = logger
+        logging_config = config['logging'] if config is not None else {}
+        self.levels = {cmd: LEVELS[level] for cmd, level in logging_config.get('payload_levels', {}).items()}
+        self.sample = dict(logging_config.get('payload_sample', {}))
+        self.limit = 0
+        if config is not None and not logging_config.get('verbose', False):
+            self.limit = config['mqttms']['mqtt'].get('long_payload', 0)
+        self.counts: Dict[str, int] = {}
+        self.threshold = logging.NOTSET
+
+    def response(self, cmd: str, payload: dict, cached: bool = False) -> None:
+        level = self.levels.get(cmd, logging.INFO)
+        if level is None or level < self.threshold or not self.logger.isEnabledFor(level):
+            return
+        every = self.sample.get(cmd, 1)
+        if every > 1 and payload.get("response", "") == "OK":
+            count = self.counts.get(cmd, 0)
+            self.counts[cmd] = count + 1
+            if count % every:
+                return
+        msg = "MSH cached response %s: %s" if cached else "MSH response %s: %s"
+        self.logger.log(level, msg, cmd, PayloadText(payload, self.limit))
+
+    @contextmanager
+    def muted(self, threshold: int = logging.WARNING) -> Iterator[None]:
+        """Drop payloads logged below threshold for the duration, e.g. while the monitor owns the screen."""
+        previous = self.threshold
+        self.threshold = threshold
+        try:
+            yield
+        finally:
+            self.threshold = previous
+
+# core/payload_log.py
@@ -0,0 +1,167 @@
+# core/presence.py
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion
+
+from smartfan.logger import get_app_logger
+from smartfan.core.mqtt5_transport import expand_topic
+
+logger = get_app_logger(__name__)
+
+STATUS_ONLINE = "online"
+STATUS_OFFLINE = "offline"
+
+# bits of the SR state byte that mean the device is ready for tests
+DEV_WIFI_CONNECTED = 0x10
+DEV_MQTT_SUBSCRIBED = 0x20
+
+def status_message(online: bool, state: Optional[int] = None) -> bytes:
+    """Status message of a device: {"status": "online"|"offline", "state": <SR state byte>}."""
+    status = {"status": STATUS_ONLINE if online else STATUS_OFFLINE}
+    if state is not None:
+        status["state"] = state
+    return json.dumps(status, separators=(',', ':')).encode('ascii')
+
+def parse_status(payload: bytes):
+    """
+    (online, state) of a status message: JSON as built by status_message() or the bare words
+    'online' / 'offline'. None if it is neither. An empty message (a cleared retained status)
+    is offline.
+    """
+    text = payload.decode('utf-8', 'replace').strip()
+    if not text:
+        return False, None
+    if text in (STATUS_ONLINE, STATUS_OFFLINE):
+        return text == STATUS_ONLINE, None
+    try:
+        status = json.loads(text)
+        return status["status"] == STATUS_ONLINE, status.get("state")
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class PresenceRecord:
+    __slots__ = ("uuid", "online", "state", "since")
+
+    def __init__(self, uuid: str, online: bool, state: Optional[int], since: float) -> None:
+        self.uuid = uuid
+        self.online = online
+        self.state = state
+        self.since = since
+
+    @property
+    def ready(self) -> bool:
+        """Online, and connected to WiFi and subscribed if the device reports its state byte."""
+        if not self.online:
+            return False
+        return self.state is None or self.state & (DEV_WIFI_CONNECTED | DEV_MQTT_SUBSCRIBED) == (DEV_WIFI_CONNECTED | DEV_MQTT_SUBSCRIBED)
+
+
+class PresenceTracker:
+    """
+    Online / offline table of the devices, pushed by the broker instead of polled with SR.
+
+    A device publishes a retained 'online' status on its status topic when it connects and
+    registers an 'offline' status as its Last Will, which the broker publishes when the device
+    drops off. The tracker subscribes to the status topics of all devices (the server_uuid part
+    of [presence] topic replaced by '+'); the retained statuses fill the table at once, later
+    changes arrive as they happen. No command is sent to the devices.
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.mqtt_config = config['mqttms']['mqtt']
+        self.ms_config = config['mqttms']['ms']
+        self.template = config['presence']['topic']
+        self.parts = self.template.split('/')
+        self.devices: Dict[str, PresenceRecord] = {}
+        self.cond = threading.Condition()
+        self.subscribed = threading.Event()
+        self.client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2,
+                                  client_id=f"{self.mqtt_config.get('client_id', '')}-presence")
+        if self.mqtt_config.get('username'):
+            self.client.username_pw_set(self.mqtt_config['username'], self.mqtt_config.get('password'))
+        self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_message = self.on_message
+
+    def topic(self, uuid: str) -> str:
+        return expand_topic(self.template, self.ms_config['client_uuid'], uuid)
+
+    def start(self, settle: float = 0.0) -> bool:
+        """Connect and subscribe; wait 'settle' seconds for the retained statuses."""
+        if "server_uuid" not in self.parts:
+            logger.error("Presence: status topic template %s has no server_uuid part", self.template)
+            return False
+        try:
+            self.client.connect(self.mqtt_config['host'], self.mqtt_config['port'])
+        except OSError as e:
+            logger.error(f"Presence: cannot connect to {self.mqtt_config['host']}:{self.mqtt_config['port']}: {e}")
+            return False
+        self.client.loop_start()
+        if not self.subscribed.wait(self.mqtt_config.get('timeout', 15.0)):
+            logger.error("Presence: not subscribed in time")
+            self.stop()
+            return False
+        if settle:
+            time.sleep(settle)
+        return True
+
+    def stop(self) -> None:
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            logger.error("Presence: connection refused: %s", reason_code)
+            return
+        client.subscribe(expand_topic(self.template, self.ms_config['client_uuid'], "+"), qos=1)
+
+    def on_subscribe(self, client, userdata, mid, reason_codes, properties) -> None:
+        self.subscribed.set()
+
+    def on_message(self, client, userdata, message) -> None:
+        parts = message.topic.split('/')
+        if len(parts) != len(self.parts):
+            return
+        uuid = parts[self.parts.index("server_uuid")]
+        status = parse_status(message.payload)
+        if status is None:
+            logger.warning("Presence: invalid status of %s: %r", uuid, message.payload[:32])
+            return
+        self.update(uuid, *status)
+
+    def update(self, uuid: str, online: bool, state: Optional[int] = None) -> None:
+        with self.cond:
+            record = self.devices.get(uuid)
+            if record is None or record.online != online:
+                logger.info("Presence: %s %s", uuid, STATUS_ONLINE if online else STATUS_OFFLINE)
+                self.devices[uuid] = PresenceRecord(uuid, online, state, time.time())
+            else:
+                record.state = state
+            self.cond.notify_all()
+
+    # queries
+
+    def is_ready(self, uuid: str) -> bool:
+        with self.cond:
+            record = self.devices.get(uuid)
+            return record is not None and record.ready
+
+    def ready(self, uuids: Optional[List[str]] = None) -> List[str]:
+        """The devices known to be ready, of 'uuids' if given, in their order."""
+        with self.cond:
+            if uuids is None:
+                return sorted(u for u, r in self.devices.items() if r.ready)
+            return [u for u in uuids if u in self.devices and self.devices[u].ready]
+
+    def wait_ready(self, uuid: str, timeout: float) -> bool:
+        """Wait until the device is reported ready. False if it is not within timeout seconds."""
+        with self.cond:
+            return self.cond.wait_for(lambda: uuid in self.devices and self.devices[uuid].ready, timeout)
+
+# core/presence.py
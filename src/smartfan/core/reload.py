@@ -0,0 +1,288 @@
+# core/reload.py
+
+import argparse
+import copy
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from jsonschema import validate, ValidationError
+
+from smartfan.logger import get_app_logger
+from smartfan.core.config import Config
+
+logger = get_app_logger(__name__)
+
+# Settings applied to the running session when the configuration file changes, by dotted path
+# prefix. Everything else (broker, topics, transport type, mode, workers, endpoints) needs new
+# connections or objects and is staged until the next start.
+SAFE_KEYS = (
+    "logging.verbose", "logging.payload_levels", "logging.payload_sample",
+    "mqttms.ms.timeout", "mqttms.mqtt.long_payload",
+    "transport.replay", "transport.resume", "transport.reconnect_timeout",
+    "dut.", "tests.", "params.", "cache.ttl.", "scheduler.",
+    "calibration.", "perf.", "pipeline.join_timeout", "pipeline.poll",
+    "options.monitor_delay", "options.monitor_loops", "options.monitor_view", "options.dutdelay",
+    "options.stop_if_failed"
+)
+
+Changes = Dict[str, Tuple[Any, Any]]
+
+def flatten(config: Dict, prefix: str = "") -> Dict[str, Any]:
+    """Leaves of a nested configuration by dotted path, e.g. 'mqttms.mqtt.host'."""
+    leaves: Dict[str, Any] = {}
+    for key, value in config.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            leaves.update(flatten(value, f"{path}."))
+        else:
+            leaves[path] = value
+    return leaves
+
+def diff(old: Dict, new: Dict) -> Changes:
+    """Changed, added and removed leaves: path -> (old value, new value), None where missing."""
+    a = flatten(old)
+    b = flatten(new)
+    return {path: (a.get(path), b.get(path)) for path in sorted(a.keys() | b.keys()) if a.get(path) != b.get(path)}
+
+def is_safe(path: str) -> bool:
+    return any(path == key or (key.endswith(".") and path.startswith(key)) or path.startswith(key + ".")
+               for key in SAFE_KEYS)
+
+def set_path(config: Dict, path: str, value: Any) -> None:
+    """Set a leaf in place, so that objects holding the nested dicts see the new value."""
+    *parents, leaf = path.split('.')
+    for key in parents:
+        config = config.setdefault(key, {})
+    config[leaf] = value
+
+def apply(config: Dict, changes: Changes) -> None:
+    """Set the new values of 'changes' in a configuration, e.g. one derived for a DUT session."""
+    for path, (_, new) in changes.items():
+        set_path(config, path, new)
+
+
+# Linux inotify, through libc
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_event = struct.Struct('iIII')
+
+def _inotify() -> Optional[ctypes.CDLL]:
+    """libc with inotify_init1 / inotify_add_watch, None where it is not available."""
+    if not sys.platform.startswith('linux'):
+        return None
+    name = ctypes.util.find_library('c')
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1') or not hasattr(libc, 'inotify_add_watch'):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """
+    Calls 'callback' when a file changes, from a background thread.
+
+    On Linux the directory of the file is watched with inotify, so files replaced by editors
+    (written to a temporary file and renamed) are seen as well. Elsewhere, or when inotify
+    cannot be set up, the modification time and size are polled every 'interval' seconds.
+    Bursts of events are coalesced for 'settle' seconds.
+    """
+
+    def __init__(self, path: str, callback: Callable[[], object], interval: float = 1.0, settle: float = 0.2) -> None:
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.interval = interval
+        self.settle = settle
+        self.stopped = threading.Event()
+        self.fd = -1
+        self.wake_r, self.wake_w = os.pipe()
+        libc = _inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+                if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        self.method = "inotify" if self.fd >= 0 else "polling"
+        self.thread = threading.Thread(target=self.run, name="config-watch", daemon=True)
+
+    def start(self) -> None:
+        logger.info("Watching %s (%s)", self.path, self.method)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        os.write(self.wake_w, b"x")
+        if self.thread.is_alive():
+            self.thread.join()
+        for fd in (self.fd, self.wake_r, self.wake_w):
+            if fd >= 0:
+                os.close(fd)
+
+    def run(self) -> None:
+        if self.fd >= 0:
+            self.run_inotify()
+        else:
+            self.run_polling()
+
+    def run_inotify(self) -> None:
+        name = os.path.basename(self.path).encode()
+        while not self.stopped.is_set():
+            readable, _, _ = select.select([self.fd, self.wake_r], [], [])
+            if self.wake_r in readable:
+                return
+            if name not in self.read_events():
+                continue
+            # editors write in several steps: wait until they are done
+            while select.select([self.fd], [], [], self.settle)[0]:
+                self.read_events()
+            self.notify()
+
+    def read_events(self) -> List[bytes]:
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset + _event.size <= len(data):
+            _, _, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            names.append(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+        return names
+
+    def run_polling(self) -> None:
+        last = self.stat()
+        while not self.stopped.wait(self.interval):
+            current = self.stat()
+            if current != last:
+                last = current
+                self.notify()
+
+    def stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def notify(self) -> None:
+        try:
+            self.callback()
+        except Exception as e:
+            logger.error(f"Configuration reload failed: {e}")
+
+
+class ConfigReloader:
+    """
+    Applies changes of the configuration file to a running session.
+
+    A changed file is parsed and only its changed sections are validated against CONFIG_SCHEMA.
+    The command line options keep their precedence. Changes of SAFE_KEYS are written into the
+    live configuration dicts in place, which TestBench and MShost read, and the listeners are
+    called with them to refresh what they derived from the configuration. Other changes need a
+    restart: they are logged and kept in 'staged'. An invalid file changes nothing.
+    A key removed from the file keeps its value until the next start.
+
+    The file is compared with the configuration the process started with, taken when the
+    reloader is created, not with the live one: values the session sets itself (the server
+    UUID of the BLE binding, the devices selected by a fleet query) are not file changes.
+    """
+
+    def __init__(self, config: Config, path: str, args: Optional[argparse.Namespace] = None) -> None:
+        self.config = config
+        self.path = path
+        self.args = args
+        self.listeners: List[Callable[[Changes], None]] = []
+        self.staged: Changes = {}
+        self.lock = threading.Lock()
+        # file plus command line at the start, and as of the last reload
+        self.started = copy.deepcopy(config.config)
+        self.loaded = self.started
+        try:
+            self.file = config.load_toml(path)
+        except Exception:
+            self.file = {}
+        self.watcher: Optional[FileWatcher] = None
+
+    def subscribe(self, listener: Callable[[Changes], None]) -> None:
+        self.listeners.append(listener)
+
+    def start(self, interval: float = 1.0) -> None:
+        self.watcher = FileWatcher(self.path, self.reload, interval)
+        self.watcher.start()
+
+    def stop(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def validate(self, file: Dict) -> bool:
+        """Validate the sections of the file that changed since the last reload."""
+        schema: Dict[str, Any] = Config.CONFIG_SCHEMA
+        for section, value in file.items():
+            if value == self.file.get(section):
+                continue
+            section_schema = schema['properties'].get(section)
+            if section_schema is None:
+                logger.error("Configuration reload: unknown section [%s], nothing changed", section)
+                return False
+            try:
+                validate(instance=value, schema=section_schema)
+            except ValidationError as e:
+                logger.error("Configuration reload: invalid [%s]: %s, nothing changed", section, e.message)
+                return False
+        return True
+
+    def reload(self) -> Tuple[Changes, Changes]:
+        """
+        Load the file again and apply it.
+
+        :return: (applied changes, changes staged until restart)
+        """
+        with self.lock:
+            try:
+                file = self.config.load_toml(self.path)
+            except Exception:
+                logger.error("Configuration reload: %s cannot be read, nothing changed", self.path)
+                return {}, {}
+            if not self.validate(file):
+                return {}, {}
+            self.file = file
+
+            candidate = Config(copy.deepcopy(self.started))
+            candidate.deep_update(candidate.config, file)
+            candidate.merge_options(self.args)
+
+            applied = {path: change for path, change in diff(self.loaded, candidate.config).items() if is_safe(path)}
+            apply(self.config.config, applied)
+            # staged changes are relative to the start, so a reverted one disappears
+            staged = {path: change for path, change in diff(self.started, candidate.config).items() if not is_safe(path)}
+            self.staged = staged
+            self.loaded = candidate.config
+
+        for path, (old, new) in applied.items():
+            logger.info("Configuration reload: %s = %r (was %r)", path, new, old)
+        for path, (old, new) in staged.items():
+            logger.warning("Configuration reload: %s = %r needs a restart, staged", path, new)
+        if applied:
+            for listener in self.listeners:
+                listener(applied)
+        return applied, staged
+
+# core/reload.py
@@ -0,0 +1,185 @@
+# core/scheduler.py
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from smartfan.metrics import SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS
+
+# Priority classes of MS commands, lower is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_TEST = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = ("interactive", "test", "background")
+
+# operator-driven and pairing commands go ahead of the test commands, polling goes last
+INTERACTIVE_COMMANDS = frozenset(("SN", "WF", "MQ", "RS", "OT", "TZ"))
+BACKGROUND_COMMANDS = frozenset(("SR", "NP"))
+
+def command_priority(cmd: str) -> int:
+    if cmd in INTERACTIVE_COMMANDS:
+        return PRIORITY_INTERACTIVE
+    if cmd in BACKGROUND_COMMANDS:
+        return PRIORITY_BACKGROUND
+    return PRIORITY_TEST
+
+
+class TokenBucket:
+    """'rate' tokens per second, at most 'burst' saved up. A rate of 0 means unlimited."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.clock = clock
+        self.tokens = self.burst
+        self.last = clock()
+
+    def refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        if not self.rate:
+            return 0.0
+        self.refill()
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate:
+            self.tokens -= 1.0
+
+
+class Ticket:
+    __slots__ = ("dut", "cmd", "priority", "queued")
+
+    def __init__(self, dut: str, cmd: str, priority: int, queued: float) -> None:
+        self.dut = dut
+        self.cmd = cmd
+        self.priority = priority
+        self.queued = queued
+
+
+class CommandScheduler:
+    """
+    Admission of MS commands to the broker.
+
+    A command may be sent when a token is available in the bucket of the broker and in the
+    bucket of its device. Waiting commands are served by priority class (see command_priority),
+    and within a class round robin over the DUTs, so one busy DUT cannot starve the others.
+    The queue depth and the waiting time by priority class are exported as metrics.
+
+    With both rates 0 (default) commands are never held back.
+    """
+
+    POLL = 0.05
+
+    def __init__(self, config: Dict, clock: Callable[[], float] = time.monotonic) -> None:
+        self.config = config
+        self.clock = clock
+        self.broker = TokenBucket(config['broker_rate'], config['broker_burst'], clock)
+        self.devices: Dict[str, TokenBucket] = {}
+        # per priority class: DUT -> waiting tickets, in round robin order
+        self.queues: List[Dict[str, Deque[Ticket]]] = [{} for _ in PRIORITY_NAMES]
+        self.cond = threading.Condition()
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.config['broker_rate'] or self.config['device_rate'])
+
+    def device(self, dut: str) -> TokenBucket:
+        bucket = self.devices.get(dut)
+        if bucket is None:
+            bucket = TokenBucket(self.config['device_rate'], self.config['device_burst'], self.clock)
+            self.devices[dut] = bucket
+        return bucket
+
+    def reconfigure(self) -> None:
+        """Take the rates and bursts from the configuration again, after it was reloaded."""
+        with self.cond:
+            for bucket, rate, burst in [(self.broker, self.config['broker_rate'], self.config['broker_burst'])] + \
+                    [(b, self.config['device_rate'], self.config['device_burst']) for b in self.devices.values()]:
+                bucket.refill()
+                bucket.rate = rate
+                bucket.burst = max(burst, 1.0)
+                bucket.tokens = min(bucket.tokens, bucket.burst)
+            self.cond.notify_all()
+
+    def acquire(self, dut: str, cmd: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the command may be sent.
+
+        :return: False if it was not admitted within timeout seconds
+        """
+        if not self.limited:
+            return True
+        priority = command_priority(cmd)
+        ticket = Ticket(dut, cmd, priority, self.clock())
+        deadline = None if timeout is None else ticket.queued + timeout
+        label = PRIORITY_NAMES[priority]
+        with self.cond:
+            self.queues[priority].setdefault(dut, deque()).append(ticket)
+            SCHEDULER_QUEUE_DEPTH.inc(label)
+            try:
+                while True:
+                    if self.broker.delay() == 0.0 and self._next() is ticket:
+                        self._pop(ticket)
+                        self.broker.take()
+                        self.device(dut).take()
+                        SCHEDULER_WAIT_SECONDS.observe(self.clock() - ticket.queued, label)
+                        return True
+                    # woken by notify_all when another command is admitted, or when tokens are due
+                    delay = self._delay() or self.POLL
+                    if deadline is not None:
+                        remaining = deadline - self.clock()
+                        if remaining <= 0:
+                            self._remove(ticket)
+                            return False
+                        delay = min(delay, remaining)
+                    self.cond.wait(delay)
+            finally:
+                SCHEDULER_QUEUE_DEPTH.dec(label)
+                self.cond.notify_all()
+
+    def _next(self) -> Optional[Ticket]:
+        """The ticket to admit next: highest priority class, first DUT in round robin order whose bucket has a token."""
+        for queues in self.queues:
+            for dut, tickets in queues.items():
+                if self.device(dut).delay() == 0.0:
+                    return tickets[0]
+        return None
+
+    def _delay(self) -> float:
+        delays = [self.device(dut).delay() for queues in self.queues for dut in queues]
+        return max(self.broker.delay(), min(delays, default=0.0))
+
+    def _pop(self, ticket: Ticket) -> None:
+        # the DUT goes to the back of the round robin order of its class
+        queues = self.queues[ticket.priority]
+        tickets = queues.pop(ticket.dut)
+        tickets.popleft()
+        if tickets:
+            queues[ticket.dut] = tickets
+
+    def _remove(self, ticket: Ticket) -> None:
+        tickets = self.queues[ticket.priority].get(ticket.dut)
+        if tickets is not None:
+            tickets.remove(ticket)
+            if not tickets:
+                del self.queues[ticket.priority][ticket.dut]
+
+
+_scheduler: Optional[CommandScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler(config: Dict) -> CommandScheduler:
+    """The scheduler shared by all MShost objects of the process, created from config['scheduler'] on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CommandScheduler(config['scheduler'])
+        return _scheduler
+
+# core/scheduler.py
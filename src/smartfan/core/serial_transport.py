@@ -0,0 +1,354 @@
+# core/serial_transport.py
+
+import binascii
+import itertools
+import os
+import select
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import termios
+    import tty
+    HAVE_TERMIOS = True
+except ImportError:
+    HAVE_TERMIOS = False
+
+try:
+    import serial
+    HAVE_PYSERIAL = True
+except ImportError:
+    HAVE_PYSERIAL = False
+
+from smartfan.logger import get_app_logger
+from smartfan.core.framing import FRAMING_BINARY, FRAMING_JSON, decode_response
+from smartfan.core.mqtt5_transport import PendingResponse, ResponseTimeouts
+
+logger = get_app_logger(__name__)
+
+# Framing of MS protocol messages on a serial line (UART):
+#
+#   0x7E | length (2 bytes, little endian) | seq (1 byte) | flags (1 byte) | message | crc (2 bytes, little endian)
+#
+# 'length' counts seq, flags and message. The message is a JSON or binary MS protocol message
+# (see core/framing.py), bit 0 of flags is set for binary ones. The device answers with the
+# seq of the command, so several commands may be in flight. crc is CRC-CCITT (0x1021, initial
+# value 0xFFFF) of length, seq, flags and message. A receiver that meets a bad frame drops
+# bytes up to the next 0x7E.
+
+SOF = 0x7E
+FLAG_BINARY = 0x01
+MAX_MESSAGE = 4096
+_header = struct.Struct('<BHBB')
+_crc = struct.Struct('<H')
+
+def encode_frame(seq: int, framing: str, message: Union[str, bytes]) -> bytes:
+    if isinstance(message, str):
+        message = message.encode('ascii')
+    flags = FLAG_BINARY if framing == FRAMING_BINARY else 0
+    frame = _header.pack(SOF, len(message) + 2, seq, flags) + message
+    return frame + _crc.pack(binascii.crc_hqx(frame[1:], 0xFFFF))
+
+
+class FrameDecoder:
+    """Splits a byte stream into (seq, framing, message) frames, skipping damaged ones."""
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.dropped = 0
+
+    def feed(self, data: bytes) -> List[Tuple[int, str, bytes]]:
+        self.buffer += data
+        frames = []
+        buffer = self.buffer
+        while True:
+            start = buffer.find(SOF)
+            if start < 0:
+                self.dropped += len(buffer)
+                buffer.clear()
+                break
+            if start:
+                self.dropped += start
+                del buffer[:start]
+            if len(buffer) < _header.size:
+                break
+            _, length, seq, flags = _header.unpack_from(buffer)
+            if length < 2 or length > MAX_MESSAGE + 2:
+                self.dropped += 1
+                del buffer[:1]
+                continue
+            end = 3 + length
+            if len(buffer) < end + _crc.size:
+                break
+            (crc,) = _crc.unpack_from(buffer, end)
+            if crc != binascii.crc_hqx(buffer[1:end], 0xFFFF):
+                self.dropped += 1
+                del buffer[:1]
+                continue
+            frames.append((seq, FRAMING_BINARY if flags & FLAG_BINARY else FRAMING_JSON, bytes(buffer[_header.size:end])))
+            del buffer[:end + _crc.size]
+        return frames
+
+
+class SerialPort:
+    """
+    A serial port in raw mode: termios on POSIX systems (USB UART adapters, pseudo terminals),
+    pyserial elsewhere (COM ports).
+    """
+
+    def __init__(self, port: str, baudrate: int) -> None:
+        self.fd = -1
+        self.serial: Optional[Any] = None
+        if HAVE_TERMIOS:
+            self.fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            try:
+                tty.setraw(self.fd)
+                attrs = termios.tcgetattr(self.fd)
+                speed = getattr(termios, f"B{baudrate}", None)
+                if speed is None:
+                    raise ValueError(f"unsupported baud rate {baudrate}")
+                attrs[4] = attrs[5] = speed
+                termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+            except (termios.error, ValueError):
+                os.close(self.fd)
+                raise
+        elif HAVE_PYSERIAL:
+            self.serial = serial.Serial(port, baudrate, timeout=0.1)
+        else:
+            raise RuntimeError("Serial transport needs pyserial (pip install smartfan[serial]) on this system")
+
+    def read(self, timeout: float) -> bytes:
+        """Bytes received within timeout seconds, b'' if none. Raises OSError if the port is gone."""
+        if self.serial is not None:
+            self.serial.timeout = timeout
+            return bytes(self.serial.read(max(1, self.serial.in_waiting)))
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return b""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return b""
+        if not data:
+            raise OSError("serial port closed")
+        return data
+
+    def write(self, data: bytes) -> None:
+        if self.serial is not None:
+            self.serial.write(data)
+            return
+        view = memoryview(data)
+        while view:
+            select.select([], [self.fd], [])
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                continue
+
+    def close(self) -> None:
+        if self.serial is not None:
+            self.serial.close()
+        elif self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class SerialTransport:
+    """
+    MS protocol over a serial cable to the DUT, for fixtures where the unit is wired to the PC:
+    commands do not travel DUT -> WiFi -> broker -> PC, round trips take milliseconds.
+
+    Frames are described above. Up to 'window' commands are in flight, matched to their
+    responses by seq; a reader thread decodes the responses as they arrive. Offers the interface
+    of MQTT5Transport (request / put_command / response_received / response / subscribe and
+    connect_mqtt_broker / graceful_exit / ms_protocol), so MShost, TestBench and the perf
+    measurements work unchanged. There is nothing to subscribe on a cable; the broker is only
+    used by the final connectivity test (see TestBench.t_connectivity).
+
+    When the port is lost (cable pulled, adapter reset) the commands in flight fail with
+    DISCONNECTED and the reader reopens the port every 'reconnect_min' to 'reconnect_max'
+    seconds of [transport], doubling the wait after every failed attempt.
+    """
+
+    supports_binary = True
+
+    def __init__(self, config: Dict) -> None:
+        self.serial_config = config['serial']
+        self.ms_config = config['mqttms']['ms']
+        self.config = config
+        self.port: Optional[SerialPort] = None
+        self.reader: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        # seq is one byte: at most 255 commands in flight
+        self.window = threading.BoundedSemaphore(min(max(self.serial_config['window'], 1), 255))
+        self.sequence = itertools.cycle(range(256))
+        self.pending: Dict[int, PendingResponse] = {}
+        self.timeouts = ResponseTimeouts(self._expire, "serial-timeouts")
+        self.online = threading.Event()
+        # connection losses, see MShost.link_dropped
+        self.disconnects = 0
+        self.closing = False
+        # set by graceful_exit, ends the waits between reopening attempts
+        self.closed = threading.Event()
+
+        # MSProtocol compatible single response slot
+        self.response_received = threading.Event()
+        self.response: Optional[dict] = None
+
+    @property
+    def ms_protocol(self) -> "SerialTransport":
+        return self
+
+    # connection
+
+    def connect_mqtt_broker(self) -> bool:
+        """Open the serial port (named as the broker connection of the other transports)."""
+        try:
+            self.port = SerialPort(self.serial_config['port'], self.serial_config['baudrate'])
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.error(f"Serial: cannot open {self.serial_config['port']}: {e}")
+            return False
+        self.online.set()
+        self.reader = threading.Thread(target=self.run, name="serial-reader", daemon=True)
+        self.reader.start()
+        logger.info("Serial: %s at %d baud", self.serial_config['port'], self.serial_config['baudrate'])
+        return True
+
+    def subscribe(self) -> bool:
+        return self.port is not None
+
+    def wait_connected(self, timeout: Optional[float] = None) -> bool:
+        return self.online.wait(timeout)
+
+    def graceful_exit(self) -> None:
+        self.closing = True
+        self.closed.set()
+        self.timeouts.close()
+        self.online.clear()
+        if self.reader is not None:
+            self.reader.join()
+            self.reader = None
+        self._fail_pending()
+        if self.port is not None:
+            self.port.close()
+            self.port = None
+
+    # requests
+
+    def request(self, payload: Union[str, bytes], slot: bool = False, framing: str = FRAMING_JSON) -> PendingResponse:
+        """
+        Send a command and return the object that will receive its response. Blocks while
+        'window' commands are in flight.
+
+        :param slot: also deliver the response in the MSProtocol compatible response slot
+        :param framing: framing of the payload, 'json' or 'bin'
+        """
+        self.window.acquire()
+        with self.lock:
+            seq = next(self.sequence)
+            while seq in self.pending:
+                seq = next(self.sequence)
+            pending = PendingResponse(bytes((seq,)), slot)
+            self.pending[seq] = pending
+        port = self.port
+        if port is None or not self.online.is_set():
+            self._finish(seq, {"response": "DISCONNECTED"})
+            return pending
+        timeout = self.ms_config.get('timeout', 5.0)
+        if timeout:
+            self.timeouts.add(pending, timeout)
+        try:
+            port.write(encode_frame(seq, framing, payload))
+        except OSError as e:
+            logger.error(f"Serial: write failed: {e}")
+            self._finish(seq, {"response": "DISCONNECTED"})
+        return pending
+
+    def put_command(self, payload: Union[str, bytes], framing: str = FRAMING_JSON) -> None:
+        self.request(payload, slot=True, framing=framing)
+
+    def _expire(self, pending: PendingResponse) -> None:
+        # seq numbers are reused: only the command that is still in flight under its seq expires
+        if self._finish(pending.correlation[0], {"response": "TIMEOUT"}, pending):
+            logger.warning("Serial: response timeout")
+
+    def _finish(self, seq: int, payload: dict, expected: Optional[PendingResponse] = None) -> bool:
+        """Complete the command with seq (only if it is 'expected'), if it is still in flight. False if it is not."""
+        with self.lock:
+            pending = self.pending.get(seq)
+            if pending is None or (expected is not None and pending is not expected):
+                return False
+            del self.pending[seq]
+        pending.completed = time.perf_counter()
+        pending.payload = payload
+        pending.event.set()
+        if pending.slot:
+            self.response = payload
+            self.response_received.set()
+        self.window.release()
+        return True
+
+    def _fail_pending(self) -> None:
+        with self.lock:
+            waiting = list(self.pending)
+        for seq in waiting:
+            self._finish(seq, {"response": "DISCONNECTED"})
+
+    def reopen(self, delay: float) -> bool:
+        """Wait 'delay' seconds and open the port again. False if it cannot be opened yet, or when closing."""
+        if self.closed.wait(delay):
+            return False
+        try:
+            port = SerialPort(self.serial_config['port'], self.serial_config['baudrate'])
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.debug("Serial: cannot reopen %s: %s", self.serial_config['port'], e)
+            return False
+        if self.closing:
+            port.close()
+            return False
+        self.port = port
+        self.online.set()
+        logger.info("Serial: %s reopened", self.serial_config['port'])
+        return True
+
+    def lost(self, port: SerialPort, error: OSError) -> None:
+        logger.error(f"Serial: port lost: {error}, reopening")
+        self.disconnects += 1
+        self.online.clear()
+        self.port = None
+        try:
+            port.close()
+        except OSError:
+            pass
+        self._fail_pending()
+
+    def run(self) -> None:
+        transport = self.config['transport']
+        delay = transport['reconnect_min']
+        decoder = FrameDecoder()
+        while not self.closing:
+            port = self.port
+            if port is None:
+                if self.reopen(delay):
+                    delay = transport['reconnect_min']
+                    decoder = FrameDecoder()
+                else:
+                    delay = min(delay * 2, transport['reconnect_max'])
+                continue
+            try:
+                data = port.read(0.1)
+            except OSError as e:
+                if not self.closing:
+                    self.lost(port, e)
+                continue
+            for seq, framing, message in decoder.feed(data):
+                try:
+                    payload = decode_response(message, framing)
+                except ValueError as e:
+                    logger.error(f"Serial: invalid response payload: {e}")
+                    continue
+                if not self._finish(seq, payload):
+                    logger.warning("Serial: unexpected response: %s", payload)
+
+# core/serial_transport.py
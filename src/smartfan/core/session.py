@@ -0,0 +1,31 @@
+# core/session.py
+
+import sys
+from typing import Any, Dict
+
+def derive(config: Dict, changes: Dict[str, Any]) -> Dict:
+    """
+    Configuration of one DUT session: 'config' with the values of 'changes' (by dotted path,
+    e.g. 'mqttms.ms.server_uuid') set.
+
+    Only the dicts on the changed paths are copied; every other section is the same object as in
+    'config' and in all sessions derived from it, so a thousand sessions cost about what one
+    deep copy did. The shared sections are read only for the sessions. Strings are interned, so
+    the UUIDs are shared with the topics, cache keys and records that repeat them.
+    """
+    session = dict(config)
+    copied = {id(session)}
+    for path, value in changes.items():
+        *parents, leaf = path.split('.')
+        node = session
+        for key in parents:
+            child = node[key]
+            if id(child) not in copied:
+                child = dict(child)
+                copied.add(id(child))
+                node[key] = child
+            node = child
+        node[leaf] = sys.intern(value) if isinstance(value, str) else value
+    return session
+
+# core/session.py
@@ -0,0 +1,84 @@
+# core/state_cache.py
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+class DeviceStateCache:
+    """
+    Per-DUT cache of responses to read commands whose answers are immutable or change slowly.
+
+    Each cacheable command has its own time to live in seconds. Commands that change the state
+    of the device invalidate the cached responses that depend on it.
+    """
+
+    # command -> commands whose cached responses become stale when it is sent; None means all
+    INVALIDATES: Dict[str, Optional[Tuple[str, ...]]] = {
+        "SN": ("VS",),
+        "RS": None,
+        "OT": None,
+        "AH": ("PG",),
+        "HH": ("PG",),
+        "GH": ("PG",),
+        "FT": ("PG",),
+        "PT": ("PG",),
+        "AL": ("PG",)
+    }
+
+    __slots__ = ("ttl", "clock", "entries", "lock", "hits", "misses")
+
+    def __init__(self, ttl: Dict[str, float], clock=time.monotonic) -> None:
+        self.ttl = {cmd: seconds for cmd, seconds in ttl.items() if seconds > 0}
+        self.clock = clock
+        self.entries: Dict[Tuple[str, str], Tuple[float, dict]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, cmd: str) -> bool:
+        return cmd in self.ttl
+
+    def get(self, dut: str, cmd: str) -> Optional[dict]:
+        """Return the cached response or None if there is no fresh one."""
+        with self.lock:
+            entry = self.entries.get((dut, cmd))
+            if entry is not None:
+                expires, payload = entry
+                if self.clock() < expires:
+                    self.hits += 1
+                    return dict(payload)
+                del self.entries[(dut, cmd)]
+            self.misses += 1
+            return None
+
+    def put(self, dut: str, cmd: str, payload: dict) -> None:
+        """Store a response. Only successful responses of cacheable commands are kept."""
+        ttl = self.ttl.get(cmd)
+        if ttl is None or not isinstance(payload, dict) or payload.get("response","") != "OK":
+            return
+        with self.lock:
+            self.entries[(dut, cmd)] = (self.clock() + ttl, dict(payload))
+
+    def command_sent(self, dut: str, cmd: str) -> None:
+        """Apply the invalidation rules of a command sent to the device."""
+        if cmd not in self.INVALIDATES:
+            return
+        stale = self.INVALIDATES[cmd]
+        with self.lock:
+            if stale is None:
+                for key in [key for key in self.entries if key[0] == dut]:
+                    del self.entries[key]
+            else:
+                for c in stale:
+                    self.entries.pop((dut, c), None)
+
+    def invalidate(self, dut: str, cmd: Optional[str] = None) -> None:
+        """Drop the cached response of one command, or all responses of the DUT when cmd is None."""
+        with self.lock:
+            if cmd is None:
+                for key in [key for key in self.entries if key[0] == dut]:
+                    del self.entries[key]
+            else:
+                self.entries.pop((dut, cmd), None)
+
+# core/state_cache.py
@@ -0,0 +1,106 @@
+# core/timer_wheel.py
+
+import math
+from typing import Any, List
+
+class Timer:
+    """A scheduled item of a TimerWheel. cancel() drops it; it is skipped when its bucket comes round."""
+    __slots__ = ("deadline", "item", "cancelled")
+
+    def __init__(self, deadline: float, item: Any) -> None:
+        self.deadline = deadline
+        self.item = item
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel: 'levels' wheels of 'slots' buckets each. A bucket of level 0
+    spans one 'tick' seconds, a bucket of level L spans slots**L ticks, so 4 levels of 64
+    buckets cover 16.7 million ticks. A timer goes to the bucket of the lowest level whose
+    span covers its deadline, so scheduling and cancelling are O(1) whatever the number of
+    timers. Each time level 0 wraps round, the current bucket of level 1 is cascaded down
+    (and so on up the levels); a timer is moved at most 'levels' times before it is due, so
+    dispatching is O(1) per timer as well. Timers beyond the top level wait in its buckets and
+    are placed again when they come round.
+
+    Timers are never due early: a deadline is rounded up to the next tick. Times are seconds of
+    any monotonic clock, counted from 'start'.
+    """
+
+    def __init__(self, tick: float, start: float = 0.0, slots: int = 64, levels: int = 4) -> None:
+        if slots & (slots - 1):
+            raise ValueError("slots must be a power of 2")
+        self.tick = tick
+        self.start = start
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = levels
+        self.span = 1 << (self.bits * levels)
+        self.wheels: List[List[List[Timer]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        # ticks before 'current' have been dispatched
+        self.current = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def schedule(self, deadline: float, item: Any) -> Timer:
+        timer = Timer(deadline, item)
+        self._insert(timer)
+        self.count += 1
+        return timer
+
+    def _insert(self, timer: Timer) -> None:
+        ticks = max(math.ceil((timer.deadline - self.start) / self.tick), self.current)
+        delta = min(ticks - self.current, self.span - 1)
+        level = 0
+        while delta >> (self.bits * (level + 1)):
+            level += 1
+        ticks = self.current + delta
+        self.wheels[level][(ticks >> (self.bits * level)) & self.mask].append(timer)
+
+    def next_time(self) -> float:
+        """Time at which the next tick is due."""
+        return self.start + self.current * self.tick
+
+    def advance(self, now: float) -> List[Any]:
+        """Items of the timers due at 'now', in order of their ticks."""
+        # a clock read a rounding error before a tick boundary is at it, or sleeping until
+        # next_time() could leave the caller short of the tick forever
+        target = math.floor((now - self.start) / self.tick + 1e-9)
+        due: List[Any] = []
+        if not self.count:
+            self.current = max(self.current, target + 1)
+            return due
+        while self.current <= target:
+            self._cascade(1)
+            bucket = self.wheels[0][self.current & self.mask]
+            if bucket:
+                self.wheels[0][self.current & self.mask] = []
+                self.count -= len(bucket)
+                due.extend(timer.item for timer in bucket if not timer.cancelled)
+            self.current += 1
+            if not self.count:
+                self.current = max(self.current, target + 1)
+        return due
+
+    def _cascade(self, level: int) -> None:
+        """Move the current bucket of 'level' down when all lower levels wrapped round."""
+        if level >= self.levels or self.current & ((1 << (self.bits * level)) - 1):
+            return
+        self._cascade(level + 1)
+        index = (self.current >> (self.bits * level)) & self.mask
+        bucket = self.wheels[level][index]
+        if bucket:
+            self.wheels[level][index] = []
+            for timer in bucket:
+                if timer.cancelled:
+                    self.count -= 1
+                else:
+                    self._insert(timer)
+
+# core/timer_wheel.py
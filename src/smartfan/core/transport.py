@@ -0,0 +1,77 @@
+# core/transport.py
+
+from typing import Callable, Dict, Tuple
+
+from mqttms import MQTTms, MQTTDispatcher
+from smartfan.logger import get_app_logger
+from smartfan.core.mqtt5_transport import MQTT5Transport
+from smartfan.core.serial_transport import SerialTransport
+
+logger = get_app_logger(__name__)
+
+class AppMQTTDispatcher(MQTTDispatcher):
+    def __init__(self, config: Dict):
+        super().__init__(config)
+
+    def handle_message(self, message: Tuple[str, str]) -> bool:
+        if not super().handle_message(message):
+            logger.info("handle_message: -t '%s' -m '%s'", message[0], message[1])
+            return True
+        return False
+
+def create_mqttms(config: Dict):
+    appdipatcher = AppMQTTDispatcher(config)
+    return MQTTms(config['mqttms'],config['logging'],appdipatcher)
+
+# Transports of MS protocol by [transport] type. A transport is created from the configuration
+# and offers:
+# - connect_mqtt_broker() -> bool: connect (open the port), graceful_exit(): disconnect
+# - ms_protocol: put_command(message[, framing]) sending a command, whose response is then put
+#   in 'response' and signalled by the 'response_received' event; subscribe() -> bool
+# - optionally supports_binary, wait_connected(timeout) with 'online' and 'disconnects', and
+#   request() returning a PendingResponse, for binary frames, reconnection and several
+#   commands in flight
+TRANSPORTS: Dict[str, Callable[[Dict], object]] = {
+    "mqttms": create_mqttms,
+    "mqtt5": MQTT5Transport,
+    "serial": SerialTransport
+}
+
+def register_transport(name: str, factory: Callable[[Dict], object]) -> None:
+    TRANSPORTS[name] = factory
+
+def create_transport(config: Dict):
+    """
+    Create the MS protocol transport selected by config['transport']['type'].
+
+    :return: transport object, see TRANSPORTS
+    :raises ValueError: if the type is unknown
+    """
+    factory = TRANSPORTS.get(config['transport']['type'])
+    if factory is None:
+        raise ValueError(f"unknown transport {config['transport']['type']}")
+    return factory(config)
+
+def open_transport(config: Dict):
+    """
+    Create the transport and connect it to the broker.
+
+    :return: connected transport or None; errors are logged
+    """
+    try:
+        link = create_transport(config)
+    except Exception as e:
+        logger.error(f"Cannot create MQTTMS object. Giving up: {e}")
+        return None
+
+    try:
+        if not link.connect_mqtt_broker():
+            link.graceful_exit()
+            return None
+    except Exception as e:
+        link.graceful_exit()
+        logger.error(f"Cannot connect to MQTT broker: {e}.")
+        return None
+    return link
+
+# core/transport.py
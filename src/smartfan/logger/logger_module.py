@@ -1,8 +1,9 @@
 # logger.py
 
 # logger_module.py
-from typing import List
+from typing import Iterator, List
 import logging
+from contextlib import contextmanager
 from datetime import datetime
 
 TAGNAME = "smartfan"
@@ -48,6 +49,27 @@ def get_app_logger(area_tag:str, to_string:bool=False) -> logging.Logger:
 
     return lg
 
+def set_console_handler(handler:logging.Handler) -> None:
+    # Route the console output of all application loggers to another handler (e.g. in worker processes)
+    global console_handler
+    handler.setFormatter(custom_formatter)
+    for lg in list(logging.Logger.manager.loggerDict.values()):
+        if isinstance(lg, logging.Logger) and console_handler in lg.handlers:
+            lg.removeHandler(console_handler)
+            lg.addHandler(handler)
+    console_handler = handler
+
+@contextmanager
+def quiet_logger(name:str, level:int=logging.WARNING) -> Iterator[None]:
+    # Raise the level of a logger for the duration of a block
+    lg = logging.getLogger(name)
+    previous = lg.level
+    lg.setLevel(level)
+    try:
+        yield
+    finally:
+        lg.setLevel(previous)
+
 def add_string_handler(lg:logging.Logger) -> None:
     lg.addHandler(string_handler)
 
@@ -0,0 +1,6 @@
+# metrics/__init__.py
+
+from .registry import REGISTRY, Registry, Counter, UpDownCounter, Gauge, Histogram
+from .registry import TESTS, UNITS, COMMAND_SECONDS, COMMAND_TIMEOUTS, COMMANDS_IN_FLIGHT, RECONNECTS, SENSOR
+from .registry import SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS
+from .exporter import MetricsServer, start_metrics_server
@@ -0,0 +1,65 @@
+# metrics/exporter.py
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from smartfan.logger import get_app_logger
+from smartfan.metrics.registry import REGISTRY, Registry
+
+logger = get_app_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsServer:
+    """Local HTTP server exposing a registry at /metrics in the Prometheus text format."""
+
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY) -> None:
+        registry_ = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?', 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry_.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_metrics_server(config: Dict) -> Optional[MetricsServer]:
+    """Start the metrics endpoint if it is enabled in config['metrics']. Errors are logged, not raised."""
+    metrics_config = config['metrics']
+    if not metrics_config['enabled']:
+        return None
+    try:
+        server = MetricsServer(metrics_config['host'], metrics_config['port'])
+    except OSError as e:
+        logger.error(f"Cannot start metrics endpoint on {metrics_config['host']}:{metrics_config['port']}: {e}")
+        return None
+    server.start()
+    logger.info("Metrics endpoint: http://%s:%d/metrics", metrics_config['host'], server.port)
+    return server
+
+# metrics/exporter.py
@@ -0,0 +1,237 @@
+# metrics/registry.py
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+LabelValues = Tuple[str, ...]
+
+class _Shards:
+    """
+    Per-thread value dicts. Every thread writes only its own dict, so updates on the command
+    path need no lock; a scrape sums the shards. The lock is taken once per thread, on its first update.
+    """
+
+    def __init__(self) -> None:
+        self.local = threading.local()
+        self.shards: List[dict] = []
+        self.lock = threading.Lock()
+
+    def mine(self) -> dict:
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = {}
+            self.local.shard = shard
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def snapshot(self) -> List[dict]:
+        with self.lock:
+            shards = list(self.shards)
+        return [shard.copy() for shard in shards]
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        # latest state() of the same metric in other processes (fleet workers), by source
+        self.remote: Dict[object, dict] = {}
+
+    def state(self) -> dict:
+        """Values of this process, picklable, to be merged by another one with update()."""
+        raise NotImplementedError
+
+    def update(self, source: object, state: dict) -> None:
+        """Replace the values of another process, e.g. a fleet worker, with its latest state()."""
+        self.remote[source] = state
+
+    def reset(self) -> None:
+        """Forget the values of this process, e.g. the ones a forked worker inherited."""
+        raise NotImplementedError
+
+    def label_text(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self.shards = _Shards()
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        shard = self.shards.mine()
+        shard[values] = shard.get(values, 0.0) + amount
+
+    def value(self, *values: str) -> float:
+        return self.totals().get(values, 0.0)
+
+    def state(self) -> Dict[LabelValues, float]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self.shards.snapshot():
+            for key, v in shard.items():
+                totals[key] = totals.get(key, 0.0) + v
+        return totals
+
+    def totals(self) -> Dict[LabelValues, float]:
+        totals = self.state()
+        for state in list(self.remote.values()):
+            for key, v in state.items():
+                totals[key] = totals.get(key, 0.0) + v
+        return totals
+
+    def reset(self) -> None:
+        self.shards = _Shards()
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self.label_text(k)} {_num(v)}" for k, v in sorted(self.totals().items())]
+
+
+class UpDownCounter(Counter):
+    """Gauge that is moved by inc()/dec(), e.g. commands in flight."""
+    kind = "gauge"
+
+    def dec(self, *values: str, amount: float = 1.0) -> None:
+        self.inc(*values, amount=-amount)
+
+
+class Gauge(Metric):
+    """Gauge whose value is set. A dict assignment is atomic, so no lock is needed."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *values: str) -> None:
+        self.values[values] = value
+
+    def state(self) -> Dict[LabelValues, float]:
+        return self.values.copy()
+
+    def reset(self) -> None:
+        self.values = {}
+
+    def samples(self) -> List[str]:
+        values: Dict[LabelValues, float] = {}
+        for state in list(self.remote.values()):
+            values.update(state)
+        values.update(self.state())
+        return [f"{self.name}{self.label_text(k)} {_num(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.shards = _Shards()
+
+    def observe(self, value: float, *values: str) -> None:
+        shard = self.shards.mine()
+        entry = shard.get(values)
+        if entry is None:
+            # bucket counts (+Inf last), sum
+            entry = [[0] * (len(self.buckets) + 1), 0.0]
+            shard[values] = entry
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def state(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        return self._merge([shard.items() for shard in self.shards.snapshot()])
+
+    def merged(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        return self._merge([self.state().items()] + [state.items() for state in list(self.remote.values())])
+
+    def reset(self) -> None:
+        self.shards = _Shards()
+
+    @staticmethod
+    def _merge(parts: List) -> Dict[LabelValues, Tuple[List[int], float]]:
+        merged: Dict[LabelValues, Tuple[List[int], float]] = {}
+        for items in parts:
+            for key, (counts, total) in items:
+                acc = merged.get(key)
+                if acc is None:
+                    merged[key] = (list(counts), total)
+                else:
+                    merged[key] = ([a + b for a, b in zip(acc[0], counts)], acc[1] + total)
+        return merged
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self.merged().items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = 'le="' + ("+Inf" if bound == math.inf else _num(bound)) + '"'
+                lines.append(f"{self.name}_bucket{self.label_text(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self.label_text(key)} {_num(total)}")
+            lines.append(f"{self.name}_count{self.label_text(key)} {cumulative}")
+        return lines
+
+
+MetricT = TypeVar("MetricT", bound="Metric")
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: MetricT) -> MetricT:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self.metrics.get(name)
+
+    def expose(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        for collect in self.collectors:
+            collect()
+        return "".join(metric.expose() for metric in self.metrics.values())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+REGISTRY = Registry()
+
+TESTS = REGISTRY.register(Counter("smartfan_tests_total", "Executed tests by test name and result", ("test", "result")))
+UNITS = REGISTRY.register(Counter("smartfan_units_total", "Tested units by verdict", ("result",)))
+COMMAND_SECONDS = REGISTRY.register(Histogram("smartfan_ms_command_seconds", "MS command round-trip time by command code", ("command",)))
+COMMAND_TIMEOUTS = REGISTRY.register(Counter("smartfan_ms_timeouts_total", "MS commands without response by command code", ("command",)))
+COMMANDS_IN_FLIGHT = REGISTRY.register(UpDownCounter("smartfan_ms_commands_in_flight", "MS commands waiting for a response"))
+RECONNECTS = REGISTRY.register(Counter("smartfan_broker_reconnects_total", "Reconnections to the MQTT broker"))
+SCHEDULER_QUEUE_DEPTH = REGISTRY.register(UpDownCounter("smartfan_scheduler_queue_depth", "MS commands waiting for admission by priority class", ("priority",)))
+SCHEDULER_WAIT_SECONDS = REGISTRY.register(Histogram("smartfan_scheduler_wait_seconds", "Time MS commands waited for admission by priority class", ("priority",)))
+SENSOR = REGISTRY.register(Gauge("smartfan_sensor", "Latest sensor value by DUT and channel", ("dut", "channel")))
+
+# metrics/registry.py
@@ -1,3 +1,12 @@
 # testbench/__init__.py
 
 from .tbench import TestBench
+from .fleet import FleetRunner
+from .pipeline import PairingPipeline
+from .calibration import RackCalibration, cross_calibrate
+from .soak import SoakRunner
+from .standin import StandInDevices, StandInPresence, StandInSerialDevice
+from .replay import ReplayLoad, run_capture_replay
+from .results import ResultSink
+from .export import SampleExporter, open_exporter
+from .operator import OperatorConsole, open_operator
@@ -0,0 +1,206 @@
+# testbench/calibration.py
+
+import struct
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from smartfan.logger import get_app_logger
+from smartfan.metrics import TESTS, UNITS
+from smartfan.core import Config, MShost
+from smartfan.core.framing import payload_data
+from smartfan.core.session import derive
+from smartfan.core.transport import open_transport
+from smartfan.testbench.results import ResultSink
+from smartfan.testbench.export import SampleExporter, open_exporter
+
+logger = get_app_logger(__name__)
+
+# channels compared across the rack: name -> (index in the SR response, divisor to physical units)
+CHANNELS = {
+    "temperature": (0, 100.0),
+    "pressure": (1, 100.0),
+    "humidity": (2, 1000.0),
+    "gas": (3, 1.0),
+    "light": (4, 1.0)
+}
+SR_FORMAT = '<hIIIHBBB'
+# MAD to standard deviation of a normal distribution
+MAD_SIGMA = 1.4826
+
+TEST_NAME = "Calibration"
+
+
+def decode_sample(payload: dict, channels: Sequence[str]) -> Optional[np.ndarray]:
+    """Physical values of the channels from an SR response, None if there is no valid sample."""
+    if payload.get("response", "") != "OK":
+        return None
+    try:
+        values = struct.unpack(SR_FORMAT, payload_data(payload))
+    except (ValueError, struct.error):
+        return None
+    return np.array([values[CHANNELS[name][0]] / CHANNELS[name][1] for name in channels])
+
+
+class CalibrationReport:
+    """
+    Result of a cross-calibration of a rack.
+
+    Arrays have one row per device and one column per channel: 'values' are the medians of the
+    repeated samples of each device, 'score' the distances from the rack median in robust standard
+    deviations, 'outlier' and 'noisy' the flagged sensors.
+    """
+    __slots__ = ("devices", "channels", "values", "center", "spread", "score", "noise", "outlier", "noisy", "missing")
+
+    def __init__(self, devices: List[str], channels: List[str], samples: np.ndarray,
+                 threshold: float, tolerance: np.ndarray) -> None:
+        self.devices = devices
+        self.channels = channels
+        with warnings.catch_warnings():
+            # devices or channels without any sample are NaN and reported as missing
+            warnings.simplefilter("ignore", RuntimeWarning)
+            self.values = np.nanmedian(samples, axis=0)
+            self.center = np.nanmedian(self.values, axis=0)
+            deviation = np.abs(self.values - self.center)
+            # the spread of the rack, never below the tolerance: identical sensors are not outliers
+            self.spread = np.maximum(MAD_SIGMA * np.nanmedian(deviation, axis=0), tolerance)
+            self.score = deviation / self.spread
+            self.noise = MAD_SIGMA * np.nanmedian(np.abs(samples - self.values), axis=0)
+        self.missing = np.isnan(self.values).any(axis=1)
+        self.outlier = np.nan_to_num(self.score) > threshold
+        self.noisy = np.nan_to_num(self.noise) > tolerance
+
+    @property
+    def passed(self) -> np.ndarray:
+        return ~(self.missing | self.outlier.any(axis=1) | self.noisy.any(axis=1))
+
+    def verdicts(self) -> List[Dict]:
+        """One result record per device: flagged channels and the offset of each channel from the rack median."""
+        records = []
+        for i, dut in enumerate(self.devices):
+            records.append({
+                "dut": dut,
+                "test": TEST_NAME,
+                "result": bool(self.passed[i]),
+                "outliers": [c for c, flag in zip(self.channels, self.outlier[i]) if flag],
+                "noisy": [c for c, flag in zip(self.channels, self.noisy[i]) if flag],
+                "offset": {c: None if np.isnan(v) else round(float(v), 3)
+                           for c, v in zip(self.channels, self.values[i] - self.center)}
+            })
+        return records
+
+
+def cross_calibrate(devices: List[str], samples: np.ndarray, config: Dict) -> CalibrationReport:
+    """
+    Compare the sensors of a rack in one pass.
+
+    :param samples: shape (rounds, devices, channels), NaN where a device did not answer
+    :param config: config['calibration']
+    """
+    channels = list(config['channels'])
+    tolerance = np.array([config['tolerance'].get(c, 0.0) for c in channels])
+    return CalibrationReport(devices, channels, samples, config['threshold'], tolerance)
+
+
+class RackCalibration:
+    """
+    Cross-calibration of the DUTs of config['fleet']['devices'], which share a room and
+    should read the same temperature, pressure and humidity.
+
+    Each DUT gets its own broker session. In every round all DUTs are sampled with SR at the
+    same time, one thread per DUT; after 'samples' rounds the readings are compared across the
+    devices (median / MAD, see CalibrationReport) and every DUT gets one verdict.
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.config = config
+        self.calibration = config['calibration']
+        self.channels = list(self.calibration['channels'])
+        self.devices: List[str] = list(config['fleet']['devices'])
+        self.hosts: List[Optional[MShost]] = []
+        self.links = []
+        self.exporter: Optional[SampleExporter] = None
+
+    def device_config(self, number: int, uuid: str) -> Dict:
+        return derive(self.config, {
+            "mqttms.ms.server_uuid": uuid,
+            "mqttms.mqtt.client_id": f"{self.config['mqttms']['mqtt']['client_id']}-c{number}"
+        })
+
+    def connect(self) -> None:
+        for number, uuid in enumerate(self.devices):
+            cfg = self.device_config(number, uuid)
+            link = open_transport(cfg)
+            if link is None:
+                logger.error("Calibration: cannot connect %s", uuid)
+                self.hosts.append(None)
+                continue
+            self.links.append(link)
+            self.hosts.append(MShost(ms_protocol=link.ms_protocol, config=Config(cfg)))
+
+    def sample(self, index: int) -> np.ndarray:
+        host = self.hosts[index]
+        if host is not None:
+            payload = host.ms_sensors()
+            values = decode_sample(payload, self.channels)
+            if values is not None:
+                if self.exporter is not None:
+                    self.exporter.add(self.devices[index], struct.unpack(SR_FORMAT, payload_data(payload)))
+                return values
+        return np.full(len(self.channels), np.nan)
+
+    def acquire(self) -> np.ndarray:
+        """Samples of all devices, shape (rounds, devices, channels)."""
+        rounds = self.calibration['samples']
+        samples = np.full((rounds, len(self.devices), len(self.channels)), np.nan)
+        with ThreadPoolExecutor(max_workers=len(self.devices), thread_name_prefix="calibration") as pool:
+            for r in range(rounds):
+                start = time.monotonic()
+                samples[r] = np.stack(list(pool.map(self.sample, range(len(self.devices)))))
+                if r + 1 < rounds:
+                    time.sleep(max(0.0, self.calibration['interval'] - (time.monotonic() - start)))
+        return samples
+
+    def run(self) -> Optional[CalibrationReport]:
+        if len(self.devices) < self.calibration['min_devices']:
+            logger.error("Calibration: %d devices, at least %d are needed to compare them",
+                         len(self.devices), self.calibration['min_devices'])
+            return None
+        self.exporter = open_exporter(self.config)
+        try:
+            self.connect()
+            logger.info("Calibration: sampling %d devices, %d rounds", len(self.devices), self.calibration['samples'])
+            report = cross_calibrate(self.devices, self.acquire(), self.calibration)
+        finally:
+            for link in self.links:
+                link.graceful_exit()
+            if self.exporter is not None:
+                self.exporter.close()
+
+        now = time.time()
+        records = report.verdicts()
+        for record in records:
+            TESTS.inc(TEST_NAME, "pass" if record["result"] else "fail")
+            UNITS.inc("pass" if record["result"] else "fail")
+            record["time"] = now
+        ResultSink(self.config['options']['results']).write(records)
+        self.log(report)
+        return report
+
+    def log(self, report: CalibrationReport) -> None:
+        logger.info("Calibration: rack median %s",
+                    ", ".join(f"{c} {v:.2f}" for c, v in zip(report.channels, report.center)))
+        for i, dut in enumerate(report.devices):
+            if report.passed[i]:
+                logger.info("  %s: PASS", dut)
+                continue
+            reasons = ["no samples"] if report.missing[i] else []
+            reasons += [f"{c} off by {report.values[i][j] - report.center[j]:+.2f}"
+                        for j, c in enumerate(report.channels) if report.outlier[i][j]]
+            reasons += [f"{c} noisy" for j, c in enumerate(report.channels) if report.noisy[i][j]]
+            logger.info("  %s: FAIL (%s)", dut, ", ".join(reasons))
+
+# testbench/calibration.py
@@ -0,0 +1,78 @@
+# testbench/display.py
+
+import sys
+from typing import Dict, List, Optional, Sequence, TextIO
+
+class FrameRenderer:
+    """
+    Keeps the last frame printed on the terminal and rewrites only the lines that changed.
+
+    The cursor is left on the line just below the frame after every render, so other output
+    must not be printed between two renders of the same frame.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream if stream is not None else sys.stdout
+        self.last: List[str] = []
+
+    def reset(self) -> None:
+        """Forget the last frame. Next render prints the whole frame again below the cursor."""
+        self.last = []
+
+    def render(self, lines: Sequence[str]) -> int:
+        """
+        Render a frame, writing only lines that differ from the previous frame.
+
+        :param lines: lines of the frame, without line terminators
+        :return: number of lines that were written to the stream
+        """
+        out = []
+        written = 0
+        height = len(self.last)
+        common = min(height, len(lines))
+
+        for i in range(common):
+            if lines[i] != self.last[i]:
+                up = height - i
+                out.append(f"\033[{up}A\r\033[K{lines[i]}\033[{up}B\r")
+                written += 1
+
+        if len(lines) > height:
+            # frame grew - new lines go below the old frame
+            for line in lines[height:]:
+                out.append(f"\033[K{line}\n")
+                written += 1
+        elif len(lines) < height:
+            # frame shrank - clear the tail and leave the cursor below the new frame
+            extra = height - len(lines)
+            out.append(f"\033[{extra}A\r\033[J")
+
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+        self.last = list(lines)
+        return written
+
+
+class GridRenderer:
+    """
+    Compact multi-DUT view: a header line and one row per device, updated incrementally.
+    Devices get their row in order of first appearance.
+    """
+
+    def __init__(self, header: str, stream: Optional[TextIO] = None) -> None:
+        self.frame = FrameRenderer(stream)
+        self.header = header
+        self.rows: Dict[str, str] = {}
+
+    def update(self, dut: str, row: str) -> None:
+        """Set the row of a device without redrawing. Call render() to show the changes."""
+        self.rows[dut] = row
+
+    def remove(self, dut: str) -> None:
+        self.rows.pop(dut, None)
+
+    def render(self) -> int:
+        return self.frame.render([self.header, *self.rows.values()])
+
+# testbench/display.py
@@ -0,0 +1,166 @@
+# testbench/export.py
+
+import csv
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+from smartfan.logger import get_app_logger
+
+logger = get_app_logger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Columns of the exported SR samples: physical units as shown by print_sensor_data, raw flag bytes
+COLUMNS = ("time", "dut", "temperature", "pressure", "humidity", "gas", "light", "sensors", "motor", "state")
+
+def sample_row(timestamp: float, dut: str, sensor_data: Sequence[int]) -> tuple:
+    temperature, pressure, humidity, gas, light, sensors, motor, state = sensor_data
+    return (timestamp, dut, temperature / 100, pressure / 100, humidity / 1000, gas, light, sensors, motor, state)
+
+
+class CsvChunkWriter:
+    """Appends chunks of rows to a CSV file with a header line."""
+
+    def __init__(self, path: str) -> None:
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(COLUMNS)
+
+    def write(self, columns: Dict[str, list]) -> None:
+        self.writer.writerows(zip(*(columns[c] for c in COLUMNS)))
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetChunkWriter:
+    """Writes every chunk as one row group of a Parquet file."""
+
+    def __init__(self, path: str) -> None:
+        self.schema = pa.schema([
+            ("time", pa.timestamp("ms", tz="UTC")),
+            ("dut", pa.dictionary(pa.int32(), pa.string())),
+            ("temperature", pa.float32()),
+            ("pressure", pa.float32()),
+            ("humidity", pa.float32()),
+            ("gas", pa.uint32()),
+            ("light", pa.uint16()),
+            ("sensors", pa.uint8()),
+            ("motor", pa.uint8()),
+            ("state", pa.uint8())
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, columns: Dict[str, list]) -> None:
+        data = dict(columns)
+        data["time"] = [int(t * 1000) for t in columns["time"]]
+        self.writer.write_table(pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class SampleExporter:
+    """
+    Streams decoded SR samples to a Parquet (.parquet, needs pyarrow) or CSV file.
+
+    add() only puts the sample in a queue, so the acquisition loop never waits on the disk;
+    a background thread collects the samples in columns and writes them in chunks of 'chunk'
+    rows (a Parquet row group), or earlier when 'flush_interval' seconds passed. At most
+    'queue' samples wait for the writer; if the disk falls behind further, samples are dropped
+    and counted.
+    """
+
+    def __init__(self, path: str, config: Dict) -> None:
+        self.path = path
+        self.chunk = config['chunk']
+        self.flush_interval = config['flush_interval']
+        self.samples: queue.Queue = queue.Queue(maxsize=config['queue'])
+        self.dropped = 0
+        self.written = 0
+        self.writer = self.open_writer(path)
+        self.thread = threading.Thread(target=self.run, name="export", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def open_writer(path: str) -> Union[ParquetChunkWriter, CsvChunkWriter]:
+        if path.endswith(".parquet"):
+            if pq is None:
+                raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow), or use a .csv file")
+            return ParquetChunkWriter(path)
+        return CsvChunkWriter(path)
+
+    def add(self, dut: str, sensor_data: Sequence[int], timestamp: Optional[float] = None) -> None:
+        try:
+            self.samples.put_nowait(sample_row(time.time() if timestamp is None else timestamp, dut, sensor_data))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self) -> None:
+        rows: List[tuple] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self.samples.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                row = ()
+            if row is None:
+                break
+            if row:
+                rows.append(row)
+            if len(rows) >= self.chunk or (rows and time.monotonic() >= deadline):
+                self.flush(rows)
+                rows = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        self.flush(rows)
+
+    def flush(self, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        columns = {name: list(values) for name, values in zip(COLUMNS, zip(*rows))}
+        try:
+            self.writer.write(columns)
+            self.written += len(rows)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot export samples to {self.path}: {e}")
+
+    def close(self) -> None:
+        self.samples.put(None)
+        self.thread.join()
+        self.writer.close()
+        logger.info("Exported %d samples to %s%s", self.written, self.path,
+                    f", {self.dropped} dropped" if self.dropped else "")
+
+
+def open_exporter(config: Dict, suffix: str = "") -> Optional[SampleExporter]:
+    """
+    Exporter of config['options']['export'], None if no export is configured or the file
+    cannot be opened (the error is logged).
+
+    :param suffix: inserted before the file extension, e.g. '.w0' for fleet workers
+    """
+    path = config['options']['export']
+    if not path:
+        return None
+    if suffix:
+        root, ext = os.path.splitext(path)
+        path = f"{root}{suffix}{ext}"
+    try:
+        return SampleExporter(path, config['export'])
+    except (OSError, RuntimeError) as e:
+        logger.error(f"Cannot export samples to {path}: {e}")
+        return None
+
+# testbench/export.py
@@ -0,0 +1,286 @@
+# testbench/fleet.py
+
+import contextlib
+import copy
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from typing import Dict, List, Optional
+
+from smartfan.logger import get_app_logger, set_console_handler
+from smartfan.metrics import (TESTS, UNITS, COMMAND_SECONDS, COMMAND_TIMEOUTS, COMMANDS_IN_FLIGHT, RECONNECTS,
+                              SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS, SENSOR)
+from smartfan.core import Config, MShost
+from smartfan.core.transport import open_transport
+from smartfan.core.presence import PresenceTracker
+from smartfan.core.reload import apply
+from smartfan.core.session import derive
+from smartfan.testbench.tbench import TestBench
+from smartfan.testbench.results import ResultSink
+from smartfan.testbench.export import open_exporter
+
+logger = get_app_logger(__name__)
+
+# Messages from workers to the main process: (kind, worker, items)
+MSG_LOGS = "logs"
+MSG_RESULTS = "results"
+MSG_METRICS = "metrics"
+MSG_DONE = "done"
+
+# metrics collected in the workers and shown by the /metrics endpoint of the main process;
+# tests and units are counted by the main process from the results
+WORKER_METRICS = (COMMAND_SECONDS, COMMAND_TIMEOUTS, COMMANDS_IN_FLIGHT, RECONNECTS,
+                  SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS, SENSOR)
+
+class BatchChannel:
+    """Collects items of one kind and sends them to the main process in batches."""
+
+    def __init__(self, channel, worker: int, kind: str, batch: int) -> None:
+        self.channel = channel
+        self.worker = worker
+        self.kind = kind
+        self.batch = batch
+        self.items: List = []
+
+    def add(self, item) -> None:
+        self.items.append(item)
+        if len(self.items) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.items:
+            self.channel.put((self.kind, self.worker, self.items))
+            self.items = []
+
+
+class BatchLogHandler(logging.Handler):
+    """Log handler of worker processes: formatted records go to the main process in batches."""
+
+    def __init__(self, batch: BatchChannel) -> None:
+        super().__init__()
+        self.batch = batch
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.batch.add(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def device_config(config: Dict, uuid: str, worker: int) -> Dict:
+    """Configuration of one device of the fleet: no pairing, no prompts, a client ID unique per worker."""
+    return derive(config, {
+        "mqttms.ms.server_uuid": uuid,
+        "mqttms.mqtt.client_id": f"{config['mqttms']['mqtt']['client_id']}-w{worker}",
+        "options.mode": "testbench",
+        "options.nopairing": True,
+        "options.interactive": False
+    })
+
+
+def send_metrics(channel, worker: int) -> None:
+    channel.put((MSG_METRICS, worker, [{metric.name: metric.state() for metric in WORKER_METRICS}]))
+
+
+def run_shard(config: Dict, worker: int, devices: List[str], channel, control=None) -> None:
+    """
+    Worker process: test a shard of the fleet with its own broker session.
+
+    With the MQTT v5 transport one session is shared by all devices of the shard. The mqttms
+    transport binds its topics to one server UUID, so it connects once per device.
+    Configuration changes reloaded by the main process arrive on 'control' and apply from
+    the next device on.
+    """
+    batch = config['fleet']['batch']
+    logs = BatchChannel(channel, worker, MSG_LOGS, batch)
+    results = BatchChannel(channel, worker, MSG_RESULTS, batch)
+    set_console_handler(BatchLogHandler(logs))
+    # a forked worker starts with the values of the main process, which counts them itself
+    for metric in WORKER_METRICS:
+        metric.reset()
+    # the terminal belongs to the main process; workers report through the channel only
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        shard_loop(config, worker, devices, channel, logs, results, control)
+
+
+def shard_loop(config: Dict, worker: int, devices: List[str], channel, logs: BatchChannel, results: BatchChannel,
+               control=None) -> None:
+    shared = config['transport']['type'] == 'mqtt5'
+    exporter = open_exporter(config, f".w{worker}")
+    link = None
+    passed = failed = 0
+    try:
+        for uuid in devices:
+            while control is not None:
+                try:
+                    apply(config, control.get_nowait())
+                except queue.Empty:
+                    break
+            cfg = device_config(config, uuid, worker)
+            if link is None:
+                link = open_transport(cfg)
+                if link is None:
+                    failed += 1
+                    results.add({"dut": uuid, "test": "Connect", "result": False, "duration": 0.0, "time": time.time(), "worker": worker})
+                    continue
+            elif shared:
+                link.ms_config['server_uuid'] = uuid
+
+            tb = TestBench(cfg)
+            tb.set_exporter(exporter)
+            tb.set_ms_host(MShost(ms_protocol=link.ms_protocol, config=Config(cfg)))
+            records = tb.run_tests()
+            ok = bool(records) and all(r["result"] for r in records)
+            passed += ok
+            failed += not ok
+            now = time.time()
+            for r in records:
+                results.add({"dut": uuid, **r, "time": now, "worker": worker})
+            results.flush()
+            logs.flush()
+            send_metrics(channel, worker)
+
+            if not shared:
+                link.graceful_exit()
+                link = None
+    finally:
+        if link is not None:
+            link.graceful_exit()
+        if exporter is not None:
+            exporter.close()
+        results.flush()
+        logs.flush()
+        send_metrics(channel, worker)
+        channel.put((MSG_DONE, worker, [{"passed": passed, "failed": failed}]))
+
+
+class FleetRunner:
+    """
+    Tests the devices of config['fleet']['devices'] in worker processes.
+
+    The device list is sharded round robin over the workers. Each worker has its own broker
+    session and sends results and log lines back through one multiprocessing queue, in batches,
+    and the state of its WORKER_METRICS after every device, which the metrics endpoint of the
+    main process adds to its own.
+    With [presence] enabled only the devices reported ready are tested.
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.config = config
+        self.sink = ResultSink(config['options']['results'])
+        # reloaded configuration changes to the running workers, one queue per worker
+        self.controls: List = []
+
+    def shards(self, devices: Optional[List[str]] = None) -> List[List[str]]:
+        if devices is None:
+            devices = self.config['fleet']['devices']
+        workers = self.config['fleet']['workers'] or os.cpu_count() or 1
+        workers = max(1, min(workers, len(devices)))
+        return [devices[i::workers] for i in range(workers)]
+
+    def run(self) -> Dict:
+        devices = self.config['fleet']['devices']
+        if not devices:
+            logger.error("Fleet: no devices configured")
+            return {"passed": 0, "failed": 0}
+
+        summary = {"passed": 0, "failed": 0}
+        if self.config['presence']['enabled']:
+            devices = self.present(devices, summary)
+            if not devices:
+                return summary
+
+        shards = self.shards(devices)
+        logger.info("Fleet: %d devices in %d workers", len(devices), len(shards))
+        # every worker has its own scheduler; together they keep the broker limit
+        config = copy.deepcopy(self.config)
+        config['scheduler']['broker_rate'] /= len(shards)
+        channel = multiprocessing.Queue()
+        controls: List = [multiprocessing.Queue() for _ in shards]
+        processes = [multiprocessing.Process(target=run_shard, args=(config, n, shard, channel, controls[n]), daemon=True)
+                     for n, shard in enumerate(shards)]
+        self.controls = controls
+        start = time.perf_counter()
+        for p in processes:
+            p.start()
+
+        running = len(processes)
+        try:
+            while running:
+                try:
+                    kind, worker, items = channel.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in processes):
+                        logger.error("Fleet: workers exited unexpectedly")
+                        break
+                    continue
+                if kind == MSG_LOGS:
+                    sys.stderr.write("".join(f"[w{worker}] {line}\n" for line in items))
+                elif kind == MSG_RESULTS:
+                    self.sink.write(items)
+                    for item in items:
+                        TESTS.inc(item["test"], "pass" if item["result"] else "fail")
+                elif kind == MSG_METRICS:
+                    # cumulative, the latest state replaces the previous one
+                    for metric in WORKER_METRICS:
+                        metric.update(worker, items[-1][metric.name])
+                elif kind == MSG_DONE:
+                    running -= 1
+                    for item in items:
+                        summary["passed"] += item["passed"]
+                        summary["failed"] += item["failed"]
+                        UNITS.inc("pass", amount=item["passed"])
+                        UNITS.inc("fail", amount=item["failed"])
+        finally:
+            self.controls = []
+            for p in processes:
+                p.join(timeout=5.0)
+                if p.is_alive():
+                    p.terminate()
+            for control in controls:
+                # changes no worker reads any more must not keep the process from exiting
+                control.cancel_join_thread()
+                control.close()
+
+        elapsed = time.perf_counter() - start
+        logger.info("Fleet: %d passed, %d failed in %.1f s (%.2f units/min)",
+                    summary["passed"], summary["failed"], elapsed, 60.0 * (summary["passed"] + summary["failed"]) / max(elapsed, 1e-9))
+        return summary
+
+    def reconfigure(self, changes: Dict) -> None:
+        """Send a reloaded configuration to the workers (see core/reload.py)."""
+        controls = self.controls
+        if "scheduler.broker_rate" in changes and controls:
+            # the workers share the broker limit, as at the start
+            old, new = changes["scheduler.broker_rate"]
+            changes = {**changes, "scheduler.broker_rate": (old, new / len(controls))}
+        for control in controls:
+            control.put(changes)
+
+    def present(self, devices: List[str], summary: Dict) -> List[str]:
+        """
+        The devices reported ready by their status topics (see PresenceTracker). The others
+        fail with a 'Presence' result without being contacted.
+        """
+        tracker = PresenceTracker(self.config)
+        if not tracker.start(self.config['presence']['settle']):
+            return devices
+        try:
+            ready = tracker.ready(devices)
+        finally:
+            tracker.stop()
+        absent = [uuid for uuid in devices if uuid not in ready]
+        if absent:
+            logger.warning("Fleet: %d of %d devices not ready, skipped", len(absent), len(devices))
+            now = time.time()
+            self.sink.write({"dut": uuid, "test": "Presence", "result": False, "duration": 0.0, "time": now} for uuid in absent)
+            for uuid in absent:
+                TESTS.inc("Presence", "fail")
+            UNITS.inc("fail", amount=len(absent))
+            summary["failed"] += len(absent)
+        return ready
+
+# testbench/fleet.py
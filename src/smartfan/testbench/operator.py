@@ -0,0 +1,249 @@
+# testbench/operator.py
+
+import re
+import socket
+import sys
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, TextIO
+
+from prompt_toolkit import PromptSession
+from prompt_toolkit.document import Document
+from prompt_toolkit.patch_stdout import patch_stdout
+from prompt_toolkit.validation import Validator, ValidationError
+
+from smartfan.logger import get_app_logger
+
+logger = get_app_logger(__name__)
+
+# Precompiled regex for UUID v4 (case-insensitive), shared by all validators
+UUID4_REGEX = re.compile(
+    r'^[0-9a-fA-F]{8}-'
+    r'[0-9a-fA-F]{4}-'
+    r'4[0-9a-fA-F]{3}-'
+    r'[89abAB][0-9a-fA-F]{3}-'
+    r'[0-9a-fA-F]{12}$'
+)
+
+class UUIDv4Validator(Validator):
+    uuid4_regex = UUID4_REGEX
+
+    def validate(self, document):
+        text = document.text.strip()
+        if not self.uuid4_regex.fullmatch(text):
+            raise ValidationError(
+                message='Invalid UUIDv4. Expected format: 8-4-4-4-12 hex characters (version 4 only).',
+                cursor_position=len(document.text)
+            )
+
+UUID4_VALIDATOR = UUIDv4Validator()
+
+# seconds between the checks of a waiting ask() whether the console was closed
+CLOSE_POLL = 0.5
+
+
+class OperatorPrompt:
+    """A question to the operator on behalf of one DUT; the asking thread waits for its answer."""
+    __slots__ = ("dut", "text", "default", "validator", "answer", "done")
+
+    def __init__(self, dut: str, text: str, default: str = "", validator: Optional[Validator] = None) -> None:
+        self.dut = dut
+        self.text = text
+        self.default = default
+        self.validator = validator
+        self.answer: Optional[str] = None
+        self.done = threading.Event()
+
+    def check(self, text: str) -> Optional[str]:
+        """Validation error message of an answer, None if it is valid."""
+        if self.validator is None:
+            return None
+        try:
+            self.validator.validate(Document(text))
+        except ValidationError as e:
+            return e.message
+        return None
+
+    def resolve(self, answer: Optional[str]) -> None:
+        # the first answer counts: close() may resolve a prompt the console thread is still reading
+        if self.done.is_set():
+            return
+        self.answer = answer
+        self.done.set()
+
+
+class OperatorConsole:
+    """
+    Operator input of a multi-DUT station, served by one thread.
+
+    Units ask through ask(); only the asking thread waits, the other units keep testing.
+    Pending prompts queue per DUT and are answered oldest first. The channel is:
+
+    - 'terminal': prompt_toolkit prompt session with line editing and validation; log lines
+      of the other units are printed above the prompt
+    - 'stdin': one answer per line, e.g. from a barcode scanner; an empty line takes the default
+    - 'socket': one answer per line from TCP clients connected to host:port, which also
+      receive the questions
+
+    Invalid answers of the line channels are rejected with the validator message and the
+    question is asked again.
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.channel = config['channel']
+        self.host = config['host']
+        self.port = config['port']
+        self.pending: Dict[str, Deque[OperatorPrompt]] = {}
+        # the prompt taken by the console thread, being asked
+        self.current: Optional[OperatorPrompt] = None
+        self.cond = threading.Condition()
+        self.closed = False
+        self.server: Optional[socket.socket] = None
+        self.conn: Optional[socket.socket] = None
+        self.client: Optional[TextIO] = None
+        if self.channel == 'socket':
+            self.server = socket.create_server((self.host, self.port))
+            logger.info("Operator input on %s:%d", *self.server.getsockname()[:2])
+        self.thread = threading.Thread(target=self.run, name="operator", daemon=True)
+        self.thread.start()
+
+    def ask(self, dut: str, text: str, default: str = "", validator: Optional[Validator] = None) -> Optional[str]:
+        """
+        Ask the operator on behalf of a DUT and wait for the answer.
+
+        :return: the answer, None if the console was closed (Ctrl-C, end of input)
+        """
+        item = OperatorPrompt(dut, text, default, validator)
+        with self.cond:
+            if self.closed:
+                return None
+            self.pending.setdefault(dut, deque()).append(item)
+            self.cond.notify_all()
+        while not item.done.wait(CLOSE_POLL) and not self.closed:
+            pass
+        return item.answer
+
+    def next_prompt(self) -> Optional[OperatorPrompt]:
+        """Wait for the oldest pending prompt (the heads of the DUT queues are in arrival order)."""
+        with self.cond:
+            while not self.closed:
+                for dut, items in self.pending.items():
+                    item = items.popleft()
+                    if not items:
+                        del self.pending[dut]
+                    self.current = item
+                    return item
+                self.cond.wait()
+        return None
+
+    def close(self) -> None:
+        """Answer all waiting prompts with None, including the one being asked, and stop the channel."""
+        with self.cond:
+            self.closed = True
+            pending = [item for items in self.pending.values() for item in items]
+            if self.current is not None:
+                pending.append(self.current)
+                self.current = None
+            self.pending.clear()
+            self.cond.notify_all()
+        for item in pending:
+            item.resolve(None)
+        # shutdown() wakes the console thread blocked in accept() or readline(); close() alone does not
+        for sock in (self.conn, self.server):
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        if self.server is not None:
+            self.server.close()
+
+    def run(self) -> None:
+        reader = {"terminal": self.read_terminal, "stdin": self.read_stdin, "socket": self.read_socket}[self.channel]
+        try:
+            while (item := self.next_prompt()) is not None:
+                answer = reader(item)
+                item.resolve(answer)
+                with self.cond:
+                    self.current = None
+                if answer is None:
+                    break
+        except Exception as e:
+            logger.error(f"Operator input failed: {e}")
+        finally:
+            self.close()
+
+    # channels
+
+    def read_terminal(self, item: OperatorPrompt) -> Optional[str]:
+        session = PromptSession()
+        try:
+            with patch_stdout():
+                return session.prompt(f"[{item.dut[:8]}] {item.text}", default=item.default, validator=item.validator)
+        except (KeyboardInterrupt, EOFError):
+            return None
+
+    def read_lines(self, item: OperatorPrompt, readline, write) -> Optional[str]:
+        while True:
+            write(f"[{item.dut}] {item.text}")
+            line = readline()
+            if not line:
+                return None
+            answer = line.strip() or item.default
+            error = item.check(answer)
+            if error is None:
+                return answer
+            write(f"[{item.dut}] rejected: {error}")
+
+    def read_stdin(self, item: OperatorPrompt) -> Optional[str]:
+        return self.read_lines(item, sys.stdin.readline, lambda text: logger.info(text))
+
+    def read_socket(self, item: OperatorPrompt) -> Optional[str]:
+        assert self.server is not None
+        while True:
+            if self.conn is None or self.client is None:
+                try:
+                    conn, address = self.server.accept()
+                except OSError:
+                    return None
+                logger.info("Operator connected from %s", address[0])
+                self.conn = conn
+                self.client = conn.makefile("rw", encoding="utf-8", newline="\n")
+                if self.closed:
+                    # closed while accepting: close() did not see this connection
+                    conn.shutdown(socket.SHUT_RDWR)
+            conn, client = self.conn, self.client
+
+            def write(text: str) -> None:
+                client.write(text + "\n")
+                client.flush()
+
+            try:
+                answer = self.read_lines(item, client.readline, write)
+            except OSError:
+                answer = None
+            if answer is not None:
+                return answer
+            # client gone (or shut down by close()): wait for the next one
+            if not self.closed:
+                logger.warning("Operator disconnected")
+            client.close()
+            conn.close()
+            self.client = None
+            self.conn = None
+            if self.closed:
+                return None
+
+
+def open_operator(config: Dict, always: bool = False) -> Optional[OperatorConsole]:
+    """
+    Operator console of config['operator'], None if the station is not interactive, or if it
+    is a single-unit run at the terminal, where prompts are asked directly.
+    """
+    if not config['options']['interactive']:
+        return None
+    if config['operator']['channel'] == 'terminal' and not always:
+        return None
+    return OperatorConsole(config['operator'])
+
+# testbench/operator.py
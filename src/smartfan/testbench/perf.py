@@ -0,0 +1,152 @@
+# testbench/perf.py
+
+import io
+import itertools
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from smartfan.logger import get_app_logger
+from smartfan.core.framing import encode_command, payload_data
+from smartfan.testbench.display import FrameRenderer
+
+logger = get_app_logger(__name__)
+
+def summarize(seconds: Sequence[float]) -> Dict:
+    """Distribution of times in milliseconds: percentiles, mean and standard deviation (jitter)."""
+    ms = np.asarray(seconds, dtype=float) * 1000.0
+    if not ms.size:
+        return {"samples": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "samples": int(ms.size),
+        "min_ms": round(float(ms.min()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "jitter_ms": round(float(ms.std()), 3)
+    }
+
+
+class CommandPerf:
+    """
+    Performance of the command service of a DUT and of the link to it, measured with NP (NOP)
+    commands, which the device answers without doing anything else.
+
+    Several commands in flight need a transport that matches responses to commands (MQTT v5,
+    see MQTT5Transport.request); over mqttms only one command is in flight at a time.
+    """
+
+    def __init__(self, ms_host) -> None:
+        self.ms_host = ms_host
+
+    @property
+    def pipelined(self) -> bool:
+        return hasattr(self.ms_host.ms_protocol, 'request')
+
+    def rtt(self, count: int) -> List[float]:
+        """Round-trip times of 'count' NOPs sent one after another, lost ones left out."""
+        times = []
+        for _ in range(count):
+            start = time.perf_counter()
+            payload = self.ms_host.ms_nop()
+            if payload.get("response", "") == "OK":
+                times.append(time.perf_counter() - start)
+        return times
+
+    def throughput(self, in_flight: int, duration: float) -> Optional[Dict]:
+        """
+        NOPs per second with 'in_flight' commands outstanding for 'duration' seconds.
+
+        :return: {'in_flight', 'commands', 'rate', 'lost'}, None if the transport cannot pipeline
+        """
+        if in_flight > 1 and not self.pipelined:
+            return None
+        counts = [0] * in_flight
+        lost = [0] * in_flight
+        end = time.perf_counter() + duration
+
+        def stream(index: int) -> None:
+            while time.perf_counter() < end:
+                if in_flight == 1:
+                    ok = self.ms_host.ms_nop().get("response", "") == "OK"
+                else:
+                    ok = self._request_nop()
+                counts[index] += ok
+                lost[index] += not ok
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=stream, args=(i,), name=f"perf-{i}") for i in range(in_flight)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        return {"in_flight": in_flight, "commands": sum(counts), "rate": round(sum(counts) / elapsed, 1), "lost": sum(lost)}
+
+    def _request_nop(self) -> bool:
+        host = self.ms_host
+        dut = host.dut
+        framing = host.device_framing(dut)
+        if host.scheduler is not None:
+            host.scheduler.acquire(dut, "NP")
+        pending = host.ms_protocol.request(encode_command("NP", b"", framing), framing=framing)
+        payload = pending.wait(host.response_timeout)
+        return payload is not None and payload.get("response", "") == "OK"
+
+    def display_latency(self, count: int, format_lines: Callable[[tuple], List[str]]) -> List[float]:
+        """
+        Times from the arrival of an SR response to its frame being rendered: decoding,
+        formatting and diffing against the previous frame. The frames go to memory, so the
+        terminal itself is not measured.
+        """
+        renderer = FrameRenderer(io.StringIO())
+        times = []
+        for _ in range(count):
+            payload = self.ms_host.ms_sensors()
+            start = time.perf_counter()
+            if payload.get("response", "") != "OK":
+                continue
+            renderer.render(format_lines(struct.unpack('<hIIIHBBB', payload_data(payload))))
+            times.append(time.perf_counter() - start)
+        return times
+
+    def motor_jitter(self, count: int, phases: Sequence[int], period: float, stop: int) -> List[float]:
+        """
+        NOP round-trip times while the motor runs. With a pipelining transport the motor is
+        switched between 'phases' every 'period' seconds by a second command stream, so the
+        device handles motor commands and NOPs at the same time; otherwise the motor runs in
+        the first phase.
+        """
+        if not self.pipelined:
+            self.ms_host.ms_motor(phases[0])
+            try:
+                return self.rtt(count)
+            finally:
+                self.ms_host.ms_motor(stop)
+
+        done = threading.Event()
+        protocol = self.ms_host.ms_protocol
+        framing = self.ms_host.device_framing(self.ms_host.dut)
+
+        def cycle() -> None:
+            for phase in itertools.cycle(phases):
+                protocol.request(encode_command("MT", bytes([phase]), framing), framing=framing).wait(self.ms_host.response_timeout)
+                if done.wait(period):
+                    break
+
+        motor = threading.Thread(target=cycle, name="perf-motor")
+        motor.start()
+        try:
+            return self.rtt(count)
+        finally:
+            done.set()
+            motor.join()
+            self.ms_host.ms_motor(stop)
+
+# testbench/perf.py
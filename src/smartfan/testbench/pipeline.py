@@ -0,0 +1,287 @@
+# testbench/pipeline.py
+
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Set
+
+from smartfan.logger import get_app_logger
+from smartfan.metrics import UNITS
+from smartfan.core import Config, MShost
+from smartfan.core.transport import open_transport
+from smartfan.core.presence import PresenceTracker
+from smartfan.core.reload import apply
+from smartfan.core.session import derive
+from smartfan.testbench.tbench import TestBench
+from smartfan.testbench.results import ResultSink
+from smartfan.testbench.export import SampleExporter, open_exporter
+from smartfan.testbench.operator import OperatorConsole, open_operator
+
+logger = get_app_logger(__name__)
+
+STAGES = ("pair", "join", "test")
+
+class Unit:
+    """One DUT passing through the pipeline."""
+    __slots__ = ("number", "config", "tb", "link")
+
+    def __init__(self, number: int, config: Dict, exporter: Optional[SampleExporter] = None,
+                 operator: Optional[OperatorConsole] = None) -> None:
+        self.number = number
+        self.config = config
+        self.tb = TestBench(config)
+        self.tb.set_exporter(exporter)
+        self.tb.set_operator(operator)
+        self.link: Any = None
+
+    @property
+    def uuid(self) -> str:
+        return self.config['mqttms']['ms']['server_uuid']
+
+    def close(self) -> None:
+        if self.link is not None:
+            self.link.graceful_exit()
+            self.link = None
+
+
+class PairingPipeline:
+    """
+    Tests a rack of DUTs in three overlapping stages, each in its own thread:
+
+    - pair: BLE binding (the operator enters the UUID of the next unit, see OperatorConsole)
+    - join: connect a broker session for the unit, close the pairing with WiFi reset and
+      API_MQTT_READY (TestBench.mqtt_ready) and wait until its SR state reports
+      DEV_WIFI_CONNECTED and DEV_MQTT_SUBSCRIBED. The pairing commands must be the first
+      ones the unit gets, while its window for them is open, so they go out right after
+      subscribing: 'dutdelay' seconds after it, as in testbench mode, or with [presence]
+      enabled as soon as its status topic reports it online.
+    - test: the test sequence, as in testbench mode
+
+    While unit N is tested, unit N+1 joins and unit N+2 is paired. The stages are connected
+    by queues of 'depth' units, so a slow stage holds the ones before it back and the station
+    throughput is set by the slowest stage.
+
+    The units are the devices of config['fleet']['devices'] if any, otherwise 'units' units
+    are prompted for (0 - until Ctrl-C).
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.config = config
+        self.pipeline = config['pipeline']
+        self.sink = ResultSink(config['options']['results'])
+        self.queues = [queue.Queue(maxsize=self.pipeline['depth']) for _ in STAGES[1:]]
+        self.busy: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.stop = threading.Event()
+        self.summary = {"passed": 0, "failed": 0}
+        self.lock = threading.Lock()
+        # units between pairing and the end of their tests
+        self.active: Set[Unit] = set()
+        self.exporter: Optional[SampleExporter] = None
+        self.operator: Optional[OperatorConsole] = None
+        self.presence: Optional[PresenceTracker] = None
+
+    def uuids(self) -> Iterator[str]:
+        devices = self.config['fleet']['devices']
+        if devices:
+            return iter(devices)
+        units = self.pipeline['units']
+        if not units and not self.config['options']['interactive']:
+            units = 1
+        default = self.config['mqttms']['ms']['server_uuid']
+        return itertools.repeat(default, units) if units else itertools.repeat(default)
+
+    def unit_config(self, number: int, uuid: str) -> Dict:
+        """Configuration of one unit: its own server UUID and a client ID unique among the units in flight."""
+        return derive(self.config, {
+            "mqttms.ms.server_uuid": uuid,
+            "mqttms.mqtt.client_id": f"{self.config['mqttms']['mqtt']['client_id']}-u{number}",
+            "options.mode": "testbench",
+            # the join stage closes the pairing, the test stage only tests
+            "options.nopairing": True,
+            "options.interactive": self.config['options']['interactive'] and not self.config['fleet']['devices']
+        })
+
+    # stages
+
+    def pair(self, output: queue.Queue) -> None:
+        try:
+            for number, uuid in enumerate(self.uuids(), 1):
+                if self.stop.is_set():
+                    break
+                start = time.perf_counter()
+                unit = Unit(number, self.unit_config(number, uuid), self.exporter, self.operator)
+                with self.lock:
+                    self.active.add(unit)
+                try:
+                    bound = unit.tb.ble_binding()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Unit %d: pairing raised", number)
+                    self.fail(unit, "Pairing")
+                    continue
+                if not bound and self.operator is not None and self.operator.closed:
+                    self.close(unit)
+                    break
+                self.busy["pair"] += time.perf_counter() - start
+                if not bound:
+                    logger.error("Unit %d: cannot bind with server via BLE", number)
+                    self.fail(unit, "Pairing")
+                    continue
+                self.put(output, unit)
+        except BaseException:
+            # the next stages would wait for this one forever
+            self.stop.set()
+            raise
+        finally:
+            self.put(output, None)
+
+    def join(self, inbox: queue.Queue, output: queue.Queue) -> None:
+        try:
+            while (unit := self.get(inbox)) is not None:
+                start = time.perf_counter()
+                try:
+                    failed = self.join_unit(unit)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Unit %d: %s join raised", unit.number, unit.uuid)
+                    failed = "Join"
+                self.busy["join"] += time.perf_counter() - start
+                if failed is not None:
+                    logger.error("Unit %d: %s failed to join: %s", unit.number, unit.uuid, failed)
+                    self.fail(unit, failed)
+                    continue
+                logger.info("Unit %d: %s ready", unit.number, unit.uuid)
+                self.put(output, unit)
+        except BaseException:
+            self.stop.set()
+            raise
+        finally:
+            self.put(output, None)
+
+    def join_unit(self, unit: Unit) -> Optional[str]:
+        """Connect the unit, close the pairing and wait until it is ready. The step that failed, None if it is ready."""
+        unit.link = open_transport(unit.config)
+        if unit.link is None:
+            return "Connect"
+        unit.tb.set_ms_host(MShost(ms_protocol=unit.link.ms_protocol, config=Config(unit.config)))
+        unit.tb.ms_subscribe()
+        if self.presence is not None:
+            if not self.presence.wait_ready(unit.uuid, self.pipeline['join_timeout']):
+                return "Join"
+        else:
+            # no MS command may reach the unit before the pairing ones
+            self.stop.wait(self.config['options']['dutdelay'])
+        if not self.config['options']['nopairing'] and not unit.tb.mqtt_ready():
+            return "MQTT Ready"
+        if self.presence is None and not unit.tb.wait_ready(self.pipeline['join_timeout'], self.pipeline['poll']):
+            return "Join"
+        return None
+
+    def test(self, inbox: queue.Queue) -> None:
+        try:
+            while (unit := self.get(inbox)) is not None:
+                start = time.perf_counter()
+                try:
+                    records = unit.tb.run_tests()
+                except Exception:  # pylint: disable=broad-except
+                    # the unit fails, the next ones are still tested
+                    logger.exception("Unit %d: %s tests raised", unit.number, unit.uuid)
+                    self.busy["test"] += time.perf_counter() - start
+                    self.fail(unit, "Tests")
+                    continue
+                finally:
+                    self.close(unit)
+                self.busy["test"] += time.perf_counter() - start
+                self.record(unit, records)
+        except BaseException:
+            # the join stage would wait for this one forever
+            self.stop.set()
+            raise
+
+    def get(self, inbox: queue.Queue) -> Optional[Unit]:
+        # the next unit, None at the end or when a stage stopped the pipeline
+        while not self.stop.is_set():
+            try:
+                unit: Optional[Unit] = inbox.get(timeout=0.5)
+                return unit
+            except queue.Empty:
+                pass
+        return None
+
+    def put(self, output: queue.Queue, unit: Optional[Unit]) -> None:
+        # blocks while the next stage is behind (backpressure); gives up when stopping
+        while not self.stop.is_set():
+            try:
+                output.put(unit, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        if unit is not None:
+            self.close(unit)
+
+    def close(self, unit: Unit) -> None:
+        unit.close()
+        with self.lock:
+            self.active.discard(unit)
+
+    def reconfigure(self, changes: Dict) -> None:
+        """Apply a reloaded configuration to the units in flight (see core/reload.py)."""
+        with self.lock:
+            units = list(self.active)
+        for unit in units:
+            apply(unit.config, changes)
+            if unit.tb.ms_host is not None:
+                unit.tb.ms_host.reconfigure(changes)
+
+    def fail(self, unit: Unit, step: str) -> None:
+        self.close(unit)
+        UNITS.inc("fail")
+        self.record(unit, [{"test": step, "result": False, "duration": 0.0}])
+
+    def record(self, unit: Unit, records: list) -> None:
+        ok = bool(records) and all(r["result"] for r in records)
+        with self.lock:
+            self.summary["passed" if ok else "failed"] += 1
+        logger.info("Unit %d: %s %s", unit.number, unit.uuid, "PASS" if ok else "FAIL")
+        now = time.time()
+        self.sink.write({"dut": unit.uuid, "unit": unit.number, **r, "time": now} for r in records)
+
+    def run(self) -> Dict:
+        threads = [
+            threading.Thread(target=self.pair, args=(self.queues[0],), name="pair", daemon=True),
+            threading.Thread(target=self.join, args=(self.queues[0], self.queues[1]), name="join", daemon=True),
+            threading.Thread(target=self.test, args=(self.queues[1],), name="test", daemon=True)
+        ]
+        self.exporter = open_exporter(self.config)
+        # units waiting for the operator do not hold the others back
+        self.operator = open_operator(self.config, always=True)
+        if self.config['presence']['enabled']:
+            # joins wait for the status of the unit instead of polling it with SR
+            self.presence = PresenceTracker(self.config)
+            if not self.presence.start():
+                self.presence = None
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.5)
+        except KeyboardInterrupt:
+            logger.warning("Pipeline stopped by user (Ctrl-C)")
+            self.stop.set()
+            raise
+        finally:
+            if self.exporter is not None:
+                self.exporter.close()
+            if self.operator is not None:
+                self.operator.close()
+            if self.presence is not None:
+                self.presence.stop()
+            elapsed = time.perf_counter() - start
+            units = self.summary["passed"] + self.summary["failed"]
+            logger.info("Pipeline: %d passed, %d failed in %.1f s (%.2f units/min)",
+                        self.summary["passed"], self.summary["failed"], elapsed, 60.0 * units / max(elapsed, 1e-9))
+            logger.info("Pipeline: stage busy time %s", ", ".join(f"{s} {self.busy[s]:.1f} s" for s in STAGES))
+        return self.summary
+
+# testbench/pipeline.py
@@ -0,0 +1,218 @@
+# testbench/replay.py
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from smartfan.logger import get_app_logger
+from smartfan.core.capture import load_capture
+from smartfan.core.framing import FRAMING_BINARY, encode_command, encode_json
+from smartfan.core.mqtt5_transport import PendingResponse
+from smartfan.core.session import derive
+from smartfan.core.transport import open_transport
+from smartfan.testbench.results import ResultSink
+from smartfan.testbench.standin import StandInDevices
+
+logger = get_app_logger(__name__)
+
+# (offset from the start of the session in seconds, DUT, command code, framing, data length)
+Command = Tuple[float, str, str, str, int]
+
+def data_length(cmd: str, framing: str, size: int) -> int:
+    """Length of the command data of a captured message of 'size' bytes."""
+    if framing == FRAMING_BINARY:
+        return max(0, size - 3)
+    return max(0, (size - len(encode_json(cmd))) // 2)
+
+def capture_commands(records: List[Dict], session: str = "") -> List[Command]:
+    """
+    The published commands of a capture, with their offsets from the first command of their
+    session, in offset order. The sessions appended to one file (see TrafficCapture) all start
+    at 0, as if their stations ran at once; 'session' selects one of them. Lines of captures
+    without a session id form one session.
+    """
+    sent = [r for r in records if r.get("dir") == "tx" and (not session or r.get("session") == session)]
+    starts: Dict[str, float] = {}
+    for r in sent:
+        starts.setdefault(r.get("session", ""), r["t"])
+    commands = [(r["t"] - starts[r.get("session", "")], r["dut"], r["cmd"], r["framing"],
+                 data_length(r["cmd"], r["framing"], r["size"])) for r in sent]
+    commands.sort(key=lambda c: c[0])
+    return commands
+
+def capture_sessions(records: List[Dict]) -> List[str]:
+    """Ids of the sessions of a capture, in the order they started."""
+    return list(dict.fromkeys(r.get("session", "") for r in records if r.get("dir") == "tx"))
+
+
+class ReplayCopy:
+    """One replayed station: an MQTT v5 session per captured DUT, sending to the stand-in of that DUT."""
+
+    def __init__(self, config: Dict, number: int, duts: List[str]) -> None:
+        self.config = config
+        self.number = number
+        self.duts = duts
+        self.links: Dict[str, object] = {}
+        self.sent: List[Tuple[float, PendingResponse]] = []
+
+    @staticmethod
+    def uuid(dut: str, number: int) -> str:
+        return f"{dut}-r{number}"
+
+    def connect(self) -> bool:
+        for index, dut in enumerate(self.duts):
+            cfg = derive(self.config, {
+                "transport.type": "mqtt5",
+                "transport.session_expiry": 0,
+                "mqttms.ms.server_uuid": self.uuid(dut, self.number),
+                "mqttms.mqtt.client_id": f"{self.config['mqttms']['mqtt']['client_id']}-r{self.number}-{index}"
+            })
+            link = open_transport(cfg)
+            if link is None or not link.subscribe():
+                return False
+            self.links[dut] = link
+        return True
+
+    def run(self, commands: List[Command], speed: float, start: float) -> None:
+        for offset, dut, cmd, framing, length in commands:
+            delay = start + offset / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            self.sent.append((sent, self.links[dut].request(encode_command(cmd, bytes(length), framing), framing=framing)))
+
+    def close(self) -> None:
+        for link in self.links.values():
+            link.graceful_exit()
+        self.links.clear()
+
+
+class ReplayLoad:
+    """
+    Load generator for broker capacity planning.
+
+    The commands of a captured session (see core/capture.py) are sent again with their original
+    timing, compressed by each of 'speeds', by each of 'copies' parallel stations. Every copy
+    talks to its own stand-in devices (see StandInDevices), answering after 'latency' seconds.
+    Each level reports the offered and achieved command rate, the latency percentiles and the
+    timeouts; the ladder stops at the first level where the broker saturates: the throughput
+    falls below 'saturation' times the offered rate, or commands time out.
+    """
+
+    def __init__(self, config: Dict, records: List[Dict]) -> None:
+        self.config = config
+        self.replay = config['replay']
+        self.sessions = capture_sessions(records)
+        self.commands = capture_commands(records, self.replay['session'])
+        self.duts = sorted({c[1] for c in self.commands})
+        self.span = self.commands[-1][0] if self.commands else 0.0
+
+    def levels(self) -> List[Tuple[float, int]]:
+        """(speed, copies) pairs in the order of the offered load."""
+        return sorted(((float(s), int(c)) for s in self.replay['speeds'] for c in self.replay['copies']),
+                      key=lambda level: (level[0] * level[1], level[1]))
+
+    def run_level(self, speed: float, copies: int) -> Dict:
+        stations = [ReplayCopy(self.config, number, self.duts) for number in range(copies)]
+        try:
+            for station in stations:
+                if not station.connect():
+                    raise ConnectionError(f"replay copy {station.number} cannot connect")
+            start = time.perf_counter() + 0.1
+            threads = [threading.Thread(target=s.run, args=(self.commands, speed, start), name=f"replay-{s.number}")
+                       for s in stations]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            timeout = self.config['mqttms']['ms']['timeout']
+            for station in stations:
+                for _, pending in station.sent:
+                    pending.wait(timeout)
+        finally:
+            for station in stations:
+                station.close()
+        return self.report(speed, copies, start, [item for s in stations for item in s.sent])
+
+    def report(self, speed: float, copies: int, start: float, sent: List[Tuple[float, PendingResponse]]) -> Dict:
+        answered = [(t, p) for t, p in sent if p.payload is not None and p.payload.get("response", "") == "OK"]
+        latency = np.array([p.completed - t for t, p in answered]) * 1000.0
+        end = max((p.completed for _, p in answered), default=start)
+        duration = self.span / speed
+        offered = len(sent) / duration if duration > 0 else None
+        throughput = len(answered) / (end - start) if end > start else 0.0
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99]) if latency.size else (None, None, None)
+        timeouts = len(sent) - len(answered)
+        saturated = timeouts > 0 or (offered is not None and throughput < self.replay['saturation'] * offered)
+        return {
+            "test": "Replay",
+            "result": not saturated,
+            "speed": speed,
+            "copies": copies,
+            "commands": len(sent),
+            "offered": None if offered is None else round(offered, 1),
+            "throughput": round(throughput, 1),
+            "p50_ms": None if p50 is None else round(float(p50), 2),
+            "p95_ms": None if p95 is None else round(float(p95), 2),
+            "p99_ms": None if p99 is None else round(float(p99), 2),
+            "timeouts": timeouts
+        }
+
+    def run(self) -> List[Dict]:
+        if not self.commands:
+            if self.replay['session']:
+                logger.error("Replay: no commands of session %s in the capture (sessions: %s)",
+                             self.replay['session'], ", ".join(self.sessions))
+            else:
+                logger.error("Replay: no commands in the capture")
+            return []
+        copies = max(int(c) for c in self.replay['copies'])
+        standin: Optional[StandInDevices] = None
+        if self.replay['standin']:
+            uuids = [ReplayCopy.uuid(dut, n) for dut in self.duts for n in range(copies)]
+            standin = StandInDevices(self.config, uuids, self.replay['latency'])
+            if not standin.start():
+                return []
+        if not self.replay['session'] and len(self.sessions) > 1:
+            logger.info("Replay: %d sessions of the capture replayed at once, each from its start", len(self.sessions))
+        logger.info("Replay: %d commands to %d devices over %.1f s", len(self.commands), len(self.duts), self.span)
+        logger.info("%8s %6s %8s %10s %10s %9s %9s %9s %8s", "speed", "copies", "commands", "offered/s",
+                    "done/s", "p50 ms", "p95 ms", "p99 ms", "timeouts")
+        reports = []
+        try:
+            for speed, copies in self.levels():
+                report = self.run_level(speed, copies)
+                reports.append(report)
+                logger.info("%7.0fx %6d %8d %10s %10.1f %9s %9s %9s %8d", speed, copies, report["commands"],
+                            report["offered"], report["throughput"], report["p50_ms"], report["p95_ms"],
+                            report["p99_ms"], report["timeouts"])
+                if not report["result"]:
+                    logger.warning("Replay: broker saturated at %gx speed with %d copies", speed, copies)
+                    break
+            else:
+                logger.info("Replay: no saturation up to the highest level")
+        except ConnectionError as e:
+            logger.error(f"Replay: {e}")
+        finally:
+            if standin is not None:
+                standin.stop()
+        now = time.time()
+        ResultSink(self.config['options']['results']).write({**r, "time": now} for r in reports)
+        return reports
+
+
+def run_capture_replay(config: Dict) -> List[Dict]:
+    path = config['replay']['capture']
+    if not path:
+        logger.error("Replay: no capture file given")
+        return []
+    try:
+        records = load_capture(path)
+    except OSError as e:
+        logger.error(f"Replay: cannot read {path}: {e}")
+        return []
+    return ReplayLoad(config, records).run()
+
+# testbench/replay.py
@@ -0,0 +1,34 @@
+# testbench/results.py
+
+import json
+import threading
+from typing import Dict, Iterable
+
+from smartfan.logger import get_app_logger
+
+logger = get_app_logger(__name__)
+
+class ResultSink:
+    """
+    Appends result records to a JSON Lines file, one record per line.
+    With an empty path the records are dropped, so callers need not check whether a sink is configured.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, records: Iterable[Dict]) -> None:
+        if not self.path:
+            return
+        lines = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+        if not lines:
+            return
+        with self.lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                logger.error(f"Cannot write results to {self.path}: {e}")
+
+# testbench/results.py
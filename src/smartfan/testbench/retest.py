@@ -0,0 +1,105 @@
+# testbench/retest.py
+
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from smartfan.logger import get_app_logger
+from smartfan.core.framing import payload_data
+
+logger = get_app_logger(__name__)
+
+
+def plan_hash(tests: List[str], config: Dict) -> str:
+    """Hash of the test plan: the test names in order and the settings the tests depend on."""
+    plan = {
+        "tests": tests,
+        "settings": config['tests'],
+        "params": config['params'] if config['options']['setparams'] else None,
+        "dut": config['dut']
+    }
+    return hashlib.sha256(json.dumps(plan, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class RetestCache:
+    """
+    Passed tests by (device identity, firmware version, test name, test plan hash).
+
+    The cache is an append-only JSON Lines file, so several processes may share it; when a key
+    appears more than once the last line wins. A passed test is valid for 'validity' seconds,
+    a failure invalidates it.
+    """
+
+    def __init__(self, path: str, validity: float, clock=time.time) -> None:
+        self.path = path
+        self.validity = validity
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, str, str, str], float] = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"Cannot read retest cache {self.path}: {e}")
+            return
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                key = (entry["device"], entry["version"], entry["test"], entry["plan"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if entry.get("passed"):
+                self.entries[key] = entry["time"]
+            else:
+                self.entries.pop(key, None)
+
+    def passed(self, device: str, version: str, test: str, plan: str) -> bool:
+        """True if the test passed on this device and firmware with this plan within the validity window."""
+        passed_at = self.entries.get((device, version, test, plan))
+        return passed_at is not None and self.clock() - passed_at < self.validity
+
+    def record(self, device: str, version: str, test: str, plan: str, passed: bool) -> None:
+        now = self.clock()
+        key = (device, version, test, plan)
+        with self.lock:
+            if passed:
+                self.entries[key] = now
+            else:
+                self.entries.pop(key, None)
+            line = json.dumps({"device": device, "version": version, "test": test, "plan": plan,
+                               "passed": passed, "time": now}, separators=(',', ':'))
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.error(f"Cannot write retest cache {self.path}: {e}")
+
+
+def device_identity(ms_host) -> Optional[Tuple[str, str]]:
+    """
+    (identity, firmware version) of the DUT: MAC address from GM, or the machine id from ZA,
+    and the version from VS. None if the device cannot be identified.
+    """
+    version, _ = ms_host.read_version()
+    if version is None:
+        return None
+    for read in (ms_host.ms_getsmac, ms_host.ms_getmachid):
+        payload = read()
+        if payload.get("response", "") != "OK":
+            continue
+        try:
+            data = payload_data(payload)
+        except ValueError:
+            continue
+        if data:
+            return data.hex(), version
+    return None
+
+# testbench/retest.py
@@ -0,0 +1,330 @@
+# testbench/soak.py
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from smartfan.logger import get_app_logger
+from smartfan.metrics import TESTS, UNITS
+from smartfan.core import Config, MShost
+from smartfan.core.reload import apply
+from smartfan.core.session import derive
+from smartfan.core.timer_wheel import Timer, TimerWheel
+from smartfan.core.transport import open_transport
+from smartfan.testbench.tbench import TestBench
+from smartfan.testbench.stats import SensorStatistics
+from smartfan.testbench.results import ResultSink
+from smartfan.testbench.export import SampleExporter, open_exporter
+
+logger = get_app_logger(__name__)
+
+TEST_NAME = "Soak"
+
+# periodic actions of a soak run, in [soak.periods]
+ACTIONS = ("poll", "motor", "led", "params")
+
+# motor phases a unit goes through, one step per motor action
+MOTOR_CYCLE = (TestBench.MOT_PHASE_SLOW, TestBench.MOT_STOP, TestBench.MOT_PHASE_FAST, TestBench.MOT_STOP)
+
+
+class SoakUnit:
+    """One DUT of a soak run. Its actions never overlap: one that finds the unit busy is skipped."""
+    __slots__ = ("uuid", "tb", "link", "lock", "motor", "led")
+
+    def __init__(self, uuid: str, tb: TestBench, link=None) -> None:
+        self.uuid = uuid
+        self.tb = tb
+        self.link = link
+        self.lock = threading.Lock()
+        self.motor = 0
+        self.led = 0
+
+
+class SoakAction:
+    """A periodic action of a unit. 'planned' is its grid time, without jitter."""
+    __slots__ = ("unit", "name", "period", "planned", "timer", "runs", "failures", "skipped")
+
+    def __init__(self, unit: SoakUnit, name: str, period: float) -> None:
+        self.unit = unit
+        self.name = name
+        self.period = period
+        self.planned = 0.0
+        self.timer: Optional[Timer] = None
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def counts(self) -> Dict[str, int]:
+        return {"runs": self.runs, "failures": self.failures, "skipped": self.skipped}
+
+
+class SoakRunner:
+    """
+    Burn-in of the devices of config['fleet']['devices'] (or the configured server UUID) for
+    [soak] duration seconds, each device with its own broker session and its own periodic
+    actions ([soak.periods], 0 disables one):
+
+    - poll: read SR, feed the sensor statistics and the sample export
+    - motor: step the motor through slow, stop, fast, stop
+    - led: toggle the LED
+    - params: read PG and compare it with [params]
+
+    All actions of all units are timers of one TimerWheel, so a due action is found in O(1)
+    however many units run. Each action starts at a random phase of its period and every run
+    is moved by up to 'jitter' times the period, so hundreds of units do not hit the broker in
+    the same tick. The next run is planned from the grid time of the last one, not from when it
+    ran, so late runs do not accumulate drift; runs missed entirely (e.g. after a stall) are
+    counted as skipped. Due actions run on 'workers' threads (0: in the scheduler thread).
+
+    Every 'checkpoint_interval' seconds the soak progress (elapsed time, counters and the time
+    to the next run of every action) is written to 'checkpoint'. A run started with 'resume'
+    continues from it: the remaining duration, the counters and the phases of the actions.
+    """
+
+    def __init__(self, config: Dict, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep, rng: Optional[random.Random] = None) -> None:
+        self.config = config
+        self.soak = config['soak']
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng if rng is not None else random.Random()
+        self.devices: List[str] = list(config['fleet']['devices']) or [config['mqttms']['ms']['server_uuid']]
+        self.units: List[SoakUnit] = []
+        self.actions: List[SoakAction] = []
+        self.wheel = TimerWheel(self.soak['tick'], clock())
+        self.stats = SensorStatistics(config)
+        self.exporter: Optional[SampleExporter] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.started = 0.0
+        self.elapsed = 0.0
+        # UUIDs of the soaked units, the checkpoint is only resumed for the same ones
+        self.fleet: List[str] = []
+
+    def device_config(self, number: int, uuid: str) -> Dict:
+        return derive(self.config, {
+            "mqttms.ms.server_uuid": uuid,
+            "mqttms.mqtt.client_id": f"{self.config['mqttms']['mqtt']['client_id']}-s{number}",
+            "options.mode": "testbench"
+        })
+
+    def connect(self) -> None:
+        for number, uuid in enumerate(self.devices):
+            cfg = self.device_config(number, uuid)
+            link = open_transport(cfg)
+            if link is None:
+                logger.error("Soak: cannot connect %s", uuid)
+                continue
+            tb = TestBench(cfg)
+            tb.set_exporter(self.exporter)
+            tb.set_ms_host(MShost(ms_protocol=link.ms_protocol, config=Config(cfg)))
+            tb.ms_subscribe()
+            self.stats.set_params(uuid, tb.ms_host.read_params())
+            self.add_unit(SoakUnit(uuid, tb, link))
+
+    def reconfigure(self, changes: Dict) -> None:
+        """Apply a reloaded configuration to the connected units (see core/reload.py)."""
+        for unit in list(self.units):
+            apply(unit.tb.config, changes)
+            if unit.tb.ms_host is not None:
+                unit.tb.ms_host.reconfigure(changes)
+
+    def add_unit(self, unit: SoakUnit) -> None:
+        self.units.append(unit)
+        for name in ACTIONS:
+            period = self.soak['periods'][name]
+            if period > 0:
+                self.actions.append(SoakAction(unit, name, period))
+
+    # checkpoint
+
+    def load_checkpoint(self) -> Optional[Dict]:
+        """The checkpoint of an unfinished run of the same units, None to start over."""
+        path = self.soak['checkpoint']
+        if not path or not self.soak['resume'] or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Soak: cannot read checkpoint {path}, starting over: {e}")
+            return None
+        if checkpoint.get("finished"):
+            logger.info("Soak: checkpoint %s is of a finished run, starting over", path)
+            return None
+        if sorted(checkpoint.get("devices", [])) != self.fleet:
+            logger.warning("Soak: checkpoint %s is of other units, starting over", path)
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, now: float, finished: bool = False) -> None:
+        path = self.soak['checkpoint']
+        if not path:
+            return
+        units: Dict[str, Dict] = {}
+        with self.lock:
+            for action in self.actions:
+                units.setdefault(action.unit.uuid, {})[action.name] = {**action.counts(), "next_in": max(action.planned - now, 0.0)}
+        state = {"elapsed": self.elapsed + now - self.started, "duration": self.soak['duration'], "finished": finished,
+                 "devices": self.fleet, "units": units}
+        # written aside and renamed, so a crash never leaves a truncated checkpoint
+        temp = f"{path}.tmp"
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(temp, path)
+        except OSError as e:
+            logger.error(f"Soak: cannot write checkpoint {path}: {e}")
+
+    # scheduling
+
+    def plan(self, checkpoint: Optional[Dict]) -> None:
+        """Schedule the first run of every action: resumed from the checkpoint or at a random phase."""
+        now = self.clock()
+        saved = checkpoint.get("units", {}) if checkpoint else {}
+        if checkpoint:
+            self.elapsed = checkpoint.get("elapsed", 0.0)
+            logger.info("Soak: resuming after %.0f s", self.elapsed)
+        for action in self.actions:
+            state = saved.get(action.unit.uuid, {}).get(action.name)
+            if state is not None:
+                action.runs, action.failures, action.skipped = state["runs"], state["failures"], state["skipped"]
+                action.planned = now + min(state["next_in"], action.period)
+            else:
+                action.planned = now + self.rng.uniform(0, action.period)
+            action.timer = self.wheel.schedule(action.planned, action)
+
+    def reschedule(self, action: SoakAction, now: float) -> None:
+        action.planned += action.period
+        if action.planned <= now:
+            missed = int((now - action.planned) // action.period) + 1
+            action.skipped += missed
+            action.planned += missed * action.period
+        jitter = self.soak['jitter'] * action.period
+        action.timer = self.wheel.schedule(action.planned + self.rng.uniform(-jitter, jitter), action)
+
+    def dispatch(self, now: float) -> int:
+        due = self.wheel.advance(now)
+        for action in due:
+            self.reschedule(action, now)
+            if self.executor is not None:
+                self.executor.submit(self.execute, action)
+            else:
+                self.execute(action)
+        return len(due)
+
+    def execute(self, action: SoakAction) -> None:
+        unit = action.unit
+        if not unit.lock.acquire(blocking=False):
+            with self.lock:
+                action.skipped += 1
+            return
+        try:
+            ok = getattr(self, f"do_{action.name}")(unit)
+            if not ok:
+                logger.warning("Soak: %s of %s failed", action.name, unit.uuid)
+        except Exception as e:
+            logger.error(f"Soak: {action.name} of {unit.uuid} failed: {e}")
+            ok = False
+        finally:
+            unit.lock.release()
+        with self.lock:
+            action.runs += 1
+            action.failures += not ok
+
+    # actions
+
+    def do_poll(self, unit: SoakUnit) -> bool:
+        sensor_data = unit.tb.read_sensors()
+        if sensor_data is None:
+            return False
+        self.stats.add_sample(unit.uuid, sensor_data)
+        return True
+
+    def do_motor(self, unit: SoakUnit) -> bool:
+        phase = MOTOR_CYCLE[unit.motor % len(MOTOR_CYCLE)]
+        unit.motor += 1
+        return unit.tb.ms_host.ms_motor(phase).get("response", "") == "OK"
+
+    def do_led(self, unit: SoakUnit) -> bool:
+        unit.led ^= 1
+        return unit.tb.ms_host.ms_led(unit.led).get("response", "") == "OK"
+
+    def do_params(self, unit: SoakUnit) -> bool:
+        params = unit.tb.ms_host.read_params()
+        self.stats.set_params(unit.uuid, params)
+        return params is not None and all(params.get(name) == value for name, value in self.config['params'].items())
+
+    # run
+
+    def soak_loop(self) -> bool:
+        """Run the due actions until the duration is over (True) or the soak is stopped (False)."""
+        duration = self.soak['duration']
+        next_checkpoint = self.started + self.soak['checkpoint_interval']
+        while not self.stop.is_set():
+            now = self.clock()
+            if duration and self.elapsed + now - self.started >= duration:
+                return True
+            self.dispatch(now)
+            if now >= next_checkpoint:
+                self.save_checkpoint(now)
+                next_checkpoint = now + self.soak['checkpoint_interval']
+            delay = self.wheel.next_time() - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+        return False
+
+    def run(self) -> List[Dict]:
+        """Soak the units; the result records, one per unit."""
+        self.fleet = sorted(unit.uuid for unit in self.units) if self.units else sorted(self.devices)
+        checkpoint = self.load_checkpoint()
+        self.exporter = open_exporter(self.config)
+        if self.soak['workers'] > 0:
+            self.executor = ThreadPoolExecutor(self.soak['workers'], thread_name_prefix="soak")
+        try:
+            if not self.units:
+                self.connect()
+            self.plan(checkpoint)
+            self.started = self.clock()
+            logger.info("Soak: %d units, %d actions", len(self.units), len(self.actions))
+            finished = False
+            try:
+                finished = self.soak_loop()
+            except KeyboardInterrupt:
+                logger.warning("Soak interrupted, progress is kept in the checkpoint")
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            # a finished run is not resumed: the next soak starts over
+            self.save_checkpoint(self.clock(), finished)
+        finally:
+            for unit in self.units:
+                if unit.link is not None:
+                    unit.link.graceful_exit()
+            if self.exporter is not None:
+                self.exporter.close()
+        return self.report()
+
+    def report(self) -> List[Dict]:
+        elapsed = self.elapsed + self.clock() - self.started
+        records = []
+        now = time.time()
+        for unit in self.units:
+            actions = {a.name: a.counts() for a in self.actions if a.unit is unit}
+            ok = all(c["failures"] == 0 for c in actions.values())
+            alarms = self.stats.dut(unit.uuid)
+            records.append({"dut": unit.uuid, "test": TEST_NAME, "result": ok, "duration": elapsed, "actions": actions,
+                            "alarms": alarms.alarm_count, "active_alarms": alarms.active_alarms(), "time": now})
+            TESTS.inc(TEST_NAME, "pass" if ok else "fail")
+            UNITS.inc("pass" if ok else "fail")
+            logger.info("Soak %s: %s %s", unit.uuid, "PASS" if ok else "FAIL",
+                        ", ".join(f"{name} {c['runs']} runs {c['failures']} failed {c['skipped']} skipped" for name, c in actions.items()))
+        ResultSink(self.config['options']['results']).write(records)
+        self.stats.log_summary()
+        return records
+
+# testbench/soak.py
@@ -0,0 +1,270 @@
+# testbench/standin.py
+
+import hashlib
+import json
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tty
+    HAVE_TERMIOS = True
+except ImportError:
+    HAVE_TERMIOS = False
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from smartfan.logger import get_app_logger
+from smartfan.core.framing import COMMAND_NAMES, FRAMING_BINARY, FRAMING_JSON, encode_binary_response
+from smartfan.core.mqtt5_transport import expand_topic
+from smartfan.core.presence import status_message
+from smartfan.core.serial_transport import FrameDecoder, encode_frame
+
+logger = get_app_logger(__name__)
+
+def device_data(uuid: str, cmd: str) -> bytes:
+    """Response data of a stand-in device: plausible values, stable per UUID."""
+    digest = hashlib.sha256(uuid.encode('utf-8')).digest()
+    match cmd:
+        case "WH":
+            return b'\x01'
+        case "VS":
+            return b'2.4.0+bin\x00109380-2501-' + f"{digest[0] * 256 + digest[1]:07d}".encode('ascii')
+        case "GM":
+            return digest[:6]
+        case "ZA":
+            return digest[6:14]
+        case "SR":
+            return struct.pack('<hIIIHBBB', 2200, 101325, 45000, 20000, 10, 7, 0, 0x31)
+        case "PG":
+            return struct.pack('<HHHHHH', 100, 70, 10000, 600, 120, 1)
+    return b""
+
+def device_response(uuid: str, framing: str, message: bytes) -> Optional[Tuple[str, bytes]]:
+    """(command code, response message) of a stand-in device to a command, None if it cannot be decoded."""
+    try:
+        if framing == FRAMING_BINARY:
+            cmd = COMMAND_NAMES[message[0]]
+            return cmd, encode_binary_response(cmd, device_data(uuid, cmd))
+        cmd = json.loads(message)["command"]
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+    data = device_data(uuid, cmd).hex()
+    return cmd, f'{{"command":"{cmd}","response":"OK","data":"{data}"}}'.encode('ascii')
+
+
+class StandInDevices:
+    """
+    Simulated MS devices on a broker, one MQTT v5 client for all of them.
+
+    Every command published on the command topic of one of the UUIDs is answered after
+    'latency' seconds with device_data(), in the framing of the command: on its Response Topic
+    with its Correlation Data (MQTT v5 clients), otherwise on the response topic of the device.
+    The command topic template must contain server_uuid to tell the devices apart.
+    """
+
+    def __init__(self, config: Dict, uuids: List[str], latency: float = 0.0) -> None:
+        self.mqtt_config = config['mqttms']['mqtt']
+        self.ms_config = config['mqttms']['ms']
+        self.latency = latency
+        self.topics: Dict[str, Tuple[str, str]] = {}
+        for uuid in uuids:
+            for framing in (FRAMING_JSON, FRAMING_BINARY):
+                self.topics[expand_topic(self.ms_config['cmd_topic'], self.ms_config['client_uuid'], uuid, framing)] = (uuid, framing)
+        self.client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2,
+                                  client_id=f"{self.mqtt_config.get('client_id', '')}-standin",
+                                  protocol=mqtt.MQTTv5)
+        if self.mqtt_config.get('username'):
+            self.client.username_pw_set(self.mqtt_config['username'], self.mqtt_config.get('password'))
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.on_subscribe = self.on_subscribe
+        self.subscribed = threading.Event()
+        # responses in order of their due time (the latency is the same for all of them)
+        self.outbox: queue.Queue = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.answered = 0
+
+    def start(self, timeout: float = 15.0) -> bool:
+        if "server_uuid" not in self.ms_config['cmd_topic']:
+            logger.error("Stand-in: command topic template %s has no server_uuid part", self.ms_config['cmd_topic'])
+            return False
+        try:
+            self.client.connect(self.mqtt_config['host'], self.mqtt_config['port'])
+        except OSError as e:
+            logger.error(f"Stand-in: cannot connect to {self.mqtt_config['host']}:{self.mqtt_config['port']}: {e}")
+            return False
+        self.thread = threading.Thread(target=self.run, name="standin", daemon=True)
+        self.thread.start()
+        self.client.loop_start()
+        if not self.subscribed.wait(timeout):
+            logger.error("Stand-in: not subscribed in time")
+            self.stop()
+            return False
+        logger.info("Stand-in: %d devices", len(self.topics) // 2)
+        return True
+
+    def stop(self) -> None:
+        self.outbox.put(None)
+        self.client.disconnect()
+        self.client.loop_stop()
+        if self.thread is not None:
+            self.thread.join()
+
+    def on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            logger.error("Stand-in: connection refused: %s", reason_code)
+            return
+        client.subscribe([(topic, 1) for topic in self.topics])
+
+    def on_subscribe(self, client, userdata, mid, reason_codes, properties) -> None:
+        self.subscribed.set()
+
+    def response(self, uuid: str, framing: str, message: bytes) -> Optional[Tuple[str, bytes]]:
+        return device_response(uuid, framing, message)
+
+    def on_message(self, client, userdata, message) -> None:
+        target = self.topics.get(message.topic)
+        if target is None:
+            return
+        uuid, framing = target
+        answer = self.response(uuid, framing, message.payload)
+        if answer is None:
+            logger.warning("Stand-in: invalid command on %s", message.topic)
+            return
+        props = None
+        topic = expand_topic(self.ms_config['rsp_topic'], self.ms_config['client_uuid'], uuid, framing)
+        request = message.properties
+        if request is not None and getattr(request, 'ResponseTopic', None):
+            topic = request.ResponseTopic
+            props = Properties(PacketTypes.PUBLISH)
+            if getattr(request, 'CorrelationData', None) is not None:
+                props.CorrelationData = request.CorrelationData
+        self.outbox.put((time.monotonic() + self.latency, topic, answer[1], props))
+
+    def run(self) -> None:
+        while (item := self.outbox.get()) is not None:
+            due, topic, payload, props = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.client.publish(topic, payload, qos=1, properties=props)
+            self.answered += 1
+
+
+class StandInSerialDevice:
+    """
+    A simulated DUT on the far end of a pseudo terminal, for the serial transport without
+    hardware: 'port' is the name of the terminal to open. Every command frame is answered after
+    'latency' seconds with device_data(), in the framing of the command and with its seq.
+    Damaged frames are counted in 'dropped' and not answered. Pseudo terminals need a POSIX system.
+    """
+
+    def __init__(self, uuid: str, latency: float = 0.0) -> None:
+        if not HAVE_TERMIOS:
+            raise RuntimeError("The serial stand-in device needs pseudo terminals (POSIX systems only)")
+        self.uuid = uuid
+        self.latency = latency
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.decoder = FrameDecoder()
+        self.outbox: queue.Queue = queue.Queue()
+        self.stopped = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.answered = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.decoder.dropped
+
+    def start(self) -> None:
+        self.threads = [threading.Thread(target=self.receive, name="standin-serial-rx", daemon=True),
+                        threading.Thread(target=self.run, name="standin-serial-tx", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.outbox.put(None)
+        for thread in self.threads:
+            thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def receive(self) -> None:
+        while not self.stopped.is_set():
+            if not select.select([self.master], [], [], 0.05)[0]:
+                continue
+            try:
+                data = os.read(self.master, 65536)
+            except OSError:
+                return
+            for seq, framing, message in self.decoder.feed(data):
+                answer = device_response(self.uuid, framing, message)
+                if answer is None:
+                    logger.warning("Stand-in: invalid command on %s", self.port)
+                    continue
+                self.outbox.put((time.monotonic() + self.latency, encode_frame(seq, framing, answer[1])))
+
+    def run(self) -> None:
+        while (item := self.outbox.get()) is not None:
+            due, frame = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            os.write(self.master, frame)
+            self.answered += 1
+
+
+class StandInPresence:
+    """
+    Status topic of one simulated device: a retained 'online' status published on connect and
+    an 'offline' status registered as Last Will. stop() goes offline cleanly, drop() closes the
+    socket without DISCONNECT, as a device losing power would, and the broker publishes the will.
+    """
+
+    def __init__(self, config: Dict, uuid: str, state: int = 0x31) -> None:
+        mqtt_config = config['mqttms']['mqtt']
+        self.mqtt_config = mqtt_config
+        self.state = state
+        self.topic = expand_topic(config['presence']['topic'], config['mqttms']['ms']['client_uuid'], uuid)
+        self.client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2,
+                                  client_id=f"{mqtt_config.get('client_id', '')}-{uuid[:8]}-status")
+        if mqtt_config.get('username'):
+            self.client.username_pw_set(mqtt_config['username'], mqtt_config.get('password'))
+        self.client.will_set(self.topic, status_message(False), qos=1, retain=True)
+        self.client.on_connect = self.on_connect
+
+    def start(self) -> bool:
+        try:
+            self.client.connect(self.mqtt_config['host'], self.mqtt_config['port'])
+        except OSError as e:
+            logger.error(f"Stand-in: cannot connect to {self.mqtt_config['host']}:{self.mqtt_config['port']}: {e}")
+            return False
+        self.client.loop_start()
+        return True
+
+    def on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if not reason_code.is_failure:
+            client.publish(self.topic, status_message(True, self.state), qos=1, retain=True)
+
+    def stop(self) -> None:
+        self.client.publish(self.topic, status_message(False), qos=1, retain=True).wait_for_publish(5.0)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def drop(self) -> None:
+        self.client.loop_stop()
+        sock = self.client.socket()
+        if sock is not None:
+            sock.close()
+
+# testbench/standin.py
@@ -0,0 +1,200 @@
+# testbench/stats.py
+
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from smartfan.logger import get_app_logger
+
+logger = get_app_logger(__name__)
+
+class RunningStats:
+    """
+    Streaming statistics of one channel, O(1) time and memory per sample:
+    Welford mean/variance, min/max, EWMA and rate of change per second.
+    """
+    __slots__ = ("alpha", "count", "mean", "m2", "min", "max", "ewma", "last", "last_time", "rate", "max_rate")
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.ewma = 0.0
+        self.last = 0.0
+        self.last_time = 0.0
+        self.rate = 0.0
+        self.max_rate = 0.0
+
+    def add(self, value: float, timestamp: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self.count == 1:
+            self.ewma = value
+        else:
+            self.ewma += self.alpha * (value - self.ewma)
+            dt = timestamp - self.last_time
+            if dt > 0:
+                self.rate = (value - self.last) / dt
+                if abs(self.rate) > abs(self.max_rate):
+                    self.max_rate = self.rate
+        self.last = value
+        self.last_time = timestamp
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "stddev": self.stddev,
+            "min": self.min,
+            "max": self.max,
+            "ewma": self.ewma,
+            "max_rate": self.max_rate
+        }
+
+
+class DutStats:
+    """
+    Statistics and alarms of all sensor channels of one DUT.
+
+    Threshold alarms use the parameters the device is configured with (amb_thr, hum_thr,
+    gas_thr): its PG readout once set_params() got it, the 'params' section until then.
+    Drift alarms fire when the EWMA of a channel moves away from its baseline (mean of the
+    first 'warmup' samples) by more than 'drift' (relative).
+    Alarms are edge-triggered: an alarm is reported when it is raised, not on every sample.
+    """
+
+    # channel name, index in the SR tuple, scale to display units, unit
+    CHANNELS: Tuple[Tuple[str, int, float, str], ...] = (
+        ("temperature", 0, 100.0, "°C"),
+        ("pressure", 1, 100.0, "hPa"),
+        ("humidity", 2, 1000.0, "%"),
+        ("gas", 3, 1.0, "Ohm"),
+        ("light", 4, 1.0, "")
+    )
+
+    # channel name -> (params key, True if the alarm is raised above the threshold)
+    THRESHOLDS: Dict[str, Tuple[str, bool]] = {
+        "light": ("amb_thr", True),
+        "humidity": ("hum_thr", True),
+        "gas": ("gas_thr", False)
+    }
+
+    def __init__(self, params: Dict, ewma_alpha: float = 0.1, drift: float = 0.1, warmup: int = 10) -> None:
+        self.channels = {name: RunningStats(ewma_alpha) for name, _, _, _ in self.CHANNELS}
+        self.thresholds: Dict[str, Tuple[float, bool]] = {}
+        self.set_params(params)
+        self.drift = drift
+        self.warmup = warmup
+        self.baseline: Dict[str, float] = {}
+        self.active: Dict[Tuple[str, str], bool] = {}
+        self.alarm_count = 0
+        self.samples = 0
+
+    def set_params(self, params: Dict) -> None:
+        """Take the alarm thresholds from device parameters (MShost.read_params() or the 'params' section)."""
+        self.thresholds = {name: (params[key], above) for name, (key, above) in self.THRESHOLDS.items() if params.get(key) is not None}
+
+    def add_sample(self, sensor_data, timestamp: Optional[float] = None) -> List[str]:
+        """
+        Add one decoded SR response.
+
+        :return: alarms raised by this sample (empty list when none)
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.samples += 1
+        raised = []
+        for name, index, scale, unit in self.CHANNELS:
+            value = sensor_data[index] / scale
+            channel = self.channels[name]
+            channel.add(value, timestamp)
+
+            threshold = self.thresholds.get(name)
+            if threshold is not None:
+                limit, above = threshold
+                tripped = value > limit if above else value < limit
+                if self._edge(name, "threshold", tripped):
+                    raised.append(f"{name} {'above' if above else 'below'} threshold {limit}{unit}: {value:g}{unit}")
+
+            if channel.count == self.warmup:
+                self.baseline[name] = channel.mean
+            base = self.baseline.get(name)
+            if base:
+                drifted = abs(channel.ewma - base) > self.drift * abs(base)
+                if self._edge(name, "drift", drifted):
+                    raised.append(f"{name} drifted from {base:g}{unit} to {channel.ewma:g}{unit}")
+
+        self.alarm_count += len(raised)
+        return raised
+
+    def _edge(self, name: str, kind: str, tripped: bool) -> bool:
+        key = (name, kind)
+        was = self.active.get(key, False)
+        self.active[key] = tripped
+        return tripped and not was
+
+    def active_alarms(self) -> List[str]:
+        return [f"{name} {kind}" for (name, kind), on in self.active.items() if on]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: channel.summary() for name, channel in self.channels.items()}
+
+
+class SensorStatistics:
+    """Per-DUT streaming statistics for monitor and soak runs. No samples are stored."""
+
+    def __init__(self, config: Dict) -> None:
+        self.config = config
+        self.duts: Dict[str, DutStats] = {}
+
+    def dut(self, dut: str) -> DutStats:
+        stats = self.duts.get(dut)
+        if stats is None:
+            opts = self.config["stats"]
+            stats = DutStats(self.config["params"], ewma_alpha=opts["ewma_alpha"], drift=opts["drift"], warmup=opts["warmup"])
+            self.duts[dut] = stats
+        return stats
+
+    def set_params(self, dut: str, params: Optional[Dict]) -> None:
+        """Use the parameters read from the device for its thresholds; None (no readout) keeps the current ones."""
+        if params is not None:
+            self.dut(dut).set_params(params)
+
+    def add_sample(self, dut: str, sensor_data, timestamp: Optional[float] = None) -> List[str]:
+        """Add a sample of the DUT and log the alarms it raised; returns them."""
+        raised = self.dut(dut).add_sample(sensor_data, timestamp)
+        for message in raised:
+            logger.warning("Alarm %s: %s", dut, message)
+        return raised
+
+    def log_summary(self) -> None:
+        for dut, stats in self.duts.items():
+            logger.info("Statistics of %s: %d samples, %d alarms", dut, stats.samples, stats.alarm_count)
+            for name, _, _, unit in DutStats.CHANNELS:
+                s = stats.channels[name]
+                if s.count == 0:
+                    continue
+                logger.info("  %-11s mean %10.2f  sd %8.2f  min %10.2f  max %10.2f  ewma %10.2f  max rate %8.3f/s %s",
+                            name, s.mean, s.stddev, s.min, s.max, s.ewma, s.max_rate, unit)
+            active = stats.active_alarms()
+            if active:
+                logger.warning("  Active alarms: %s", ", ".join(active))
+
+# testbench/stats.py
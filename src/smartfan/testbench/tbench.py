@@ -2,33 +2,44 @@
 
 import time
 import struct
-import re
-import logging
+from functools import cached_property
+from typing import Optional
 from prompt_toolkit import prompt
-from prompt_toolkit.validation import Validator, ValidationError
-
-from smartfan.logger import get_app_logger
-from smartfan.core import MShost
+from prompt_toolkit.validation import Validator
+
+from smartfan.logger import get_app_logger, quiet_logger
+from smartfan.core import Config, MShost
+from smartfan.core.session import derive
+from smartfan.core.transport import open_transport
+from smartfan.core.framing import payload_data
+from smartfan.metrics import TESTS, UNITS, SENSOR
+from smartfan.utils.profiling import phase
+from smartfan.testbench.display import FrameRenderer, GridRenderer
+from smartfan.testbench.stats import SensorStatistics
+from smartfan.testbench.operator import UUID4_VALIDATOR
+from smartfan.testbench.retest import RetestCache, device_identity, plan_hash
+from smartfan.testbench.perf import CommandPerf, summarize
 
 logger = get_app_logger(__name__)
 
-class UUIDv4Validator(Validator):
-    # Precompiled regex for UUID v4 (case-insensitive)
-    uuid4_regex = re.compile(
-        r'^[0-9a-fA-F]{8}-'
-        r'[0-9a-fA-F]{4}-'
-        r'4[0-9a-fA-F]{3}-'
-        r'[89abAB][0-9a-fA-F]{3}-'
-        r'[0-9a-fA-F]{12}$'
-    )
+class TestTable:
+    """
+    A test sequence of TestBench: (method name, test name[, option]) entries, the test run only
+    when config['options'][option] is set. The methods are bound when the sequence is read, so
+    a TestBench object holds no bound methods; assigning the attribute of an object replaces
+    its sequence.
+    """
+
+    def __init__(self, *entries: tuple) -> None:
+        self.entries = entries
+
+    def __get__(self, tb, owner=None):
+        if tb is None:
+            return self
+        options = tb.config["options"]
+        return [(getattr(tb, entry[0]), entry[1]) for entry in self.entries
+                if len(entry) < 3 or options[entry[2]]]
 
-    def validate(self, document):
-        text = document.text.strip()
-        if not self.uuid4_regex.fullmatch(text):
-            raise ValidationError(
-                message='Invalid UUIDv4. Expected format: 8-4-4-4-12 hex characters (version 4 only).',
-                cursor_position=len(document.text)
-            )
 
 class TestBench:
     MOT_RUNNING = 1
@@ -48,29 +59,72 @@ class TestBench:
     DEV_WIFI_CONNECTED = 0x10
     DEV_MQTT_SUBSCRIBED = 0x20
 
+    SENSOR_CHANNELS = ("temperature", "pressure", "humidity", "gas", "light", "sensors", "motor", "state")
+
+    GRID_HEADER = f"{'DUT':<10} {'Temp °C':>8} {'Press hPa':>10} {'Hum %':>7} {'Gas Ohm':>9} {'Light':>6}  Sen Mot State"
+
+    # test sequences by mode, see TestTable
+    tests = TestTable(
+        ("t_who_am_i", "Who Am I"),
+        ("t_version", "Version"),
+        ("t_testmode", "Test Mode"),
+        ("t_params", "Parameters", "setparams"),
+        ("t_sensors", "Sensors"),
+        ("t_motor", "Motor"),
+        ("t_led", "Led"),
+        ("t_serialn", "Serial N")
+    )
+    snonly = TestTable(
+        ("t_serialn", "Serial N")
+    )
+    monitor = TestTable(
+        ("t_monitor", "Monitor")
+    )
+    resetwifi = TestTable()
+    perf = TestTable(
+        ("t_perf_rtt", "NOP RTT"),
+        ("t_perf_throughput", "NOP Throughput"),
+        ("t_perf_display", "SR Display"),
+        ("t_perf_motor", "NOP Jitter Motor")
+    )
+
     def __init__(self, config: dict):
         self.config = config
-        self.tests = [
-                (self.t_who_am_i, "Who Am I" ),
-                (self.t_version, "Version" ),
-                (self.t_testmode, "Test Mode" ),
-                (self.t_sensors, "Sensors" ),
-                (self.t_motor, "Motor" ),
-                (self.t_led, "Led"),
-                (self.t_serialn, "Serial N")
-            ]
-        self.snonly = [
-            (self.t_serialn, "Serial N")
-        ]
-        self.monitor = [
-            (self.t_monitor, "Monitor")
-        ]
-
-        self.resetwifi = [ ]
+        # measurements of the last run of a test by test name, added to its result record
+        self.measurements: dict = {}
+        self.stats = SensorStatistics(config)
+        self.exporter = None
+        self.operator = None
+        self.retest = None
+        if self.config['options']['incremental']:
+            self.retest = RetestCache(self.config['retest']['cache'], self.config['retest']['validity'])
+
+    # the terminal renderers are only needed by the monitor
+    @cached_property
+    def renderer(self) -> FrameRenderer:
+        return FrameRenderer()
+
+    @cached_property
+    def grid(self) -> GridRenderer:
+        return GridRenderer(self.GRID_HEADER)
 
     def set_ms_host(self, ms_host:MShost):
         self.ms_host = ms_host
 
+    def set_operator(self, operator):
+        # OperatorConsole shared by the units of a station, or None to prompt directly
+        self.operator = operator
+
+    def ask(self, text: str, default: str = "", validator: Optional[Validator] = None) -> Optional[str]:
+        """Ask the operator. Returns None if the operator input was closed."""
+        if self.operator is not None:
+            return self.operator.ask(self.config["mqttms"]["ms"]["server_uuid"], text, default, validator)
+        return prompt(text, default=default, validator=validator)
+
+    def set_exporter(self, exporter):
+        # SampleExporter receiving every decoded SR sample, or None
+        self.exporter = exporter
+
 
     def ble_binding(self) -> bool :
         # Connect to BLE server, send Wifi, receive MAC
@@ -82,7 +136,9 @@ class TestBench:
         # Prompt the user for a UUID input with validation
         uuid = self.config["mqttms"]["ms"]["server_uuid"]
         if self.config["options"]["interactive"]:
-            uuid = prompt('Enter a UUID: ', default=uuid, validator=UUIDv4Validator())
+            uuid = self.ask('Enter a UUID: ', uuid, UUID4_VALIDATOR)
+            if uuid is None:
+                return False
         logger.info("Using UUID: %s", uuid)
         self.config["mqttms"]["ms"]["server_uuid"] = uuid
 
@@ -100,38 +156,76 @@ class TestBench:
             return
 
 
-    def run_tests(self):
+    def run_tests(self) -> list[dict]:
+        """
+        Run the tests of the selected mode.
+
+        :return: one record per test: {'test': name, 'result': bool, 'duration': seconds},
+                 with 'cached': True for a test skipped by an incremental run and the
+                 measurements of the perf tests
+        """
         logger.info("TestBench.tests")
+        results: list[dict] = []
 
-        self.ms_subscribe()
+        with phase("subscribe"):
+            self.ms_subscribe()
 
-        match self.config["options"]["mode"]:
+        mode = self.config["options"]["mode"]
+        match mode:
             case "snonly":
                 testarray = self.snonly
             case "monitor":
                 testarray = self.monitor
             case "testbench":
                 testarray = self.tests
+                # over a cable, the broker is only used to check that the DUT reaches it
+                if self.config['transport']['type'] == 'serial' and self.config['serial']['connectivity']:
+                    testarray = testarray + [(self.t_connectivity, "MQTT Connectivity")]
             case "reset-wifi":
                 testarray = self.resetwifi
+            case "perf":
+                testarray = self.perf
+
+        if not self.config['options']['nopairing'] and not self.mqtt_ready():
+            return results
+
+        # incremental run: tests that passed on this device and firmware with this plan are skipped
+        retest = None
+        if self.retest is not None and mode == "testbench":
+            identity = device_identity(self.ms_host)
+            if identity is None:
+                logger.warning("Cannot identify the DUT, running all tests")
+            else:
+                retest = (*identity, plan_hash([test[1] for test in testarray], self.config))
 
-        if not self.config['options']['nopairing']:
-            # This is called after successful binding and this command must be first one
-            # to be sent to the server before API_MQTT_READY while the window for it open.
-            if not self.config['options']['noresetwifi']:
-                if not self.reset_wifi_credentials():
-                    return
-
-            payload = self.ms_host.ms_mqtt_ready()
-            resp = payload.get("response","")
-            if resp != "OK":
-                logger.error("API_MQTT_READY received answer: {resp}")
-                return
-
+        # a test that fails because the broker connection dropped is run again once it is back,
+        # the tests before it are kept
+        resumes = self.config['transport']['resume']
         for test in testarray:
             logger.info("")
+            if retest is not None and self.retest.passed(retest[0], retest[1], test[1], retest[2]):
+                logger.info("**** Test %s: PASS (cached)",test[1])
+                results.append({"test": test[1], "result": True, "duration": 0.0, "cached": True})
+                TESTS.inc(test[1], "cached")
+                continue
             logger.info("**** Test %s ****",test[1])
-            res = test[0]()
+            start = time.perf_counter()
+            while True:
+                lost = self.ms_host.lost
+                with phase(f"test:{test[1]}"):
+                    res = test[0]()
+                if res or self.ms_host.lost == lost or resumes <= 0:
+                    break
+                resumes -= 1
+                logger.warning("**** Test %s interrupted by lost connection, resuming", test[1])
+                if not self.ms_host.wait_connected():
+                    logger.error("Broker connection not restored")
+                    break
+            results.append({"test": test[1], "result": bool(res), "duration": time.perf_counter() - start,
+                            **self.measurements.pop(test[1], {})})
+            TESTS.inc(test[1], "pass" if res else "fail")
+            if retest is not None:
+                self.retest.record(retest[0], retest[1], test[1], retest[2], bool(res))
             if res:
                 logger.info("**** Test %s: PASS",test[1])
             else:
@@ -139,6 +233,28 @@ class TestBench:
             if self.config['options']['stop_if_failed'] and not res:
                 break
 
+        UNITS.inc("pass" if results and all(r["result"] for r in results) else "fail")
+        return results
+
+
+    def mqtt_ready(self) -> bool:
+        """
+        Close the pairing: WiFi credentials reset (unless noresetwifi) and API_MQTT_READY.
+        Called after successful binding; these must be the first commands the server gets,
+        while its window for them is open.
+        """
+        if not self.config['options']['noresetwifi']:
+            with phase("reset-wifi"):
+                if not self.reset_wifi_credentials():
+                    return False
+
+        with phase("mqtt-ready"):
+            payload = self.ms_host.ms_mqtt_ready()
+        resp = payload.get("response","")
+        if resp != "OK":
+            logger.error("API_MQTT_READY received answer: %s", resp)
+            return False
+        return True
 
     def reset_wifi_credentials(self) -> bool:
         payload = self.ms_host.ms_wificred("*","*")
@@ -149,14 +265,31 @@ class TestBench:
         return False
 
 
+    def wait_ready(self, timeout: float, poll: float = 1.0) -> bool:
+        """
+        Wait until the DUT reports in its SR state byte that it is connected to WiFi and
+        subscribed to its MQTT topics, instead of sleeping a fixed delay.
+
+        :return: True if the DUT became ready within timeout seconds
+        """
+        ready = self.DEV_WIFI_CONNECTED | self.DEV_MQTT_SUBSCRIBED
+        deadline = time.monotonic() + timeout
+        while True:
+            sensor_data = self.read_sensors()
+            if sensor_data and (sensor_data[-1] & ready) == ready:
+                return True
+            if time.monotonic() + poll > deadline:
+                return False
+            time.sleep(poll)
+
+
     # tests
 
     def t_who_am_i(self) -> bool:
         payload = self.ms_host.ms_who_am_i()
         if payload.get("response","") == "OK":
-            jdata = payload.get('data', None)
             format_string = '<B'
-            bdata = bytes.fromhex(jdata)
+            bdata = payload_data(payload)
             unpacked_data = struct.unpack(format_string, bdata)
             logger.info("Device ID: %02x",unpacked_data[0])
             return True
@@ -164,13 +297,8 @@ class TestBench:
 
 
     def t_version(self) -> bool:
-        payload = self.ms_host.ms_version()
-        if payload.get("response","") == "OK":
-            jdata = payload.get('data', None)
-            byte_array = bytes.fromhex(jdata)
-            version_bytes, serial_bytes = byte_array.split(b'\0',1)
-            versiondev = version_bytes.decode('ascii')
-            serial = serial_bytes.decode('ascii').rstrip('\x00')
+        versiondev, serial = self.ms_host.read_version()
+        if versiondev is not None:
             logger.info(f"Version: %s",versiondev)
             logger.info("Serial Number: %s",serial)
             return True
@@ -186,10 +314,19 @@ class TestBench:
         return False
 
 
+    def t_params(self) -> bool:
+        params = self.config["params"]
+        if self.ms_host.apply_params(params):
+            logger.info("Device parameters are set")
+            return True
+        logger.info("Device parameters were not set")
+        return False
+
+
     def t_sensors(self) -> bool:
         sensor_data = self.read_sensors()
         if sensor_data:
-            logger.info(f"MSH sensor_data = {sensor_data}")
+            logger.info("MSH sensor_data = %s", sensor_data)
             self.print_sensor_data(sensor_data)
             return True
         logger.info("MSH: No valid data received")
@@ -227,7 +364,10 @@ class TestBench:
         snstr = idn + serial_separator + serial_date + serial_separator + serialn
 
         if self.config["options"]["interactive"]:
-            snstr = prompt("Serial number: ", default=snstr)
+            snstr = self.ask("Serial number: ", snstr)
+            if snstr is None:
+                logger.info("Serial number was not entered")
+                return False
 
         logger.info(" S/N: %s",snstr)
 
@@ -240,67 +380,195 @@ class TestBench:
         return False
 
 
+    def t_connectivity(self) -> bool:
+        """The DUT answers NP over the broker too: it is connected to WiFi and subscribed."""
+        cfg = derive(self.config, {"transport.type": self.config['serial']['connectivity']})
+        link = open_transport(cfg)
+        if link is None:
+            return False
+        try:
+            if not link.ms_protocol.subscribe():
+                logger.error("Cannot subscribe to MQTT broker")
+                return False
+            payload = MShost(ms_protocol=link.ms_protocol, config=Config(cfg)).ms_nop()
+            return payload.get("response", "") == "OK"
+        finally:
+            link.graceful_exit()
+
+
+    # perf mode: command service of the DUT and the link, see testbench/perf.py
+
+    def perf_result(self, name: str, measurement: dict) -> bool:
+        """Store the measurement with the firmware version; False if it exceeds [perf] max_p99_ms."""
+        version, _ = self.ms_host.read_version()
+        self.measurements[name] = {"version": version, **measurement}
+        limit = self.config["perf"]["max_p99_ms"]
+        if not measurement.get("samples", 1):
+            return False
+        if limit and measurement.get("p99_ms", 0.0) > limit:
+            logger.error("%s: p99 %.2f ms above the limit of %.2f ms", name, measurement["p99_ms"], limit)
+            return False
+        return True
+
+    def t_perf_rtt(self) -> bool:
+        measurement = summarize(CommandPerf(self.ms_host).rtt(self.config["perf"]["samples"]))
+        logger.info("NOP RTT: %s", measurement)
+        return self.perf_result("NOP RTT", measurement)
+
+    def t_perf_throughput(self) -> bool:
+        perf = CommandPerf(self.ms_host)
+        levels = []
+        for in_flight in self.config["perf"]["in_flight"]:
+            level = perf.throughput(in_flight, self.config["perf"]["duration"])
+            if level is None:
+                logger.warning("%d commands in flight need the mqtt5 transport, skipped", in_flight)
+                continue
+            logger.info("NOP throughput, %d in flight: %.1f commands/s, %d lost", in_flight, level["rate"], level["lost"])
+            levels.append(level)
+        return self.perf_result("NOP Throughput", {"levels": levels, "samples": len(levels)})
+
+    def t_perf_display(self) -> bool:
+        measurement = summarize(CommandPerf(self.ms_host).display_latency(self.config["perf"]["samples"], self.format_sensor_data))
+        logger.info("SR decode to display: %s", measurement)
+        return self.perf_result("SR Display", measurement)
+
+    def t_perf_motor(self) -> bool:
+        measurement = summarize(CommandPerf(self.ms_host).motor_jitter(
+            self.config["perf"]["samples"], (self.MOT_PHASE_SLOW, self.MOT_PHASE_FAST),
+            self.config["perf"]["motor_period"], self.MOT_STOP))
+        logger.info("NOP RTT under motor load: %s", measurement)
+        return self.perf_result("NOP Jitter Motor", measurement)
+
     def t_monitor(self):
         logger.info("Press Ctrl+C to stop monitoring")
-        logger.setLevel(logging.WARNING)
-        logging.getLogger("smartfan.core.ms_host").setLevel(logging.WARNING)
-        logging.getLogger("mqttms").setLevel(logging.WARNING)
         print('\n')
+        grid = self.config["options"]["monitor_view"] == "grid"
+        dut = self.config["mqttms"]["ms"]["server_uuid"]
+        self.renderer.reset()
+        # the screen belongs to the monitor: payloads and mqttms messages below WARNING are dropped
         try:
-            count = 0
-            lines = 0
-            monitor_loops = self.config["options"]["monitor_loops"]
-            while True:
-                print(f"Monitoring loop: {count + 1}")
-                lines = 1
-                sensor_data = self.read_sensors()
-                if sensor_data:
-                    lines += self.print_sensor_data(sensor_data)
-                else:
-                    print("No valid data received")
-                    lines += 1
-
-                count += 1
-                if monitor_loops != 0 and count >= monitor_loops:
-                    break
-
-                time.sleep(self.config["options"]["monitor_delay"])
-                print(f"\033[{lines}A", end="", flush=True)
-        except KeyboardInterrupt as e   :
-            raise e
+            with self.ms_host.payload_log.muted(), quiet_logger("mqttms"):
+                # alarm thresholds as configured on the device, not as in [params]
+                self.stats.set_params(dut, self.ms_host.read_params())
+                self.monitor_loop(grid, dut)
         finally:
-            logger.setLevel(logging.INFO)
-            logging.getLogger("smartfan.core.ms_host").setLevel(logging.INFO)
-            logging.getLogger("mqttms").setLevel(logging.INFO)
             print('')
             logger.info("Monitoring stopped")
+            self.stats.log_summary()
 
         return True
 
 
+    def monitor_loop(self, grid: bool, dut: str) -> None:
+        count = 0
+        monitor_loops = self.config["options"]["monitor_loops"]
+        while True:
+            sensor_data = self.read_sensors()
+            if sensor_data and self.stats.add_sample(dut, sensor_data):
+                # the alarms were logged over the frame: draw it again in full below them
+                (self.grid.frame if grid else self.renderer).reset()
+            alarms = self.stats.dut(dut).active_alarms()
+            if grid:
+                self.grid.update(dut, self.format_sensor_row(dut, sensor_data) + (" !" if alarms else ""))
+                self.grid.render()
+            else:
+                lines = [f"Monitoring loop: {count + 1}"]
+                if sensor_data:
+                    lines += self.format_sensor_data(sensor_data)
+                else:
+                    lines.append("No valid data received")
+                lines.append(f"Alarms: {', '.join(alarms) if alarms else 'none'}")
+                self.renderer.render(lines)
+
+            count += 1
+            if monitor_loops != 0 and count >= monitor_loops:
+                break
+
+            time.sleep(self.config["options"]["monitor_delay"])
+
+
     def read_sensors(self):
         payload = self.ms_host.ms_sensors()
         if payload.get("response","") == "OK":
-            jdata = payload.get('data', None)
             format_string = '<hIIIHBBB'
-            bdata = bytes.fromhex(jdata)
+            bdata = payload_data(payload)
             unpacked_data = struct.unpack(format_string, bdata)
+            dut = self.config["mqttms"]["ms"]["server_uuid"]
+            for name, value in zip(self.SENSOR_CHANNELS, unpacked_data):
+                SENSOR.set(value, dut, name)
+            if self.exporter is not None:
+                self.exporter.add(dut, unpacked_data)
             return unpacked_data
         return None
 
 
     def print_sensor_data(self, sensor_data):
+        lines = self.format_sensor_data(sensor_data)
+        self.renderer.reset()
+        self.renderer.render(lines)
+
+        return len(lines)
+
+
+    def format_sensor_data(self, sensor_data) -> list[str]:
+        temperature, pressure, humidity, gas, light, sensors, motor, state = sensor_data
+
+        return [
+            f"Temperature: {temperature/100:.2f} °C",
+            f"Pressure: {pressure/100:.2f} hPa",
+            f"Humidity: {humidity/1000:.2f} %",
+            f"Gas: {gas} Ohm",
+            f"Ambient light: {light}",
+            SENSORS_TEXT[sensors & 0xff],
+            MOTOR_TEXT[motor & 0xff],
+            STATE_TEXT[state & 0xff]
+        ]
+
+
+    def format_sensor_row(self, dut: str, sensor_data) -> str:
+        if not sensor_data:
+            return f"{dut[:10]:<10} no valid data"
         temperature, pressure, humidity, gas, light, sensors, motor, state = sensor_data
+        return (f"{dut[:10]:<10} {temperature/100:>8.2f} {pressure/100:>10.2f} {humidity/1000:>7.2f} {gas:>9} {light:>6}  "
+                f"{SENSORS_FLAGS[sensors & 0xff]} {MOTOR_FLAGS[motor & 0xff]} {STATE_FLAGS[state & 0xff]}")
+
+
+# Flag-to-text decoding of the sensors / motor / state bytes, precomputed for every byte value
+
+def _active(flag: int) -> str:
+    return "Active" if flag else "Inactive"
+
+def _yes(flag: bool) -> str:
+    return "Yes" if flag else "No"
+
+def _sensors_text(sensors: int) -> str:
+    return (f"Sensors: {sensors:x}: Ambient light: {_active(sensors & TestBench.SEN_AMBIENT)}, "
+            f"Gas: {_active(sensors & TestBench.SEN_AIR)}, Humidity: {_active(sensors & TestBench.SEN_HUMIDITY)}")
+
+def _motor_text(motor: int) -> str:
+    return f"Motor: {motor:x}: Motor: {_active(motor & TestBench.MOT_RUNNING)}, Phase: {'Fast' if motor & TestBench.MOT_PHASE_FAST else 'Slow'}"
+
+def _state_text(state: int) -> str:
+    mode = state & TestBench.DEV_STATE_MASK
+    return (f"Device state: {state:x}: Ready: {_yes(mode == TestBench.DEV_STATE_READY)}, "
+            f"Normal: {_yes(mode == TestBench.DEV_STATE_NORMAL)}, Forced: {_yes(mode == TestBench.DEV_STATE_FORCED)}, "
+            f"Local: {_yes(state & TestBench.DEV_STATE_LOCAL)}, "
+            f"WiFi: {'Connected' if state & TestBench.DEV_WIFI_CONNECTED else 'Disconnected'}, "
+            f"MQTT: {'Subscribed' if state & TestBench.DEV_MQTT_SUBSCRIBED else 'Not subscribed'})")
+
+def _letters(value: int, flags: tuple) -> str:
+    return "".join(letter if value & bit else "-" for bit, letter in flags)
+
+def _state_flags(state: int) -> str:
+    mode = {TestBench.DEV_STATE_READY: "R", TestBench.DEV_STATE_NORMAL: "N", TestBench.DEV_STATE_FORCED: "F"}.get(state & TestBench.DEV_STATE_MASK, "?")
+    return mode + _letters(state, ((TestBench.DEV_STATE_LOCAL, "L"), (TestBench.DEV_WIFI_CONNECTED, "W"), (TestBench.DEV_MQTT_SUBSCRIBED, "M")))
 
-        print(f"\033[KTemperature: {temperature/100:.2f} °C")
-        print(f"\033[KPressure: {pressure/100:.2f} hPa")
-        print(f"\033[KHumidity: {humidity/1000:.2f} %")
-        print(f"\033[KGas: {gas} Ohm")
-        print(f"\033[KAmbient light: {light}")
-        print(f'\033[KSensors: {sensors:x}: Ambient light: {"Active" if sensors & self.SEN_AMBIENT else "Inactive"}, Gas: { "Active" if sensors & self.SEN_AIR else "Inactive" }, Humidity: { "Active" if sensors & self.SEN_HUMIDITY else "Inactive" }')
-        print(f'\033[KMotor: {motor:x}: Motor: {"Active" if motor & self.MOT_RUNNING else "Inactive"}, Phase: { "Fast" if motor & self.MOT_PHASE_FAST else "Slow" }')
-        print(f"\033[KDevice state: {state:x}: Ready: { 'Yes' if (state & self.DEV_STATE_MASK) == self.DEV_STATE_READY else 'No' }, Normal: { 'Yes' if (state & self.DEV_STATE_MASK) == self.DEV_STATE_NORMAL else 'No' }, Forced: { 'Yes' if (state & self.DEV_STATE_MASK) == self.DEV_STATE_FORCED else 'No' }, Local: { 'Yes' if state & self.DEV_STATE_LOCAL else 'No' }, WiFi: { 'Connected' if state & self.DEV_WIFI_CONNECTED else 'Disconnected' }, MQTT: { 'Subscribed' if state & self.DEV_MQTT_SUBSCRIBED else 'Not subscribed' })")
+SENSORS_TEXT = tuple(_sensors_text(v) for v in range(256))
+MOTOR_TEXT = tuple(_motor_text(v) for v in range(256))
+STATE_TEXT = tuple(_state_text(v) for v in range(256))
 
-        return 8
+SENSORS_FLAGS = tuple(_letters(v, ((TestBench.SEN_AMBIENT, "A"), (TestBench.SEN_AIR, "G"), (TestBench.SEN_HUMIDITY, "H"))) for v in range(256))
+MOTOR_FLAGS = tuple(_letters(v, ((TestBench.MOT_RUNNING, "R"), (TestBench.MOT_PHASE_FAST, "F"))) for v in range(256))
+STATE_FLAGS = tuple(_state_flags(v) for v in range(256))
 
 # testbench/tbench.py
@@ -1,3 +1,4 @@
 # utils/__init__.py
 
 from .utilities import hello_from_utils
+from .profiling import RunProfiler, PROFILER, phase, footprint
@@ -0,0 +1,178 @@
+# utils/profiling.py
+
+import cProfile
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from smartfan.logger import get_app_logger
+
+logger = get_app_logger(__name__)
+
+class RunProfiler:
+    """
+    Whole-run profiler behind the --profile option.
+
+    Modes:
+    - 'sample': a background thread samples the stack of the profiled thread every 'interval'
+      seconds and counts collapsed stacks (flamegraph.pl / speedscope format). The current
+      phase is the root frame of every stack, so time is attributed per phase and per test.
+    - 'cprofile': deterministic cProfile of the profiled thread, written as pstats data.
+
+    In both modes the wall time of each phase (config, connect, dutdelay, each test, teardown...)
+    is recorded. phase() costs next to nothing while the profiler is not running.
+    """
+
+    def __init__(self) -> None:
+        self.active = False
+        self.mode = "sample"
+        self.interval = 0.005
+        self.current = "main"
+        self.phases: Dict[str, float] = {}
+        self.order: List[str] = []
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.thread_id = 0
+        self.sampler: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.cprofile: Optional[cProfile.Profile] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self, mode: str = "sample", interval: float = 0.005) -> None:
+        self.mode = mode
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.active = True
+        if mode == "cprofile":
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        else:
+            self.stop_event.clear()
+            self.sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self.sampler.start()
+
+    def stop(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        self.elapsed = time.perf_counter() - self.started
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.sampler is not None:
+            self.stop_event.set()
+            self.sampler.join()
+            self.sampler = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.active:
+            yield
+            return
+        previous = self.current
+        self.current = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if name not in self.phases:
+                self.order.append(name)
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+            self.current = previous
+
+    def _sample(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            names.append(f"phase:{self.current}")
+            key = ";".join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def report(self, commands: Optional[Dict[str, tuple]] = None) -> List[str]:
+        """
+        Per-phase wall time breakdown and, if given, time per MS command.
+
+        :param commands: command code -> (count, total seconds)
+        """
+        total = self.elapsed or (time.perf_counter() - self.started)
+        lines = [f"Wall time: {total:.3f} s"]
+        for name in self.order:
+            t = self.phases[name]
+            lines.append(f"  {name:<30} {t:10.3f} s {100.0 * t / total:6.1f} %")
+        if commands:
+            lines.append("MS commands:")
+            for cmd, (count, seconds) in sorted(commands.items(), key=lambda item: -item[1][1]):
+                lines.append(f"  {cmd:<4} {count:6d} x {1000.0 * seconds / max(count, 1):9.2f} ms = {seconds:10.3f} s")
+        return lines
+
+    def write(self, path: str, commands: Optional[Dict[str, tuple]] = None) -> None:
+        """Write <path>.collapsed (sample) or <path>.prof (cprofile), and <path>.phases.txt."""
+        try:
+            if self.cprofile is not None:
+                self.cprofile.dump_stats(f"{path}.prof")
+            else:
+                with open(f"{path}.collapsed", "w", encoding="utf-8") as f:
+                    for stack, count in sorted(self.stacks.items()):
+                        f.write(f"{stack} {count}\n")
+            lines = self.report(commands)
+            with open(f"{path}.phases.txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.error(f"Cannot write profile {path}: {e}")
+            return
+        for line in lines:
+            logger.info(line)
+
+
+PROFILER = RunProfiler()
+
+def phase(name: str):
+    """Context manager attributing the enclosed time to a phase of the run profile."""
+    return PROFILER.phase(name)
+
+def rss_bytes() -> int:
+    """Resident set size of the process, 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def footprint(make: Callable[[int], object], count: int) -> Dict[str, float]:
+    """
+    Memory cost of 'count' objects made by make(n), e.g. DUT sessions: bytes allocated per
+    object (tracemalloc, kept objects only) and resident set growth per object.
+    """
+    make(0)
+    gc.collect()
+    rss = rss_bytes()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [make(n) for n in range(count)]
+        allocated, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    grown = rss_bytes() - rss
+    del kept
+    return {
+        "count": count,
+        "bytes_per_object": (allocated - before) / count,
+        "peak_bytes": peak,
+        "rss_per_object": max(grown, 0) / count
+    }
+
+# utils/profiling.py
@@ -0,0 +1,85 @@
+# test_capture.py
+
+import copy
+import json
+import threading
+
+from smartfan.core import Config, MShost
+from smartfan.core.capture import TrafficCapture, load_capture
+from smartfan.core.framing import decode_binary_response
+from smartfan.core.state_cache import DeviceStateCache
+from smartfan.testbench.replay import ReplayLoad, capture_commands
+from smartfan.testbench.standin import StandInDevices, device_data
+
+class EchoProtocol:
+    """Answers every command at once with its data echoed back."""
+
+    def __init__(self):
+        self.response_received = threading.Event()
+        self.response = None
+
+    def put_command(self, payload):
+        msg = json.loads(payload)
+        self.response = {"command": msg["command"], "response": "OK", "data": msg["data"]}
+        self.response_received.set()
+
+class TestCapture:
+
+    def test_commands_and_responses_logged(self, tmp_path):
+        path = str(tmp_path / "traffic.jsonl")
+        config = Config(copy.deepcopy(Config.DEFAULT_CONFIG))
+        config.config['transport']['framing'] = 'json'
+        capture = TrafficCapture(path)
+        host = MShost(EchoProtocol(), config, cache=DeviceStateCache({}), capture=capture)
+        host.ms_motor(1)
+        host.ms_sensors()
+        capture.close()
+        records = load_capture(path)
+        assert [(r["dir"], r["cmd"]) for r in records] == [("tx", "MT"), ("rx", "MT"), ("tx", "SR"), ("rx", "SR")]
+        dut = config.config['mqttms']['ms']['server_uuid']
+        assert records[0]["topic"] == f"@/{dut}/CMD/json"
+        assert records[0]["size"] == len('{"command":"MT","data":"01"}')
+        assert records[1]["rtt"] >= 0.0 and records[1]["response"] == "OK"
+        assert records[0]["session"] == records[3]["session"] == capture.session
+
+    def test_replay_commands_keep_timing_and_size(self):
+        records = [
+            {"t": 10.0, "dir": "tx", "dut": "a", "cmd": "MT", "framing": "json", "size": 28},
+            {"t": 10.1, "dir": "rx", "dut": "a", "cmd": "MT", "framing": "json", "size": 40},
+            {"t": 12.5, "dir": "tx", "dut": "b", "cmd": "SN", "framing": "bin", "size": 23}
+        ]
+        assert capture_commands(records) == [(0.0, "a", "MT", "json", 1), (2.5, "b", "SN", "bin", 20)]
+
+    def test_appended_sessions_timed_from_their_own_start(self):
+        records = [
+            {"t": 10.0, "session": "s1", "dir": "tx", "dut": "a", "cmd": "MT", "framing": "json", "size": 28},
+            {"t": 11.0, "session": "s1", "dir": "tx", "dut": "a", "cmd": "SR", "framing": "json", "size": 26},
+            {"t": 5000.0, "session": "s2", "dir": "tx", "dut": "b", "cmd": "SR", "framing": "json", "size": 26},
+            {"t": 5000.5, "session": "s2", "dir": "tx", "dut": "b", "cmd": "MT", "framing": "json", "size": 28}
+        ]
+        assert capture_commands(records) == [(0.0, "a", "MT", "json", 1), (0.0, "b", "SR", "json", 0),
+                                             (0.5, "b", "MT", "json", 1), (1.0, "a", "SR", "json", 0)]
+        assert capture_commands(records, "s2") == [(0.0, "b", "SR", "json", 0), (0.5, "b", "MT", "json", 1)]
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        load = ReplayLoad(config, records)
+        assert load.sessions == ["s1", "s2"]
+        assert load.span == 1.0
+
+    def test_replay_levels_by_offered_load(self):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['replay']['speeds'] = [10.0, 1.0]
+        config['replay']['copies'] = [4, 1]
+        load = ReplayLoad(config, [])
+        assert load.levels() == [(1.0, 1), (1.0, 4), (10.0, 1), (10.0, 4)]
+
+class TestStandIn:
+
+    def test_answers_in_the_framing_of_the_command(self):
+        devices = StandInDevices(copy.deepcopy(Config.DEFAULT_CONFIG), ["dev1"])
+        cmd, message = devices.response("dev1", "json", b'{"command":"GM","data":""}')
+        assert cmd == "GM"
+        assert json.loads(message)["data"] == device_data("dev1", "GM").hex()
+        cmd, message = devices.response("dev1", "bin", bytes([0x11, 0, 0]))
+        response = decode_binary_response(message)
+        assert cmd == "VS" and response["raw"].startswith(b"2.4.0+bin\x00")
+        assert devices.response("dev1", "json", b"garbage") is None
@@ -0,0 +1,41 @@
+# test_framing.py
+
+import struct
+import pytest
+
+from smartfan.core import framing
+
+class TestFraming:
+
+    def test_json_command(self):
+        assert framing.encode_command("MT", b"\x04") == '{"command":"MT","data":"04"}'
+
+    def test_binary_command(self):
+        assert framing.encode_command("MT", b"\x04", framing.FRAMING_BINARY) == bytes([0x14, 0x01, 0x00, 0x04])
+
+    def test_binary_response_roundtrip(self):
+        data = struct.pack('<hIIIHBBB', 2250, 101325, 45000, 20000, 10, 7, 0, 0x31)
+        frame = framing.encode_binary_response("SR", data)
+        payload = framing.decode_response(frame, framing.FRAMING_BINARY)
+        assert payload["command"] == "SR"
+        assert payload["response"] == "OK"
+        assert framing.payload_data(payload) == data
+
+    def test_truncated_binary_response(self):
+        frame = framing.encode_binary_response("VS", b"1.0\0SN")
+        with pytest.raises(ValueError):
+            framing.decode_binary_response(frame[:-1])
+
+    def test_payload_data_of_json_response(self):
+        assert framing.payload_data({"response": "OK", "data": "0102"}) == b"\x01\x02"
+        assert framing.payload_data({"response": "OK"}) == b""
+
+    @pytest.mark.parametrize("version, expected", [
+        ("2.4.0+bin", True),
+        ("2.4.0+ota,bin", True),
+        ("2.4.0", False),
+        ("2.4.0+binary", False),
+        (None, False),
+    ])
+    def test_capability_probe(self, version, expected):
+        assert framing.supports_binary(version) == expected
@@ -0,0 +1,116 @@
+# test_inventory.py
+
+import copy
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from smartfan.core import inventory as inventory_module
+from smartfan.core.inventory import Inventory, InventoryListener
+from smartfan.core.framing import encode_binary, encode_binary_response
+from smartfan.core.config import Config
+
+def ok(data: bytes) -> dict:
+    return {"response": "OK", "data": data.hex()}
+
+class TestInventory:
+
+    @pytest.fixture
+    def inventory(self):
+        inventory = Inventory()
+        inventory.update("u1", "GM", ok(bytes.fromhex("a4cf12000001")))
+        inventory.update("u1", "VS", ok(b"2.4.0+bin\x00109380-2501-0000001"))
+        inventory.update("u2", "VS", ok(b"2.4.0\x00109380-2501-0000002"))
+        inventory.update("u2", "WH", ok(b"\x05"))
+        return inventory
+
+    def test_lookups(self, inventory):
+        assert inventory.find_mac("A4-CF-12-00-00-01").uuid == "u1"
+        assert inventory.find_serial("109380-2501-0000002").uuid == "u2"
+        assert inventory.get("u2").device_id == 5
+        assert [r.uuid for r in inventory.with_version("2.4.0")] == ["u2"]
+
+    def test_new_version_moves_device(self, inventory):
+        inventory.update("u2", "VS", ok(b"2.5.0\x00109380-2501-0000002"))
+        assert inventory.with_version("2.4.0") == []
+        assert inventory.select("version=2.5.0") == ["u2"]
+
+    def test_select(self, inventory):
+        assert inventory.select("") == ["u1", "u2"]
+        assert inventory.select("version=2.4.0+bin, mac=a4:cf:12:00:00:01") == ["u1"]
+        assert inventory.select("version=2.4.0+bin,serial=109380-2501-0000002") == []
+        with pytest.raises(ValueError):
+            inventory.select("color=red")
+
+    def test_snapshot_round_trip(self, inventory, tmp_path):
+        path = str(tmp_path / "inventory.json")
+        inventory.save(path)
+        loaded = Inventory()
+        assert loaded.load(path)
+        assert loaded.find_serial("109380-2501-0000001").mac == "a4:cf:12:00:00:01"
+        assert loaded.select("version=2.4.0") == ["u2"]
+        assert not Inventory().load(str(tmp_path / "missing.json"))
+
+
+def message(topic, payload, correlation=None, reply_topic=None):
+    properties = SimpleNamespace(CorrelationData=correlation, ResponseTopic=reply_topic) if correlation else None
+    return SimpleNamespace(topic=topic, payload=payload, properties=properties)
+
+class TestInventoryListener:
+
+    @pytest.fixture
+    def listener(self):
+        # default templates: '@/server_uuid/CMD/format', '@/client_uuid/RSP/format'
+        return InventoryListener(copy.deepcopy(Config.DEFAULT_CONFIG), Inventory())
+
+    def test_topics(self, listener):
+        assert listener.topics() == ["@/+/CMD/json", "@/+/RSP/json/#", "@/+/CMD/bin", "@/+/RSP/bin/#"]
+        assert listener.parse_topic(listener.cmd_template, "@/u1/CMD/bin") == ("u1", "bin")
+        assert listener.parse_topic(listener.cmd_template, "@/u1/RSP/bin") is None
+        assert listener.parse_topic(listener.rsp_template, "@/c1/RSP/json") == (None, "json")
+        assert listener.parse_topic(listener.rsp_template, "@/c1/RSP/json/client") is None
+        assert listener.parse_topic(listener.rsp_template, "@/c1/RSP/json/client", prefix=True) == (None, "json")
+
+    def test_response_without_command_field_is_joined(self, listener):
+        listener.on_message(None, None, message("@/u1/CMD/json", '{"command":"VS","data":""}'))
+        listener.on_message(None, None, message("@/c1/RSP/json", json.dumps(ok(b"2.4.0\x00109380-2501-0000001"))))
+        assert listener.inventory.find_serial("109380-2501-0000001").uuid == "u1"
+        assert not listener.pending
+
+    def test_reply_topic_matched_by_correlation(self, listener):
+        reply = "@/c1/RSP/json/station-1"
+        listener.on_message(None, None, message("@/u1/CMD/json", '{"command":"VS","data":""}', b"1", reply))
+        listener.on_message(None, None, message("@/u2/CMD/bin", encode_binary("GM"), b"2", "@/c1/RSP/bin/station-1"))
+        listener.on_message(None, None, message("@/c1/RSP/bin/station-1", encode_binary_response("GM", bytes.fromhex("a4cf12000002")), b"2"))
+        listener.on_message(None, None, message(reply, json.dumps(ok(b"2.5.0\x00109380-2501-0000001")), b"1"))
+        assert listener.inventory.select("version=2.5.0") == ["u1"]
+        assert listener.inventory.find_mac("a4:cf:12:00:00:02").uuid == "u2"
+
+    def test_responses_without_correlation_in_command_order(self, listener):
+        listener.on_message(None, None, message("@/u1/CMD/json", '{"command":"WH","data":""}'))
+        listener.on_message(None, None, message("@/u2/CMD/json", '{"command":"WH","data":""}'))
+        listener.on_message(None, None, message("@/c1/RSP/json", json.dumps(ok(b"\x01"))))
+        listener.on_message(None, None, message("@/c1/RSP/json", json.dumps(ok(b"\x02"))))
+        assert listener.inventory.get("u1").device_id == 1
+        assert listener.inventory.get("u2").device_id == 2
+
+    def test_server_uuid_in_response_topic(self):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['mqttms']['ms']['rsp_topic'] = "@/server_uuid/RSP/format"
+        listener = InventoryListener(config, Inventory())
+        listener.on_message(None, None, message("@/u1/CMD/json", '{"command":"WH","data":""}'))
+        listener.on_message(None, None, message("@/u2/CMD/json", '{"command":"WH","data":""}'))
+        listener.on_message(None, None, message("@/u2/RSP/json", json.dumps(ok(b"\x02"))))
+        assert listener.inventory.get("u2").device_id == 2
+        assert listener.inventory.get("u1") is None
+
+    def test_unanswered_commands_are_forgotten(self, listener, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(inventory_module.time, "monotonic", lambda: now[0])
+        listener.on_message(None, None, message("@/u1/CMD/json", '{"command":"WH","data":""}'))
+        now[0] += listener.timeout
+        listener.on_message(None, None, message("@/u2/CMD/json", '{"command":"WH","data":""}'))
+        listener.on_message(None, None, message("@/c1/RSP/json", json.dumps(ok(b"\x02"))))
+        assert listener.inventory.get("u1") is None
+        assert listener.inventory.get("u2").device_id == 2
@@ -0,0 +1,93 @@
+# test_mqtt5_transport.py
+
+import copy
+import json
+import threading
+from types import SimpleNamespace
+
+from smartfan.core import Config
+from smartfan.core.framing import encode_command
+from smartfan.core.mqtt5_transport import MQTT5Transport
+
+class FakeClient:
+    """paho client stand-in recording the published commands."""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, properties=None):
+        self.published.append((topic, payload, properties))
+
+    def disconnect(self, properties=None):
+        pass
+
+    def loop_stop(self):
+        pass
+
+
+class TestMQTT5Transport:
+
+    def transport(self, timeout=5.0):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['transport'].update({"type": "mqtt5", "framing": "json"})
+        config['mqttms']['ms']['timeout'] = timeout
+        link = MQTT5Transport(config)
+        link.client = FakeClient()
+        link.topics = link.response_topics()
+        return link
+
+    @staticmethod
+    def response(topic, command, correlation=None):
+        properties = SimpleNamespace(CorrelationData=correlation) if correlation is not None else None
+        payload = json.dumps({"command": command, "response": "OK", "data": ""}).encode()
+        return SimpleNamespace(topic=topic, payload=payload, properties=properties)
+
+    def test_responses_matched_by_correlation_data(self):
+        link = self.transport()
+        first = link.request(encode_command("NP"))
+        second = link.request(encode_command("GM"))
+        (_, _, props), _ = link.client.published
+        assert props.ResponseTopic == link.reply_topic() and props.CorrelationData == first.correlation
+        link.on_message(None, None, self.response(link.reply_topic(), "GM", second.correlation))
+        assert second.wait(0)["command"] == "GM"
+        assert first.wait(0) is None
+        link.on_message(None, None, self.response(link.reply_topic(), "NP", first.correlation))
+        assert first.wait(0)["command"] == "NP"
+        assert not link.pending
+        link.graceful_exit()
+
+    def test_responses_without_correlation_matched_oldest_first(self):
+        link = self.transport()
+        first = link.request(encode_command("NP"))
+        second = link.request(encode_command("GM"), slot=True)
+        link.on_message(None, None, self.response(link.rsp_topic(), "NP"))
+        assert first.wait(0)["command"] == "NP" and second.wait(0) is None
+        link.on_message(None, None, self.response(link.rsp_topic(), "GM"))
+        assert second.wait(0)["command"] == "GM"
+        assert link.response_received.is_set() and link.response["command"] == "GM"
+        # nothing in flight: a late response and one of a foreign topic are dropped
+        link.on_message(None, None, self.response(link.rsp_topic(), "SR"))
+        link.on_message(None, None, self.response("@/other/RSP/json", "SR"))
+        assert not link.pending
+        link.graceful_exit()
+
+    def test_commands_expire_in_one_thread(self):
+        link = self.transport(timeout=0.05)
+        answered = link.request(encode_command("NP"))
+        link.on_message(None, None, self.response(link.reply_topic(), "NP", answered.correlation))
+        pending = [link.request(encode_command("SR")) for _ in range(100)]
+        assert [t.name for t in threading.enumerate()].count("mqtt5-timeouts") == 1
+        assert all(p.wait(2.0) == {"response": "TIMEOUT"} for p in pending)
+        assert answered.wait(0)["response"] == "OK"
+        assert not link.pending
+        link.graceful_exit()
+        link.timeouts.thread.join(2.0)
+        assert not link.timeouts.thread.is_alive()
+
+    def test_graceful_exit_fails_pending_commands(self):
+        link = self.transport()
+        pending = link.request(encode_command("NP"), slot=True)
+        link.graceful_exit()
+        assert pending.wait(0) == {"response": "DISCONNECTED"}
+        assert link.response == {"response": "DISCONNECTED"}
+        assert not link.pending
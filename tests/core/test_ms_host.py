@@ -0,0 +1,222 @@
+# test_ms_host.py
+
+import json
+import struct
+import threading
+import pytest
+
+from smartfan.core import MShost
+from smartfan.core.mqtt5_transport import PendingResponse
+from smartfan.core.state_cache import DeviceStateCache
+
+class FakeProtocol:
+    """Answers MS commands synchronously like a device with parameter storage."""
+
+    SETTERS = {"AH": 0, "HH": 1, "GH": 2, "FT": 3, "PT": 4, "AL": 5}
+
+    def __init__(self):
+        self.response_received = threading.Event()
+        self.response = None
+        self.params = [100, 70, 10000, 600, 120, 1]
+        self.sent = []
+
+    def put_command(self, payload):
+        msg = json.loads(payload)
+        cmd = msg["command"]
+        self.sent.append(cmd)
+        data = ""
+        if cmd in self.SETTERS:
+            self.params[self.SETTERS[cmd]] = struct.unpack('<H', bytes.fromhex(msg["data"]))[0]
+        elif cmd == "PG":
+            data = struct.pack('<HHHHHH', *self.params).hex()
+        self.response = {"response": "OK", "data": data}
+        self.response_received.set()
+
+class LazyResponse(PendingResponse):
+    """Response of a PipelinedProtocol, answered when the first response is waited for."""
+    __slots__ = ("protocol",)
+
+    def __init__(self, protocol):
+        super().__init__(b"")
+        self.protocol = protocol
+
+    def wait(self, timeout=None):
+        if not self.event.is_set():
+            self.protocol.flush()
+        return super().wait(timeout)
+
+class PipelinedProtocol(FakeProtocol):
+    """FakeProtocol with request(): the commands queue up and are answered in batches."""
+
+    def __init__(self):
+        super().__init__()
+        self.queued = []
+        self.batches = []
+
+    def request(self, payload, slot=False, framing="json"):
+        pending = LazyResponse(self)
+        self.queued.append((payload, pending))
+        return pending
+
+    def flush(self):
+        queued, self.queued = self.queued, []
+        self.batches.append([json.loads(payload)["command"] for payload, _ in queued])
+        for payload, pending in queued:
+            self.put_command(payload)
+            pending.payload = self.response
+            pending.event.set()
+        self.response_received.clear()
+
+class TestApplyParams:
+
+    @pytest.fixture
+    def protocol(self):
+        return FakeProtocol()
+
+    @pytest.fixture
+    def host(self, protocol):
+        return MShost(ms_protocol=protocol, config=None, cache=DeviceStateCache({"PG": 60.0, "VS": 60.0}))
+
+    def test_sends_only_changed_values(self, host, protocol):
+        assert host.apply_params({"amb_thr": 100, "hum_thr": 65, "gas_thr": 10000})
+        assert protocol.sent == ["PG", "HH", "PG"]
+        assert protocol.params[1] == 65
+
+    def test_up_to_date_uses_cached_readout(self, host, protocol):
+        host.read_params()
+        protocol.sent.clear()
+        assert host.apply_params({"amb_thr": 100})
+        assert protocol.sent == []
+
+    def test_setter_invalidates_cached_readout(self, host, protocol):
+        host.read_params()
+        host.ms_set_amb_thr(5)
+        protocol.sent.clear()
+        assert host.read_params()["amb_thr"] == 5
+        assert protocol.sent == ["PG"]
+
+    def test_setters_pipelined_with_request(self):
+        protocol = PipelinedProtocol()
+        host = MShost(ms_protocol=protocol, config=None, cache=DeviceStateCache({"PG": 60.0}))
+        assert host.apply_params({"amb_thr": 5, "hum_thr": 65, "gas_thr": 9000, "post_time": 120})
+        # all setters are sent before the first response is waited for, then one PG checks them
+        assert protocol.batches == [["AH", "HH", "GH"]]
+        assert protocol.sent == ["PG", "AH", "HH", "GH", "PG"]
+        assert protocol.params[:3] == [5, 65, 9000]
+
+    def test_unknown_parameter(self, host):
+        with pytest.raises(ValueError):
+            host.apply_params({"speed": 1})
+
+class TestStateCache:
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = DeviceStateCache({"VS": 10.0, "WH": 0}, clock=lambda: now[0])
+        assert not cache.cacheable("WH")
+        cache.put("dut", "VS", {"response": "OK", "data": "00"})
+        assert cache.get("dut", "VS") == {"response": "OK", "data": "00"}
+        now[0] = 10.0
+        assert cache.get("dut", "VS") is None
+
+    def test_failed_response_is_not_cached(self):
+        cache = DeviceStateCache({"VS": 10.0})
+        cache.put("dut", "VS", {"response": "ERROR"})
+        assert cache.get("dut", "VS") is None
+
+    def test_invalidation_rules(self):
+        cache = DeviceStateCache({"VS": 10.0, "GM": 10.0, "PG": 10.0})
+        for cmd in ("VS", "GM", "PG"):
+            cache.put("dut", cmd, {"response": "OK"})
+            cache.put("other", cmd, {"response": "OK"})
+        cache.command_sent("dut", "SN")
+        assert cache.get("dut", "VS") is None
+        assert cache.get("dut", "GM") is not None
+        cache.command_sent("dut", "RS")
+        assert cache.get("dut", "GM") is None and cache.get("dut", "PG") is None
+        assert cache.get("other", "PG") is not None
+
+    def test_repeated_read_is_served_from_cache(self):
+        protocol = FakeProtocol()
+        host = MShost(ms_protocol=protocol, config=None, cache=DeviceStateCache({"VS": 60.0}))
+        host.ms_version()
+        host.ms_version()
+        assert protocol.sent == ["VS"]
+        host.ms_serial("109380-2501-0000001")
+        host.ms_version()
+        assert protocol.sent == ["VS", "SN", "VS"]
+
+class LossyProtocol(FakeProtocol):
+    """Loses the responses to the first 'drops' commands, as over a dropped broker connection."""
+
+    def __init__(self, drops):
+        super().__init__()
+        self.drops = drops
+
+    def put_command(self, payload):
+        if self.drops:
+            self.drops -= 1
+            self.sent.append(json.loads(payload)["command"])
+            self.response = {"response": "DISCONNECTED"}
+            self.response_received.set()
+            return
+        super().put_command(payload)
+
+class SilentProtocol(FakeProtocol):
+    """A device that does not answer on a working link; 'drop_link' loses the connection on every command."""
+
+    def __init__(self, drop_link=False):
+        super().__init__()
+        self.online = threading.Event()
+        self.online.set()
+        self.disconnects = 0
+        self.drop_link = drop_link
+
+    def put_command(self, payload):
+        self.sent.append(json.loads(payload)["command"])
+        if self.drop_link:
+            # the link went down and came back while the command was in flight
+            self.disconnects += 1
+        self.response = {"response": "TIMEOUT"}
+        self.response_received.set()
+
+class TestReplay:
+
+    def host(self, protocol):
+        host = MShost(ms_protocol=protocol, config=None)
+        host.replay = 2
+        return host
+
+    def test_idempotent_command_is_replayed(self):
+        protocol = LossyProtocol(drops=2)
+        host = self.host(protocol)
+        assert host.ms_get_params()["response"] == "OK"
+        assert protocol.sent == ["PG", "PG", "PG"]
+        assert host.lost == 0
+
+    def test_replays_are_bounded(self):
+        protocol = LossyProtocol(drops=5)
+        host = self.host(protocol)
+        assert host.ms_who_am_i()["response"] == "DISCONNECTED"
+        assert protocol.sent == ["WH", "WH", "WH"]
+        assert host.lost == 1
+
+    def test_timeout_on_working_link_is_not_replayed(self):
+        protocol = SilentProtocol()
+        host = self.host(protocol)
+        assert host.ms_who_am_i()["response"] == "TIMEOUT"
+        assert protocol.sent == ["WH"]
+        assert host.lost == 0
+
+    def test_timeout_across_reconnect_is_replayed(self):
+        protocol = SilentProtocol(drop_link=True)
+        host = self.host(protocol)
+        assert host.ms_who_am_i()["response"] == "TIMEOUT"
+        assert protocol.sent == ["WH", "WH", "WH"]
+        assert host.lost == 1
+
+    def test_restart_is_not_replayed(self):
+        protocol = LossyProtocol(drops=1)
+        host = self.host(protocol)
+        assert host.ms_restart()["response"] == "DISCONNECTED"
+        assert protocol.sent == ["RS"]
@@ -0,0 +1,45 @@
+# test_payload_log.py
+
+import copy
+import logging
+
+from smartfan.core.config import Config
+from smartfan.core.payload_log import PayloadLog, PayloadText
+
+class Payload(dict):
+    """Payload that counts how often it is formatted."""
+    formatted = 0
+
+    def __str__(self):
+        Payload.formatted += 1
+        return super().__str__()
+
+class TestPayloadLog:
+
+    def policy(self, caplog, **logging_config):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['logging'].update(logging_config)
+        caplog.set_level(logging.INFO, logger="test.payload")
+        return PayloadLog(logging.getLogger("test.payload"), config)
+
+    def test_truncated_at_long_payload(self):
+        assert str(PayloadText({"data": "ab" * 20}, 10)) == "{'data': 'ababababab... (40 chars)'}"
+        assert str(PayloadText({"raw": b"\x01\x02"}, 10)) == "{'raw': b'\\x01\\x02'}"
+        assert str(PayloadText({"data": "ab" * 20}, 0)) == str({"data": "ab" * 20})
+
+    def test_sampling_keeps_errors(self, caplog):
+        policy = self.policy(caplog, payload_sample={"SR": 3})
+        for _ in range(6):
+            policy.response("SR", {"response": "OK"})
+        policy.response("SR", {"response": "TIMEOUT"})
+        assert len(caplog.records) == 3
+
+    def test_disabled_level_is_not_formatted(self, caplog):
+        policy = self.policy(caplog, payload_levels={"SR": "debug", "VS": "off"})
+        Payload.formatted = 0
+        policy.response("SR", Payload(response="OK"))
+        policy.response("VS", Payload(response="OK"))
+        with policy.muted():
+            policy.response("WH", Payload(response="OK"))
+        assert Payload.formatted == 0
+        assert caplog.records == []
@@ -0,0 +1,40 @@
+# test_presence.py
+
+import copy
+import threading
+
+from smartfan.core import Config
+from smartfan.core.presence import PresenceTracker, parse_status, status_message
+
+class Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class TestPresence:
+
+    def tracker(self):
+        return PresenceTracker(copy.deepcopy(Config().config))
+
+    def test_parse_status(self):
+        assert parse_status(status_message(True, 0x31)) == (True, 0x31)
+        assert parse_status(b"offline") == (False, None)
+        assert parse_status(b"") == (False, None)
+        assert parse_status(b"{bad") is None
+
+    def test_table_follows_status_topics(self):
+        tracker = self.tracker()
+        tracker.on_message(None, None, Message("@/dev1/STATUS", status_message(True, 0x31)))
+        tracker.on_message(None, None, Message("@/dev2/STATUS", b"online"))
+        # online but not yet subscribed to its MQTT topics
+        tracker.on_message(None, None, Message("@/dev3/STATUS", status_message(True, 0x10)))
+        tracker.on_message(None, None, Message("@/dev4/CMD/json", b"online"))
+        assert tracker.ready() == ["dev1", "dev2"]
+        tracker.on_message(None, None, Message("@/dev1/STATUS", status_message(False)))
+        assert tracker.ready(["dev3", "dev2", "dev1"]) == ["dev2"]
+
+    def test_wait_ready_wakes_on_status(self):
+        tracker = self.tracker()
+        threading.Timer(0.05, tracker.update, ("dev1", True, 0x31)).start()
+        assert tracker.wait_ready("dev1", 2.0)
+        assert not tracker.wait_ready("dev2", 0.05)
@@ -0,0 +1,91 @@
+# test_reload.py
+
+import copy
+import threading
+
+from smartfan.core import Config, MShost
+from smartfan.core.reload import ConfigReloader, FileWatcher, diff, is_safe
+from smartfan.core.state_cache import DeviceStateCache
+
+BASE = """
+[logging]
+verbose = false
+
+[mqttms.mqtt]
+host = "localhost"
+port = 1883
+
+[mqttms.ms]
+client_uuid = "client"
+server_uuid = "server"
+cmd_topic = "@/server_uuid/CMD/format"
+rsp_topic = "@/server_uuid/RSP/format"
+timeout = 5.0
+"""
+
+class TestReload:
+
+    def reloader(self, tmp_path, text=BASE):
+        path = tmp_path / "config.toml"
+        path.write_text(text)
+        cfg = Config(copy.deepcopy(Config().config))
+        cfg.load_config_file(str(path))
+        return cfg, path, ConfigReloader(cfg, str(path))
+
+    def test_diff_and_classification(self):
+        old = {"a": {"b": 1, "c": {}}, "d": 2}
+        new = {"a": {"b": 1, "c": {"SR": "off"}}, "d": 3}
+        assert diff(old, new) == {"a.c.SR": (None, "off"), "d": (2, 3)}
+        assert is_safe("mqttms.ms.timeout")
+        assert is_safe("logging.payload_levels.SR")
+        assert is_safe("tests.motoron")
+        assert not is_safe("mqttms.mqtt.host")
+        assert not is_safe("mqttms.ms.timeout_x")
+
+    def test_safe_changes_applied_others_staged(self, tmp_path):
+        cfg, path, reloader = self.reloader(tmp_path)
+        host = MShost(None, cfg, cache=DeviceStateCache({}))
+        reloader.subscribe(host.reconfigure)
+        path.write_text(BASE.replace('"localhost"', '"broker.lan"').replace("5.0", "7.5"))
+        applied, staged = reloader.reload()
+        assert applied == {"mqttms.ms.timeout": (5.0, 7.5)}
+        assert staged == {"mqttms.mqtt.host": ("localhost", "broker.lan")}
+        assert cfg.config['mqttms']['ms']['timeout'] == 7.5
+        assert cfg.config['mqttms']['mqtt']['host'] == "localhost"
+        assert host.response_timeout == 15.0
+
+    def test_runtime_changes_are_not_staged(self, tmp_path):
+        cfg, path, reloader = self.reloader(tmp_path)
+        # set by the session itself: the BLE binding and a fleet query
+        cfg.config['mqttms']['ms']['server_uuid'] = "bound"
+        cfg.config['fleet']['devices'] = ["d1", "d2"]
+        path.write_text(BASE.replace("5.0", "7.5"))
+        assert reloader.reload() == ({"mqttms.ms.timeout": (5.0, 7.5)}, {})
+        path.write_text(BASE.replace('"localhost"', '"broker.lan"').replace("5.0", "7.5"))
+        assert reloader.reload() == ({}, {"mqttms.mqtt.host": ("localhost", "broker.lan")})
+        path.write_text(BASE.replace("5.0", "7.5"))
+        assert reloader.reload() == ({}, {})
+        assert cfg.config['mqttms']['ms']['server_uuid'] == "bound"
+        assert cfg.config['fleet']['devices'] == ["d1", "d2"]
+
+    def test_invalid_file_changes_nothing(self, tmp_path):
+        cfg, path, reloader = self.reloader(tmp_path)
+        path.write_text(BASE.replace("5.0", '"soon"'))
+        assert reloader.reload() == ({}, {})
+        path.write_text(BASE + "\n[unknown]\nx = 1\n")
+        assert reloader.reload() == ({}, {})
+        assert cfg.config['mqttms']['ms']['timeout'] == 5.0
+
+    def test_watcher_sees_replaced_file(self, tmp_path):
+        path = tmp_path / "config.toml"
+        path.write_text(BASE)
+        changed = threading.Event()
+        watcher = FileWatcher(str(path), changed.set, interval=0.02, settle=0.02)
+        watcher.start()
+        try:
+            other = tmp_path / "config.toml.new"
+            other.write_text(BASE + "\n# edited\n")
+            other.replace(path)
+            assert changed.wait(2.0)
+        finally:
+            watcher.stop()
@@ -0,0 +1,59 @@
+# test_scheduler.py
+
+import threading
+import time
+
+from smartfan.core.scheduler import CommandScheduler, TokenBucket, command_priority, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+def config(broker_rate=0.0, device_rate=0.0):
+    return {"broker_rate": broker_rate, "broker_burst": 1, "device_rate": device_rate, "device_burst": 1}
+
+class TestScheduler:
+
+    def test_token_bucket(self):
+        now = [0.0]
+        bucket = TokenBucket(2.0, 1, clock=lambda: now[0])
+        assert bucket.delay() == 0.0
+        bucket.take()
+        assert bucket.delay() == 0.5
+        now[0] = 0.5
+        assert bucket.delay() == 0.0
+
+    def test_priorities(self):
+        assert command_priority("SN") == PRIORITY_INTERACTIVE
+        assert command_priority("SR") == PRIORITY_BACKGROUND
+
+    def test_unlimited_never_waits(self):
+        scheduler = CommandScheduler(config())
+        assert scheduler.acquire("a", "SR", timeout=0)
+        assert scheduler.queues == [{}, {}, {}]
+
+    def run_waiting(self, scheduler, commands):
+        """Take the only token, queue the commands in order, then let them through; returns the admission order."""
+        assert scheduler.acquire("first", "WH")
+        order = []
+        threads = []
+        for dut, cmd in commands:
+            t = threading.Thread(target=lambda d=dut, c=cmd: scheduler.acquire(d, c) and order.append((d, c)))
+            t.start()
+            threads.append(t)
+            time.sleep(0.01)
+        for t in threads:
+            t.join(5.0)
+        return order
+
+    def test_interactive_ahead_of_polling(self):
+        scheduler = CommandScheduler(config(broker_rate=10.0))
+        order = self.run_waiting(scheduler, [("a", "SR"), ("b", "SR"), ("c", "SN")])
+        assert order[0] == ("c", "SN")
+
+    def test_round_robin_over_duts(self):
+        scheduler = CommandScheduler(config(broker_rate=10.0))
+        order = self.run_waiting(scheduler, [("a", "SR"), ("a", "SR"), ("a", "SR"), ("b", "SR")])
+        assert [dut for dut, _ in order] == ["a", "b", "a", "a"]
+
+    def test_timeout(self):
+        scheduler = CommandScheduler(config(device_rate=0.1))
+        assert scheduler.acquire("a", "WH")
+        assert not scheduler.acquire("a", "WH", timeout=0.05)
+        assert scheduler.queues == [{}, {}, {}]
@@ -0,0 +1,113 @@
+# test_serial_transport.py
+
+import copy
+import threading
+
+import time
+
+from smartfan.core import Config, MShost
+from smartfan.core import serial_transport
+from smartfan.core.framing import encode_command
+from smartfan.core.serial_transport import FrameDecoder, SerialTransport, encode_frame
+from smartfan.core.state_cache import DeviceStateCache
+from smartfan.testbench.standin import StandInSerialDevice, device_data
+from smartfan.testbench.perf import CommandPerf
+
+class TestFraming:
+
+    def test_frames_survive_noise_and_split_reads(self):
+        stream = b"\x00\x7e\x01" + encode_frame(7, "json", '{"command":"NP","data":""}') + encode_frame(8, "bin", b"\x02\x00\x00")
+        damaged = bytearray(encode_frame(9, "json", "{}"))
+        damaged[-1] ^= 0xFF
+        stream += bytes(damaged) + encode_frame(10, "json", "{}")
+        decoder = FrameDecoder()
+        frames = []
+        for i in range(0, len(stream), 5):
+            frames += decoder.feed(stream[i:i + 5])
+        assert [(seq, framing) for seq, framing, _ in frames] == [(7, "json"), (8, "bin"), (10, "json")]
+        assert frames[1][2] == b"\x02\x00\x00"
+        assert decoder.dropped > 0
+
+
+class TestSerialTransport:
+
+    def link(self, device, window=4):
+        config = copy.deepcopy(Config().config)
+        config['transport'].update({"type": "serial", "framing": "auto"})
+        config['serial'].update({"port": device.port, "window": window})
+        link = SerialTransport(config)
+        assert link.connect_mqtt_broker()
+        return config, link
+
+    def test_ms_host_over_pty(self):
+        device = StandInSerialDevice("dev1")
+        device.start()
+        config, link = self.link(device)
+        try:
+            host = MShost(link.ms_protocol, Config(config), cache=DeviceStateCache({}))
+            assert host.ms_nop()["response"] == "OK"
+            assert host.read_version()[0] == "2.4.0+bin"
+            # the stand-in advertises binary framing, so the next command goes binary
+            payload = host.ms_getsmac()
+            assert payload["raw"] == device_data("dev1", "GM")[:6]
+        finally:
+            link.graceful_exit()
+            device.stop()
+
+    def test_pipelined_requests_matched_by_seq(self):
+        device = StandInSerialDevice("dev1", latency=0.01)
+        device.start()
+        _, link = self.link(device, window=8)
+        try:
+            pending = [link.request(encode_command(cmd)) for cmd in ("NP", "GM", "SR", "ZA") * 10]
+            commands = [p.wait(2.0)["command"] for p in pending]
+            assert commands == ["NP", "GM", "SR", "ZA"] * 10
+            assert not link.pending
+            summary = CommandPerf(MShost(link.ms_protocol, None)).throughput(4, 0.1)
+            assert summary["commands"] > 0
+        finally:
+            link.graceful_exit()
+            device.stop()
+
+    def test_lost_port_is_reopened(self, monkeypatch):
+        attempts = []
+        opened = []
+
+        class LosingPort:
+            """The first port is lost at its first read, the first attempt to reopen it fails."""
+
+            def __init__(self, port, baudrate):
+                attempts.append(port)
+                if len(attempts) == 2:
+                    raise OSError("no such device")
+                self.lost = not opened
+                opened.append(self)
+
+            def read(self, timeout):
+                if self.lost:
+                    raise OSError("device reports readiness to read but returned no data")
+                time.sleep(timeout)
+                return b""
+
+            def write(self, data):
+                pass
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr(serial_transport, "SerialPort", LosingPort)
+        config = copy.deepcopy(Config().config)
+        config['transport'].update({"type": "serial", "reconnect_min": 0.01, "reconnect_max": 0.02})
+        link = SerialTransport(config)
+        assert link.connect_mqtt_broker()
+        try:
+            deadline = time.monotonic() + 5
+            while len(opened) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert link.wait_connected(5)
+            assert len(attempts) == 3 and link.disconnects == 1
+            assert link.port is opened[1]
+            # written to the reopened port, in flight instead of failing at once
+            assert link.request(encode_command("NP")).wait(0.05) is None
+        finally:
+            link.graceful_exit()
@@ -0,0 +1,40 @@
+# test_session.py
+
+import copy
+
+import pytest
+
+from smartfan.core import Config, MShost
+from smartfan.core.session import derive
+from smartfan.testbench import tbench
+from smartfan.utils import footprint
+
+# allocation budget of one DUT session: configuration, TestBench and MShost
+SESSION_BUDGET = 6 * 1024
+
+class TestSession:
+
+    def test_derive_copies_changed_paths_only(self):
+        base = copy.deepcopy(Config().config)
+        session = derive(base, {"mqttms.ms.server_uuid": "dev-1", "options.mode": "perf"})
+        assert session['mqttms']['ms']['server_uuid'] == "dev-1"
+        assert session['options']['mode'] == "perf"
+        assert base['mqttms']['ms']['server_uuid'] != "dev-1"
+        assert base['options']['mode'] == "testbench"
+        assert session['mqttms']['mqtt'] is base['mqttms']['mqtt']
+        assert session['tests'] is base['tests']
+        other = derive(base, {"mqttms.ms.server_uuid": "dev-1"})
+        assert other['mqttms']['ms']['server_uuid'] is session['mqttms']['ms']['server_uuid']
+
+    @pytest.mark.parametrize("count", [1000, 10000])
+    def test_session_memory_budget(self, count):
+        base = copy.deepcopy(Config().config)
+
+        def session(n):
+            cfg = derive(base, {"mqttms.ms.server_uuid": f"dev-{n:05d}", "mqttms.mqtt.client_id": f"smartfan-{n}"})
+            tb = tbench.TestBench(cfg)
+            tb.set_ms_host(MShost(None, Config(cfg)))
+            return tb
+
+        cost = footprint(session, count)
+        assert cost["bytes_per_object"] < SESSION_BUDGET, cost
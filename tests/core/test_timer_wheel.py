@@ -0,0 +1,43 @@
+# test_timer_wheel.py
+
+import random
+
+from smartfan.core.timer_wheel import TimerWheel
+
+class TestTimerWheel:
+
+    def test_due_in_order_never_early(self):
+        wheel = TimerWheel(0.1, slots=8, levels=3)
+        deadlines = [0.05, 0.3, 0.31, 1.0, 6.4, 25.0, 51.1]
+        for d in reversed(deadlines):
+            wheel.schedule(d, d)
+        seen = []
+        now = 0.0
+        while len(wheel):
+            now += 0.1
+            for d in wheel.advance(now):
+                assert d <= now + 1e-9
+                assert now - d < 0.2
+                seen.append(d)
+        assert seen == deadlines
+
+    def test_many_random_timers_cascade(self):
+        rng = random.Random(7)
+        wheel = TimerWheel(0.01, start=100.0, slots=16, levels=3)
+        deadlines = sorted(100.0 + rng.uniform(0, 40.0) for _ in range(2000))
+        for d in deadlines:
+            wheel.schedule(d, d)
+        due = wheel.advance(140.01)
+        assert sorted(due) == deadlines
+        assert len(wheel) == 0
+
+    def test_cancel_and_beyond_span(self):
+        wheel = TimerWheel(1.0, slots=4, levels=2)
+        keep = wheel.schedule(3.0, "keep")
+        wheel.schedule(3.0, "drop").cancel()
+        far = wheel.schedule(40.0, "far")
+        assert wheel.advance(3.0) == ["keep"]
+        assert keep.deadline == 3.0 and not far.cancelled
+        assert wheel.advance(39.0) == []
+        assert wheel.advance(40.0) == ["far"]
+        assert len(wheel) == 0
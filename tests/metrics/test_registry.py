@@ -0,0 +1,77 @@
+# test_registry.py
+
+import threading
+import urllib.request
+
+from smartfan.metrics import Registry, Counter, UpDownCounter, Gauge, Histogram, MetricsServer
+
+class TestRegistry:
+
+    def test_counter_sums_thread_shards(self):
+        counter = Counter("c_total", "help", ("test",))
+        threads = [threading.Thread(target=lambda: [counter.inc("Motor") for _ in range(1000)]) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert counter.value("Motor") == 4000
+        assert counter.samples() == ['c_total{test="Motor"} 4000']
+
+    def test_up_down_counter(self):
+        inflight = UpDownCounter("inflight", "help")
+        inflight.inc()
+        inflight.inc()
+        inflight.dec()
+        assert inflight.expose() == "# HELP inflight help\n# TYPE inflight gauge\ninflight 1\n"
+
+    def test_gauge_label_escaping(self):
+        gauge = Gauge("g", "help", ("dut",))
+        gauge.set(1.5, 'a"b')
+        assert gauge.samples() == ['g{dut="a\\"b"} 1.5']
+
+    def test_histogram_buckets_are_cumulative(self):
+        hist = Histogram("h_seconds", "help", ("command",), buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 3.0):
+            hist.observe(v, "SR")
+        assert hist.samples() == [
+            'h_seconds_bucket{command="SR",le="0.1"} 1',
+            'h_seconds_bucket{command="SR",le="1"} 3',
+            'h_seconds_bucket{command="SR",le="+Inf"} 4',
+            'h_seconds_sum{command="SR"} 4.05',
+            'h_seconds_count{command="SR"} 4',
+        ]
+
+    def test_state_of_other_processes_is_added(self):
+        counter = Counter("t_total", "help", ("command",))
+        hist = Histogram("r_seconds", "help", ("command",), buckets=(0.1,))
+        gauge = Gauge("s", "help", ("dut",))
+        counter.inc("SR")
+        hist.observe(0.05, "SR")
+        gauge.set(20.5, "d0")
+        # a worker sends its cumulative state, the latest one replaces the previous
+        worker = (Counter("t_total", "help", ("command",)), Histogram("r_seconds", "help", ("command",), buckets=(0.1,)),
+                  Gauge("s", "help", ("dut",)))
+        for _ in range(2):
+            worker[0].inc("SR")
+            worker[1].observe(0.5, "SR")
+            worker[2].set(21.0, "d1")
+            for metric, remote in zip((counter, hist, gauge), worker):
+                metric.update(1, remote.state())
+        assert counter.value("SR") == 3
+        assert hist.merged() == {("SR",): ([1, 2], 1.05)}
+        assert gauge.samples() == ['s{dut="d0"} 20.5', 's{dut="d1"} 21']
+        counter.reset()
+        assert counter.state() == {}
+        assert counter.value("SR") == 2
+
+    def test_http_endpoint(self):
+        registry = Registry()
+        registry.register(Counter("units_total", "help")).inc()
+        server = MetricsServer("127.0.0.1", 0, registry)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as rsp:
+                assert rsp.status == 200
+                assert "units_total 1" in rsp.read().decode()
+        finally:
+            server.stop()
@@ -0,0 +1,54 @@
+# test_calibration.py
+
+import struct
+
+import numpy as np
+
+from smartfan.core import Config
+from smartfan.testbench.calibration import cross_calibrate, decode_sample
+
+DEVICES = ["d0", "d1", "d2", "d3", "d4"]
+
+def rack(offsets, rounds=6, noise=None, seed=1):
+    """Samples (rounds, devices, channels) of temperature, pressure, humidity around one room."""
+    rng = np.random.default_rng(seed)
+    room = np.array([22.0, 1013.0, 45.0])
+    samples = room + np.array(offsets) + rng.normal(0.0, 0.05, (rounds, len(offsets), 3))
+    if noise is not None:
+        device, sigma = noise
+        samples[:, device, 0] += rng.normal(0.0, sigma, rounds)
+    return samples
+
+class TestCrossCalibration:
+
+    def config(self):
+        return Config().config['calibration']
+
+    def test_all_agree(self):
+        report = cross_calibrate(DEVICES, rack([[0.0, 0.0, 0.0]] * 5), self.config())
+        assert report.passed.all()
+        assert np.allclose(report.center, [22.0, 1013.0, 45.0], atol=0.1)
+
+    def test_outlier_sensor_flagged(self):
+        offsets = [[0.0, 0.0, 0.0]] * 5
+        offsets[3] = [0.0, 0.0, 12.0]
+        report = cross_calibrate(DEVICES, rack(offsets), self.config())
+        verdicts = report.verdicts()
+        assert [v["result"] for v in verdicts] == [True, True, True, False, True]
+        assert verdicts[3]["outliers"] == ["humidity"]
+        assert abs(verdicts[3]["offset"]["humidity"] - 12.0) < 0.2
+
+    def test_noisy_and_silent_devices_fail(self):
+        samples = rack([[0.0, 0.0, 0.0]] * 5, noise=(1, 3.0))
+        samples[:, 4, :] = np.nan
+        report = cross_calibrate(DEVICES, samples, self.config())
+        verdicts = report.verdicts()
+        assert verdicts[1]["noisy"] == ["temperature"] and not verdicts[1]["result"]
+        assert report.missing[4] and not verdicts[4]["result"]
+        assert verdicts[0]["result"] and verdicts[2]["result"]
+
+    def test_decode_sample(self):
+        data = struct.pack('<hIIIHBBB', 2215, 101325, 45500, 20000, 10, 7, 1, 0x31)
+        values = decode_sample({"response": "OK", "data": data.hex()}, ["temperature", "humidity", "gas"])
+        assert list(values) == [22.15, 45.5, 20000.0]
+        assert decode_sample({"response": "TIMEOUT"}, ["temperature"]) is None
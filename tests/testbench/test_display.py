@@ -0,0 +1,65 @@
+# test_display.py
+
+import io
+import pytest
+
+from smartfan.testbench.display import FrameRenderer, GridRenderer
+from smartfan.testbench import tbench
+from smartfan.testbench.tbench import SENSORS_TEXT, MOTOR_TEXT, STATE_TEXT
+
+class TestFrameRenderer:
+
+    @pytest.fixture
+    def stream(self):
+        return io.StringIO()
+
+    def test_first_frame_is_printed_whole(self, stream):
+        renderer = FrameRenderer(stream)
+        assert renderer.render(["a", "b", "c"]) == 3
+        assert stream.getvalue() == "\033[Ka\n\033[Kb\n\033[Kc\n"
+
+    def test_unchanged_frame_writes_nothing(self, stream):
+        renderer = FrameRenderer(stream)
+        renderer.render(["a", "b"])
+        stream.truncate(0)
+        stream.seek(0)
+        assert renderer.render(["a", "b"]) == 0
+        assert stream.getvalue() == ""
+
+    def test_only_changed_line_is_rewritten(self, stream):
+        renderer = FrameRenderer(stream)
+        renderer.render(["a", "b", "c"])
+        stream.truncate(0)
+        stream.seek(0)
+        assert renderer.render(["a", "B", "c"]) == 1
+        assert stream.getvalue() == "\033[2A\r\033[KB\033[2B\r"
+
+    def test_shrinking_frame_clears_tail(self, stream):
+        renderer = FrameRenderer(stream)
+        renderer.render(["a", "b", "c"])
+        stream.truncate(0)
+        stream.seek(0)
+        renderer.render(["a"])
+        assert stream.getvalue() == "\033[2A\r\033[J"
+
+class TestGridRenderer:
+
+    def test_new_device_appends_row(self):
+        stream = io.StringIO()
+        grid = GridRenderer("hdr", stream)
+        grid.update("dut1", "row1")
+        grid.render()
+        stream.truncate(0)
+        stream.seek(0)
+        grid.update("dut2", "row2")
+        assert grid.render() == 1
+        assert stream.getvalue() == "\033[Krow2\n"
+
+def test_flag_tables_match_bits():
+    assert "Ambient light: Active" in SENSORS_TEXT[tbench.TestBench.SEN_AMBIENT]
+    assert "Humidity: Inactive" in SENSORS_TEXT[tbench.TestBench.SEN_AMBIENT]
+    assert "Phase: Fast" in MOTOR_TEXT[tbench.TestBench.MOT_RUNNING | tbench.TestBench.MOT_PHASE_FAST]
+    state = tbench.TestBench.DEV_STATE_NORMAL | tbench.TestBench.DEV_WIFI_CONNECTED
+    assert "Normal: Yes" in STATE_TEXT[state]
+    assert "WiFi: Connected" in STATE_TEXT[state]
+    assert "MQTT: Not subscribed" in STATE_TEXT[state]
@@ -0,0 +1,45 @@
+# test_export.py
+
+import csv
+import pytest
+
+from smartfan.testbench.export import SampleExporter, COLUMNS
+
+SAMPLE = (2215, 101325, 45500, 20000, 10, 7, 1, 0x31)
+
+class TestSampleExporter:
+
+    def exporter(self, path, chunk=2):
+        return SampleExporter(str(path), {"chunk": chunk, "flush_interval": 60.0, "queue": 100})
+
+    def test_csv_chunks(self, tmp_path):
+        path = tmp_path / "monitor.csv"
+        exporter = self.exporter(path)
+        for t in range(5):
+            exporter.add("dut1", SAMPLE, timestamp=float(t))
+        exporter.close()
+        rows = list(csv.reader(path.open()))
+        assert tuple(rows[0]) == COLUMNS
+        assert len(rows) == 6
+        assert rows[1] == ["0.0", "dut1", "22.15", "1013.25", "45.5", "20000", "10", "7", "1", "49"]
+        assert exporter.written == 5
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        exporter = SampleExporter(str(tmp_path / "m.csv"), {"chunk": 10, "flush_interval": 60.0, "queue": 1})
+        exporter.samples.put(None)
+        exporter.thread.join()
+        exporter.add("dut1", SAMPLE)
+        exporter.add("dut1", SAMPLE)
+        assert exporter.dropped == 1
+
+    def test_parquet_row_groups(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        path = tmp_path / "monitor.parquet"
+        exporter = self.exporter(path)
+        for t in range(5):
+            exporter.add("dut1", SAMPLE, timestamp=float(t))
+        exporter.close()
+        table = pq.read_table(str(path))
+        assert table.num_rows == 5
+        assert pq.ParquetFile(str(path)).num_row_groups == 3
+        assert table.column("temperature")[0].as_py() == pytest.approx(22.15)
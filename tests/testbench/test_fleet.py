@@ -0,0 +1,132 @@
+# test_fleet.py
+
+import copy
+import json
+import os
+import queue
+
+import pytest
+
+from smartfan.core import Config
+from smartfan.metrics import TESTS, UNITS, COMMAND_TIMEOUTS
+from smartfan.testbench import fleet as fleet_module
+from smartfan.testbench.fleet import (BatchChannel, FleetRunner, MSG_DONE, MSG_LOGS, MSG_METRICS, MSG_RESULTS,
+                                      WORKER_METRICS, shard_loop)
+
+class ListChannel:
+
+    def __init__(self):
+        self.messages = []
+
+    def put(self, message):
+        self.messages.append(message)
+
+
+def fleet_config(tmp_path, devices, workers=2):
+    config = copy.deepcopy(Config.DEFAULT_CONFIG)
+    config['fleet']['devices'] = devices
+    config['fleet']['workers'] = workers
+    config['options']['results'] = str(tmp_path / "results.jsonl")
+    config['options']['export'] = ""
+    config['presence']['enabled'] = False
+    return config
+
+def read_results(tmp_path):
+    with open(tmp_path / "results.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def result(uuid, test, ok, worker):
+    return {"dut": uuid, "test": test, "result": ok, "duration": 0.0, "time": 0.0, "worker": worker}
+
+# stand-ins of run_shard, started in the worker processes
+
+def shard_passes(config, worker, devices, channel, control=None):
+    channel.put((MSG_LOGS, worker, [f"testing {len(devices)} devices"]))
+    channel.put((MSG_RESULTS, worker, [result(uuid, "Motor", True, worker) for uuid in devices]))
+    metrics = {metric.name: {} for metric in WORKER_METRICS}
+    metrics[COMMAND_TIMEOUTS.name] = {("SR",): 2.0}
+    channel.put((MSG_METRICS, worker, [metrics]))
+    channel.put((MSG_DONE, worker, [{"passed": len(devices), "failed": 0}]))
+
+def shard_crashes_in_worker_1(config, worker, devices, channel, control=None):
+    if worker == 1:
+        os._exit(3)
+    shard_passes(config, worker, devices, channel, control)
+
+
+class TestBatchChannel:
+
+    def test_items_sent_in_batches(self):
+        channel = ListChannel()
+        batch = BatchChannel(channel, 3, MSG_RESULTS, 2)
+        batch.add("a")
+        assert channel.messages == []
+        batch.add("b")
+        batch.add("c")
+        assert channel.messages == [(MSG_RESULTS, 3, ["a", "b"])]
+        batch.flush()
+        batch.flush()
+        assert channel.messages == [(MSG_RESULTS, 3, ["a", "b"]), (MSG_RESULTS, 3, ["c"])]
+
+
+class TestFleetRunner:
+
+    @pytest.fixture(autouse=True)
+    def forget_worker_metrics(self):
+        yield
+        for metric in WORKER_METRICS:
+            metric.remote.clear()
+
+    def test_devices_sharded_round_robin(self, tmp_path):
+        devices = [f"d{n}" for n in range(5)]
+        runner = FleetRunner(fleet_config(tmp_path, devices, workers=2))
+        assert runner.shards() == [["d0", "d2", "d4"], ["d1", "d3"]]
+        runner.config['fleet']['workers'] = 8
+        assert runner.shards() == [[d] for d in devices]
+        assert runner.shards(["x"]) == [["x"]]
+
+    def test_results_of_the_workers_are_merged(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(fleet_module, "run_shard", shard_passes)
+        devices = ["d0", "d1", "d2"]
+        passed = UNITS.value("pass")
+        motor = TESTS.value("Motor", "pass")
+        timeouts = COMMAND_TIMEOUTS.value("SR")
+        summary = FleetRunner(fleet_config(tmp_path, devices)).run()
+        assert summary == {"passed": 3, "failed": 0}
+        assert sorted(r["dut"] for r in read_results(tmp_path)) == devices
+        assert UNITS.value("pass") == passed + 3
+        assert TESTS.value("Motor", "pass") == motor + 3
+        # one state per worker
+        assert COMMAND_TIMEOUTS.value("SR") == timeouts + 4
+
+    def test_failed_worker_does_not_hang_the_run(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(fleet_module, "run_shard", shard_crashes_in_worker_1)
+        summary = FleetRunner(fleet_config(tmp_path, ["d0", "d1", "d2", "d3"])).run()
+        assert summary == {"passed": 2, "failed": 0}
+        assert sorted(r["dut"] for r in read_results(tmp_path)) == ["d0", "d2"]
+
+
+class TestShardLoop:
+
+    def test_connect_failure_and_reloaded_changes(self, tmp_path, monkeypatch):
+        config = fleet_config(tmp_path, ["d0", "d1"])
+        config['transport']['type'] = 'mqttms'
+        timeouts = []
+
+        def open_transport(cfg):
+            timeouts.append(cfg['mqttms']['ms']['timeout'])
+            return None
+
+        monkeypatch.setattr(fleet_module, "open_transport", open_transport)
+        control = queue.Queue()
+        control.put({"mqttms.ms.timeout": (5.0, 9.0)})
+        channel = ListChannel()
+        logs = BatchChannel(channel, 0, MSG_LOGS, 10)
+        results = BatchChannel(channel, 0, MSG_RESULTS, 10)
+        shard_loop(config, 0, ["d0", "d1"], channel, logs, results, control)
+        assert timeouts == [9.0, 9.0]
+        kinds = [kind for kind, _, _ in channel.messages]
+        assert kinds == [MSG_RESULTS, MSG_METRICS, MSG_DONE]
+        assert [(r["dut"], r["test"], r["result"]) for r in channel.messages[0][2]] == [
+            ("d0", "Connect", False), ("d1", "Connect", False)]
+        assert channel.messages[-1] == (MSG_DONE, 0, [{"passed": 0, "failed": 2}])
@@ -0,0 +1,85 @@
+# test_operator.py
+
+import socket
+import threading
+import time
+
+from smartfan.testbench.operator import OperatorConsole, UUID4_VALIDATOR, UUIDv4Validator
+
+UUID = "4fdc0d1f-2421-4b5b-975b-9b4d0a08d712"
+
+class TestOperatorConsole:
+
+    def test_validators_share_regex(self):
+        assert UUIDv4Validator().uuid4_regex is UUID4_VALIDATOR.uuid4_regex
+
+    def test_socket_prompts_queue_per_dut(self):
+        console = OperatorConsole({"channel": "socket", "host": "127.0.0.1", "port": 0})
+        port = console.server.getsockname()[1]
+        answers = {}
+
+        def ask(dut, text, validator=None):
+            answers[dut] = console.ask(dut, text, "", validator)
+
+        first = threading.Thread(target=ask, args=("dut-a", "Enter a UUID: ", UUID4_VALIDATOR))
+        first.start()
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as conn:
+            stream = conn.makefile("rw", encoding="utf-8", newline="\n")
+            assert stream.readline() == "[dut-a] Enter a UUID: \n"
+            # dut-b asks while dut-a is still waiting; dut-b does not block dut-a
+            second = threading.Thread(target=ask, args=("dut-b", "Serial number: "))
+            second.start()
+            stream.write("not-a-uuid\n")
+            stream.flush()
+            assert stream.readline().startswith("[dut-a] rejected: Invalid UUIDv4")
+            assert stream.readline() == "[dut-a] Enter a UUID: \n"
+            stream.write(UUID + "\n")
+            stream.flush()
+            first.join(5)
+            assert stream.readline() == "[dut-b] Serial number: \n"
+            stream.write("109380-2501-0000002\n")
+            stream.flush()
+            second.join(5)
+        console.close()
+        assert answers == {"dut-a": UUID, "dut-b": "109380-2501-0000002"}
+
+    def asking(self, console, result):
+        t = threading.Thread(target=lambda: result.append(console.ask("dut-a", "UUID: ")))
+        t.start()
+        return t
+
+    def test_close_releases_unit_waiting_for_a_client(self):
+        console = OperatorConsole({"channel": "socket", "host": "127.0.0.1", "port": 0})
+        result = []
+        t = self.asking(console, result)
+        # the console thread takes the prompt and blocks in accept()
+        deadline = time.monotonic() + 5
+        while console.current is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert console.current is not None
+        console.close()
+        t.join(5)
+        console.thread.join(5)
+        assert result == [None]
+        assert not console.thread.is_alive()
+
+    def test_close_releases_unit_waiting_for_an_answer(self):
+        console = OperatorConsole({"channel": "socket", "host": "127.0.0.1", "port": 0})
+        port = console.server.getsockname()[1]
+        result = []
+        t = self.asking(console, result)
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as conn:
+            stream = conn.makefile("rw", encoding="utf-8", newline="\n")
+            # the question is out: the console thread blocks in readline()
+            assert stream.readline() == "[dut-a] UUID: \n"
+            console.close()
+            t.join(5)
+            console.thread.join(5)
+            assert stream.readline() == ""
+        assert result == [None]
+        assert not console.thread.is_alive()
+
+    def test_ask_after_close(self):
+        console = OperatorConsole({"channel": "socket", "host": "127.0.0.1", "port": 0})
+        console.close()
+        assert console.ask("dut-a", "UUID: ") is None
@@ -0,0 +1,64 @@
+# test_perf.py
+
+import copy
+import json
+import struct
+import threading
+
+from smartfan.core import Config, MShost
+from smartfan.core.state_cache import DeviceStateCache
+from smartfan.testbench import tbench
+from smartfan.testbench.perf import summarize
+
+class DeviceProtocol:
+    """Answers NP, SR, MT and VS at once, like an idle device on a fast link."""
+
+    def __init__(self):
+        self.response_received = threading.Event()
+        self.response = None
+        self.sent = []
+
+    def put_command(self, payload):
+        cmd = json.loads(payload)["command"]
+        self.sent.append(cmd)
+        data = b""
+        if cmd == "SR":
+            data = struct.pack('<hIIIHBBB', 2200, 101325, 45000, 20000, 10, 7, 0, 0x31)
+        elif cmd == "VS":
+            data = b"2.4.0\x00109380-2501-0000001"
+        self.response = {"command": cmd, "response": "OK", "data": data.hex()}
+        self.response_received.set()
+
+class TestPerf:
+
+    def test_summarize(self):
+        summary = summarize([0.001, 0.002, 0.003, 0.004])
+        assert summary["samples"] == 4
+        assert summary["min_ms"] == 1.0 and summary["max_ms"] == 4.0
+        assert summary["p50_ms"] == 2.5
+        assert summarize([]) == {"samples": 0}
+
+    def test_perf_mode_records_measurements_with_version(self):
+        config = copy.deepcopy(Config().config)
+        config['options']['mode'] = 'perf'
+        config['options']['nopairing'] = True
+        config['perf'].update({"samples": 5, "in_flight": [1, 2], "duration": 0.05})
+        protocol = DeviceProtocol()
+        tb = tbench.TestBench(config)
+        tb.set_ms_host(MShost(protocol, None, cache=DeviceStateCache({})))
+        tb.ms_subscribe = lambda: None
+        results = tb.run_tests()
+        assert [r["test"] for r in results] == ["NOP RTT", "NOP Throughput", "SR Display", "NOP Jitter Motor"]
+        assert all(r["result"] and r["version"] == "2.4.0" for r in results)
+        assert results[0]["samples"] == 5
+        # 2 in flight needs a pipelining transport
+        assert [level["in_flight"] for level in results[1]["levels"]] == [1]
+        assert protocol.sent.count("MT") == 2
+
+    def test_p99_limit_fails_measurement(self):
+        config = copy.deepcopy(Config().config)
+        config['perf']['max_p99_ms'] = 1.0
+        tb = tbench.TestBench(config)
+        tb.set_ms_host(MShost(DeviceProtocol(), None, cache=DeviceStateCache({})))
+        assert not tb.perf_result("NOP RTT", {"samples": 10, "p99_ms": 2.0})
+        assert tb.perf_result("NOP RTT", {"samples": 10, "p99_ms": 0.5})
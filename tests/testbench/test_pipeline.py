@@ -0,0 +1,161 @@
+# test_pipeline.py
+
+import copy
+import json
+import struct
+import threading
+import time
+
+from smartfan.core import Config
+from smartfan.testbench import tbench
+from smartfan.testbench import pipeline as pipeline_module
+from smartfan.testbench.pipeline import PairingPipeline, STAGES
+
+class StateHost:
+    """MShost stand-in answering SR with the given sequence of state bytes."""
+
+    def __init__(self, states):
+        self.states = list(states)
+        self.polls = 0
+
+    def ms_sensors(self):
+        self.polls += 1
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        data = struct.pack('<hIIIHBBB', 2200, 101325, 50000, 20000, 10, 7, 0, state)
+        return {"response": "OK", "data": data.hex()}
+
+class TestPipeline:
+
+    def bench(self, states):
+        tb = tbench.TestBench(copy.deepcopy(Config.DEFAULT_CONFIG))
+        tb.set_ms_host(StateHost(states))
+        return tb
+
+    def test_ready_when_wifi_and_mqtt_bits_set(self):
+        tb = self.bench([0x00, 0x10, 0x31])
+        assert tb.wait_ready(timeout=1.0, poll=0.01)
+        assert tb.ms_host.polls == 3
+
+    def test_not_ready_in_time(self):
+        tb = self.bench([0x10])
+        assert not tb.wait_ready(timeout=0.05, poll=0.01)
+
+    def test_units_from_device_list(self):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['fleet']['devices'] = ["a", "b"]
+        pipeline = PairingPipeline(config)
+        assert list(pipeline.uuids()) == ["a", "b"]
+        unit = pipeline.unit_config(2, "b")
+        assert unit['mqttms']['ms']['server_uuid'] == "b"
+        assert unit['mqttms']['mqtt']['client_id'].endswith("-u2")
+        assert not unit['options']['interactive']
+
+class Link:
+    """Transport stand-in; counts the sessions closed."""
+
+    def __init__(self, closed):
+        self.ms_protocol = self
+        self.closed = closed
+
+    def subscribe(self):
+        return True
+
+    def graceful_exit(self):
+        self.closed.append(self)
+
+class TestPipelineRun:
+    """PairingPipeline.run() with stub join and test stages, recording the order of the stage events."""
+
+    def run(self, monkeypatch, tmp_path, devices, depth=1, join_time=0.0, test_time=0.0, not_ready=(), raising=()):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['fleet']['devices'] = devices
+        config['pipeline']['depth'] = depth
+        config['options']['results'] = str(tmp_path / "results.jsonl")
+        config['options']['export'] = ""
+        config['options']['dutdelay'] = 0
+        config['options']['interactive'] = False
+        config['presence']['enabled'] = False
+        events = []
+        closed = []
+        lock = threading.Lock()
+
+        def event(*item):
+            with lock:
+                events.append(item)
+
+        def mqtt_ready(tb):
+            event("MQ", tb.config['mqttms']['ms']['server_uuid'])
+            return True
+
+        def wait_ready(tb, timeout, poll=1.0):
+            uuid = tb.config['mqttms']['ms']['server_uuid']
+            event("SR", uuid)
+            time.sleep(join_time)
+            return uuid not in not_ready
+
+        def run_tests(tb):
+            uuid = tb.config['mqttms']['ms']['server_uuid']
+            event("test", uuid)
+            if uuid in raising:
+                raise RuntimeError("test sequence crashed")
+            time.sleep(test_time)
+            event("tested", uuid)
+            return [{"test": "Stub", "result": True, "duration": test_time}]
+
+        monkeypatch.setattr(pipeline_module, "open_transport", lambda config: Link(closed))
+        monkeypatch.setattr(pipeline_module, "MShost", lambda ms_protocol, config: ms_protocol)
+        monkeypatch.setattr(tbench.TestBench, "mqtt_ready", mqtt_ready)
+        monkeypatch.setattr(tbench.TestBench, "wait_ready", wait_ready)
+        monkeypatch.setattr(tbench.TestBench, "run_tests", run_tests)
+        pipeline = PairingPipeline(config)
+        summary = pipeline.run()
+        with open(tmp_path / "results.jsonl", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        return pipeline, summary, events, closed, records
+
+    def test_pairing_commands_before_readiness_polls(self, monkeypatch, tmp_path):
+        _, summary, events, _, _ = self.run(monkeypatch, tmp_path, ["a", "b"])
+        assert summary == {"passed": 2, "failed": 0}
+        for uuid in ("a", "b"):
+            steps = [e[0] for e in events if e[1] == uuid]
+            assert steps == ["MQ", "SR", "test", "tested"]
+
+    def test_next_unit_joins_while_one_is_tested(self, monkeypatch, tmp_path):
+        _, summary, events, _, _ = self.run(monkeypatch, tmp_path, ["a", "b"], test_time=0.2)
+        assert summary == {"passed": 2, "failed": 0}
+        assert events.index(("SR", "b")) < events.index(("tested", "a"))
+
+    def test_slow_test_stage_holds_joins_back(self, monkeypatch, tmp_path):
+        devices = [f"u{n}" for n in range(6)]
+        _, summary, events, _, _ = self.run(monkeypatch, tmp_path, devices, depth=1, test_time=0.1)
+        assert summary == {"passed": 6, "failed": 0}
+        joined = [e for e in events[:events.index(("tested", "u0"))] if e[0] == "SR"]
+        # the unit under test, one in the queue and one waiting to be put
+        assert len(joined) <= 3
+
+    def test_end_of_units_stops_all_stages(self, monkeypatch, tmp_path):
+        pipeline, summary, _, closed, records = self.run(monkeypatch, tmp_path, ["a", "b", "c"])
+        assert summary == {"passed": 3, "failed": 0}
+        assert len(closed) == 3
+        assert all(q.empty() for q in pipeline.queues)
+        assert not [t for t in threading.enumerate() if t.name in STAGES]
+        assert [r["dut"] for r in records] == ["a", "b", "c"]
+
+    def test_unit_not_ready_is_recorded_as_failed(self, monkeypatch, tmp_path):
+        _, summary, events, closed, records = self.run(monkeypatch, tmp_path, ["a", "b", "c"], not_ready={"b"})
+        assert summary == {"passed": 2, "failed": 1}
+        assert ("test", "b") not in events
+        assert len(closed) == 3
+        failed = [r for r in records if r["dut"] == "b"]
+        assert len(failed) == 1
+        assert failed[0]["test"] == "Join" and failed[0]["result"] is False and failed[0]["unit"] == 2
+
+    def test_unit_whose_tests_raise_fails_and_the_next_ones_are_tested(self, monkeypatch, tmp_path):
+        devices = ["a", "b", "c", "d"]
+        pipeline, summary, events, closed, records = self.run(monkeypatch, tmp_path, devices, raising={"a", "c"})
+        assert summary == {"passed": 2, "failed": 2}
+        assert [e[1] for e in events if e[0] == "tested"] == ["b", "d"]
+        assert len(closed) == 4
+        assert not pipeline.stop.is_set()
+        assert [(r["dut"], r["test"], r["result"]) for r in records] == [
+            ("a", "Tests", False), ("b", "Stub", True), ("c", "Tests", False), ("d", "Stub", True)]
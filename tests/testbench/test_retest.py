@@ -0,0 +1,91 @@
+# test_retest.py
+
+import copy
+
+from smartfan.core import Config
+from smartfan.testbench import tbench
+from smartfan.testbench.retest import RetestCache, plan_hash
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class IdentityHost:
+    """MShost stand-in answering the identity reads; nothing is lost."""
+    lost = 0
+
+    def read_version(self):
+        return "2.4.0", "109380-2501-0000001"
+
+    def ms_getsmac(self):
+        return {"response": "OK", "data": "a1b2c3d4e5f6"}
+
+    def ms_getmachid(self):
+        return {"response": "OK", "data": "01020304"}
+
+class TestRetestCache:
+
+    def test_pass_expires_and_failure_invalidates(self, tmp_path):
+        clock = Clock()
+        cache = RetestCache(str(tmp_path / "retest.jsonl"), 60.0, clock)
+        cache.record("mac", "2.4.0", "Motor", "plan", True)
+        assert cache.passed("mac", "2.4.0", "Motor", "plan")
+        assert not cache.passed("mac", "2.4.1", "Motor", "plan")
+        clock.now += 61.0
+        assert not cache.passed("mac", "2.4.0", "Motor", "plan")
+        cache.record("mac", "2.4.0", "Led", "plan", True)
+        cache.record("mac", "2.4.0", "Led", "plan", False)
+        assert not cache.passed("mac", "2.4.0", "Led", "plan")
+
+    def test_reload_last_line_wins(self, tmp_path):
+        path = str(tmp_path / "retest.jsonl")
+        clock = Clock()
+        cache = RetestCache(path, 60.0, clock)
+        cache.record("mac", "2.4.0", "Motor", "plan", True)
+        cache.record("mac", "2.4.0", "Led", "plan", True)
+        cache.record("mac", "2.4.0", "Led", "plan", False)
+        reloaded = RetestCache(path, 60.0, clock)
+        assert reloaded.passed("mac", "2.4.0", "Motor", "plan")
+        assert not reloaded.passed("mac", "2.4.0", "Led", "plan")
+
+    def test_plan_hash_follows_settings(self):
+        config = copy.deepcopy(Config().config)
+        plan = plan_hash(["Motor"], config)
+        assert plan == plan_hash(["Motor"], config)
+        config['tests']['motoron'] = 5.0
+        assert plan != plan_hash(["Motor"], config)
+
+
+class TestIncrementalRun:
+
+    def bench(self, tmp_path, outcome):
+        config = copy.deepcopy(Config().config)
+        config['options']['nopairing'] = True
+        config['options']['incremental'] = True
+        config['retest']['cache'] = str(tmp_path / "retest.jsonl")
+        tb = tbench.TestBench(config)
+        tb.set_ms_host(IdentityHost())
+        tb.ms_subscribe = lambda: None
+        tb.runs = []
+
+        def make(name):
+            def run():
+                tb.runs.append(name)
+                return outcome[name]
+            return run
+        tb.tests = [(make(name), name) for name in outcome]
+        return tb
+
+    def test_skips_passed_tests_and_keeps_full_verdicts(self, tmp_path):
+        outcome = {"Who Am I": True, "Motor": False, "Led": True}
+        self.bench(tmp_path, outcome).run_tests()
+        outcome["Motor"] = True
+        tb = self.bench(tmp_path, outcome)
+        results = tb.run_tests()
+        assert tb.runs == ["Motor"]
+        assert [r["test"] for r in results] == ["Who Am I", "Motor", "Led"]
+        assert all(r["result"] for r in results)
+        assert [r.get("cached", False) for r in results] == [True, False, True]
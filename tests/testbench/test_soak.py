@@ -0,0 +1,131 @@
+# test_soak.py
+
+import copy
+import json
+import random
+
+from smartfan.core import Config
+from smartfan.testbench.soak import SoakRunner, SoakUnit
+
+SAMPLE = (2500, 100000, 50000, 1000, 100, 0, 0, 0)
+
+class FakeHost:
+
+    def __init__(self, params):
+        self.params = params
+        self.motor = []
+
+    def ms_motor(self, mode):
+        self.motor.append(mode)
+        return {"response": "OK"}
+
+    def ms_led(self, mode):
+        return {"response": "OK"}
+
+    def read_params(self):
+        return dict(self.params)
+
+
+class FakeBench:
+
+    def __init__(self, params, fail=False):
+        self.ms_host = FakeHost(params)
+        self.fail = fail
+
+    def read_sensors(self):
+        return None if self.fail else SAMPLE
+
+
+class FakeClock:
+
+    def __init__(self, interrupt=None):
+        self.now = 1000.0
+        self.interrupt = interrupt
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.interrupt is not None and self.now >= self.interrupt:
+            raise KeyboardInterrupt
+
+
+class TestSoak:
+
+    def runner(self, tmp_path, duration, resume=True, seed=1, interrupt=None, devices=("dev1", "dev2")):
+        config = copy.deepcopy(Config().config)
+        config['fleet']['devices'] = []
+        config['options']['results'] = ""
+        config['options']['export'] = ""
+        config['soak'].update({"duration": duration, "tick": 0.05, "jitter": 0.1, "workers": 0,
+                               "checkpoint": str(tmp_path / "soak.json"), "checkpoint_interval": 10.0, "resume": resume,
+                               "periods": {"poll": 1.0, "motor": 4.0, "led": 2.0, "params": 0.0}})
+        clock = FakeClock(interrupt)
+        runner = SoakRunner(config, clock=clock, sleep=clock.sleep, rng=random.Random(seed))
+        for uuid in devices:
+            runner.add_unit(SoakUnit(uuid, FakeBench(config['params'], fail=uuid == "dev2")))
+        return runner, clock
+
+    def test_runs_follow_periods_without_drift(self, tmp_path):
+        runner, clock = self.runner(tmp_path, 60.0)
+        records = runner.run()
+        by_dut = {r["dut"]: r for r in records}
+        assert by_dut["dev1"]["result"] and not by_dut["dev2"]["result"]
+        actions = by_dut["dev1"]["actions"]
+        assert set(actions) == {"poll", "motor", "led"}
+        # 60 s at the nominal periods, within one run of jitter and the random first phase
+        assert abs(actions["poll"]["runs"] - 60) <= 1
+        assert abs(actions["led"]["runs"] - 30) <= 1
+        assert abs(actions["motor"]["runs"] - 15) <= 1
+        assert by_dut["dev2"]["actions"]["poll"]["failures"] == by_dut["dev2"]["actions"]["poll"]["runs"]
+        assert runner.units[0].tb.ms_host.motor[:4] == [6, 0, 4, 0]
+        assert runner.stats.dut("dev1").samples == actions["poll"]["runs"]
+        # the stand-in gas reading is below the configured threshold
+        assert by_dut["dev1"]["alarms"] == 1 and by_dut["dev1"]["active_alarms"] == ["gas threshold"]
+
+    def test_stall_is_skipped_not_replayed(self, tmp_path):
+        runner, clock = self.runner(tmp_path, 0.0)
+        runner.plan(None)
+        runner.started = clock.now
+        runner.dispatch(clock.now + 1.0)
+        clock.now += 30.0
+        runner.dispatch(clock.now)
+        poll = [a for a in runner.actions if a.name == "poll"][0]
+        assert poll.runs == 2
+        assert 27 <= poll.skipped <= 29
+        assert clock.now < poll.planned <= clock.now + poll.period
+
+    def test_checkpoint_and_resume(self, tmp_path):
+        runner, _ = self.runner(tmp_path, 100.0, interrupt=1040.0)
+        first = {r["dut"]: r["actions"] for r in runner.run()}
+        state = json.loads((tmp_path / "soak.json").read_text())
+        assert abs(state["elapsed"] - 40.0) < 0.2
+        assert not state["finished"] and state["devices"] == ["dev1", "dev2"]
+        assert state["units"]["dev1"]["poll"]["runs"] == first["dev1"]["poll"]["runs"]
+
+        resumed, _ = self.runner(tmp_path, 100.0, seed=2)
+        second = {r["dut"]: r for r in resumed.run()}
+        assert abs(second["dev1"]["duration"] - 100.0) < 0.2
+        assert abs(second["dev1"]["actions"]["poll"]["runs"] - 100) <= 1
+        assert json.loads((tmp_path / "soak.json").read_text())["finished"]
+
+        fresh, _ = self.runner(tmp_path, 10.0, resume=False)
+        assert abs(fresh.run()[0]["actions"]["poll"]["runs"] - 10) <= 1
+
+    def test_finished_run_is_not_resumed(self, tmp_path):
+        runner, _ = self.runner(tmp_path, 30.0)
+        runner.run()
+        again, _ = self.runner(tmp_path, 30.0)
+        records = {r["dut"]: r for r in again.run()}
+        assert abs(records["dev1"]["duration"] - 30.0) < 0.2
+        assert abs(records["dev1"]["actions"]["poll"]["runs"] - 30) <= 1
+
+    def test_checkpoint_of_other_units_is_not_resumed(self, tmp_path):
+        runner, _ = self.runner(tmp_path, 100.0, interrupt=1040.0)
+        runner.run()
+        other, _ = self.runner(tmp_path, 20.0, devices=("u2",))
+        records = other.run()
+        assert [r["dut"] for r in records] == ["u2"]
+        assert abs(records[0]["duration"] - 20.0) < 0.2
+        assert abs(records[0]["actions"]["poll"]["runs"] - 20) <= 1
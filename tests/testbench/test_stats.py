@@ -0,0 +1,75 @@
+# test_stats.py
+
+import logging
+import math
+import statistics
+import pytest
+
+from smartfan.testbench.stats import RunningStats, DutStats, SensorStatistics
+
+class TestRunningStats:
+
+    def test_welford_matches_statistics(self):
+        values = [3.0, 7.5, 1.25, 9.0, 4.0, 4.0]
+        rs = RunningStats()
+        for t, v in enumerate(values):
+            rs.add(v, float(t))
+        assert rs.count == len(values)
+        assert rs.mean == pytest.approx(statistics.mean(values))
+        assert rs.variance == pytest.approx(statistics.variance(values))
+        assert rs.min == 1.25
+        assert rs.max == 9.0
+
+    def test_rate_of_change(self):
+        rs = RunningStats()
+        rs.add(10.0, 0.0)
+        rs.add(16.0, 2.0)
+        assert rs.rate == pytest.approx(3.0)
+        assert rs.max_rate == pytest.approx(3.0)
+
+    def test_empty(self):
+        rs = RunningStats()
+        assert rs.variance == 0.0
+        assert math.isinf(rs.min)
+
+class TestDutStats:
+
+    PARAMS = {"amb_thr": 100, "hum_thr": 70, "gas_thr": 10000}
+
+    @staticmethod
+    def sample(humidity=50.0, gas=20000, light=10, temperature=22.0):
+        return (int(temperature * 100), 101325, int(humidity * 1000), gas, light, 7, 0, 0x31)
+
+    def test_threshold_alarm_is_edge_triggered(self):
+        ds = DutStats(self.PARAMS)
+        assert ds.add_sample(self.sample(), 0.0) == []
+        raised = ds.add_sample(self.sample(humidity=80.0), 1.0)
+        assert len(raised) == 1 and raised[0].startswith("humidity above threshold 70")
+        assert ds.add_sample(self.sample(humidity=81.0), 2.0) == []
+        assert ds.active_alarms() == ["humidity threshold"]
+        ds.add_sample(self.sample(), 3.0)
+        assert ds.active_alarms() == []
+
+    def test_gas_alarm_below_threshold(self):
+        ds = DutStats(self.PARAMS)
+        raised = ds.add_sample(self.sample(gas=5000), 0.0)
+        assert raised and raised[0].startswith("gas below threshold 10000")
+
+    def test_device_params_replace_configured_thresholds(self, caplog):
+        stats = SensorStatistics({"params": self.PARAMS, "stats": {"ewma_alpha": 0.1, "drift": 0.1, "warmup": 10}})
+        stats.set_params("dut", {"amb_thr": 100, "hum_thr": 90, "gas_thr": 10000})
+        assert stats.add_sample("dut", self.sample(humidity=80.0), 0.0) == []
+        stats.set_params("dut", None)
+        with caplog.at_level(logging.WARNING):
+            raised = stats.add_sample("dut", self.sample(humidity=95.0), 1.0)
+        assert raised and raised[0].startswith("humidity above threshold 90")
+        assert any(r.getMessage() == f"Alarm dut: {raised[0]}" for r in caplog.records)
+
+    def test_drift_alarm(self):
+        ds = DutStats(self.PARAMS, ewma_alpha=0.5, drift=0.1, warmup=3)
+        for t in range(3):
+            ds.add_sample(self.sample(temperature=20.0), float(t))
+        raised = []
+        for t in range(3, 8):
+            raised += ds.add_sample(self.sample(temperature=30.0), float(t))
+        assert any(a.startswith("temperature drifted") for a in raised)
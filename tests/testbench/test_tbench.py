@@ -0,0 +1,43 @@
+# test_tbench.py
+
+import copy
+import json
+import threading
+
+from smartfan.core import Config, MShost
+from smartfan.core.state_cache import DeviceStateCache
+from smartfan.testbench import tbench
+
+class SilentLink:
+    """A transport that stays connected to a DUT that never answers."""
+
+    def __init__(self):
+        self.response_received = threading.Event()
+        self.response = None
+        self.online = threading.Event()
+        self.online.set()
+        self.disconnects = 0
+        self.sent = []
+
+    def put_command(self, payload):
+        self.sent.append(json.loads(payload)["command"])
+        self.response = {"response": "TIMEOUT"}
+        self.response_received.set()
+
+class TestRunTests:
+
+    def test_silent_dut_is_neither_replayed_nor_resumed(self):
+        config = copy.deepcopy(Config.DEFAULT_CONFIG)
+        config['options'].update({"mode": "testbench", "nopairing": True, "incremental": False})
+        config['transport'].update({"type": "mqtt5", "replay": 2, "resume": 3})
+        link = SilentLink()
+        tb = tbench.TestBench(config)
+        host = MShost(link, None, cache=DeviceStateCache({}))
+        host.replay = 2
+        tb.set_ms_host(host)
+        tb.ms_subscribe = lambda: None
+        tb.tests = [(tb.t_who_am_i, "Who Am I")]
+        results = tb.run_tests()
+        assert [(r["test"], r["result"]) for r in results] == [("Who Am I", False)]
+        assert link.sent == ["WH"]
+        assert host.lost == 0
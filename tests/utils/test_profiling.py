@@ -0,0 +1,29 @@
+# test_profiling.py
+
+import time
+
+from smartfan.utils import RunProfiler
+
+class TestRunProfiler:
+
+    def test_phase_is_noop_when_inactive(self):
+        profiler = RunProfiler()
+        with profiler.phase("connect"):
+            pass
+        assert profiler.phases == {}
+
+    def test_sampled_stacks_are_rooted_at_phase(self, tmp_path):
+        profiler = RunProfiler()
+        profiler.start("sample", 0.001)
+        with profiler.phase("test:Motor"):
+            time.sleep(0.05)
+        profiler.stop()
+        assert profiler.phases["test:Motor"] >= 0.05
+        assert any(stack.startswith("phase:test:Motor;") for stack in profiler.stacks)
+
+        path = str(tmp_path / "run")
+        profiler.write(path, {"MT": (2, 0.01)})
+        report = (tmp_path / "run.phases.txt").read_text()
+        assert "test:Motor" in report
+        assert "MT" in report
+        assert (tmp_path / "run.collapsed").read_text().startswith("phase:")